@@ -1,66 +1,299 @@
 from app.models.query_log import QueryLog
-from app.schemas.models import QueryLogResponse
-from app.services.embedding_service import EmbeddingService
+from app.config.settings import get_settings
+from app.schemas.models import AskBatchRequest, AskBatchResponse, QueryLogResponse
+from app.services.embedding_service import (
+    EmbeddingService,
+    get_embedding_service,
+)
 from app.models.content import Content
 from app.db import get_db
-from fastapi import APIRouter, Depends
+from app.db.database import SessionLocal
+from app.services.pagination import (
+    after_cursor,
+    decode_cursor,
+    export_response,
+    keyset_page,
+)
+from app.services.answer_cache import SemanticAnswerCache, get_answer_cache
+from app.services.hybrid_search import HybridRetriever, get_hybrid_retriever
+from app.services.nl_sql import get_sql_cache
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.services.gemini_service import GeminiService
+from app.services.gemini_service import (
+    BatchQuestion,
+    GeminiService,
+    PreparedAnswer,
+    get_gemini_service,
+)
+import json
 import logging
-from typing import List, Optional
+from typing import List, Literal, Optional
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["ask"])
 
+QUERY_LOG_FIELDS = list(QueryLogResponse.model_fields)
+
 
 @router.post("/ask")
 async def ask_question(
+    response: Response,
     question: str,
     persona: str = "friendly",
     nl_sql: bool = False,
     context_id: Optional[int] = None,
+    grade: Optional[str] = Query(
+        None,
+        description="Only retrieve passages from content of this grade",
+    ),
+    topic: Optional[str] = Query(
+        None,
+        description="Only retrieve passages from content on this topic",
+    ),
+    stream: bool = Query(
+        False,
+        description="Stream the answer as Server-Sent Events (not for nl_sql)",
+    ),
     db: Session = Depends(get_db),
+    vector_store: EmbeddingService = Depends(get_embedding_service),
+    retriever: HybridRetriever = Depends(get_hybrid_retriever),
+    answer_cache: SemanticAnswerCache = Depends(get_answer_cache),
+    gemini_service: GeminiService = Depends(get_gemini_service),
 ):
-    gemini_service = GeminiService()
     if nl_sql:
-        response  = gemini_service.process_nl_query(
+        result = await gemini_service.process_nl_query(
             nl_question=question,
             persona=persona,
             db=db,
         )
-        return response
+        return result
+    elif stream:
+        return await _stream_answer(
+            gemini_service=gemini_service,
+            question=question,
+            persona=persona,
+            db=db,
+            vector_store=vector_store,
+            retriever=retriever,
+            answer_cache=answer_cache,
+            context_id=context_id,
+            grade=grade,
+            topic=topic,
+        )
     else:
-        response = gemini_service.generate_context_based_response(
+        result = await gemini_service.generate_context_based_response(
+            question=question,
+            persona=persona,
+            db=db,
+            vector_store=vector_store,
+            retriever=retriever,
+            answer_cache=answer_cache,
+            context_id=context_id,
+            grade=grade,
+            topic=topic,
+        )
+        response.headers.update(_answer_headers(result.pop("prepared")))
+        return result
+
+
+@router.post(
+    "/ask/batch",
+    response_model=AskBatchResponse,
+    description=(
+        "Answer many questions in one request. Questions are embedded and "
+        "searched together, and a failed question gets an error without "
+        "failing the rest."
+    ),
+)
+async def ask_batch(
+    request: AskBatchRequest,
+    db: Session = Depends(get_db),
+    vector_store: EmbeddingService = Depends(get_embedding_service),
+    retriever: HybridRetriever = Depends(get_hybrid_retriever),
+    answer_cache: SemanticAnswerCache = Depends(get_answer_cache),
+    gemini_service: GeminiService = Depends(get_gemini_service),
+):
+    settings = get_settings()
+    if len(request.questions) > settings.ask_batch_max_questions:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.ask_batch_max_questions} questions per batch",
+        )
+    try:
+        results = await gemini_service.answer_batch(
+            [BatchQuestion(**question.model_dump()) for question in request.questions],
+            db=db,
+            vector_store=vector_store,
+            retriever=retriever,
+            answer_cache=answer_cache,
+            concurrency=settings.ask_batch_llm_concurrency,
+        )
+    except Exception as e:
+        logger.error(f"Error answering batch: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to answer batch",
+        )
+    failed = sum(1 for result in results if result["error"])
+    return AskBatchResponse(
+        results=results,
+        succeeded=len(results) - failed,
+        failed=failed,
+    )
+
+
+def _answer_headers(prepared: PreparedAnswer) -> dict:
+    """Cache status, retrieval latency and prompt size of an answer"""
+    if prepared.cached_answer is not None:
+        return {"X-Answer-Cache": "HIT"}
+    headers = {
+        "X-Answer-Cache": "MISS",
+        "X-Prompt-Tokens": str(prepared.prompt_tokens),
+        "X-Dropped-Passages": str(prepared.dropped_passages),
+    }
+    if prepared.retrieval_timings:
+        # Per-leg retrieval latency
+        headers["Server-Timing"] = ", ".join(
+            f"{name};dur={duration:.1f}"
+            for name, duration in prepared.retrieval_timings.items()
+        )
+    return headers
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_answer(
+    gemini_service: GeminiService,
+    question: str,
+    persona: str,
+    db: Session,
+    vector_store: EmbeddingService,
+    retriever: HybridRetriever,
+    answer_cache: SemanticAnswerCache,
+    context_id: Optional[int],
+    grade: Optional[str],
+    topic: Optional[str],
+) -> StreamingResponse:
+    """Answer as Server-Sent Events: `token` events, then `done` or `error`"""
+    try:
+        prepared = await run_in_threadpool(
+            gemini_service.prepare_context_based_response,
             question=question,
             persona=persona,
             db=db,
+            vector_store=vector_store,
+            retriever=retriever,
+            answer_cache=answer_cache,
             context_id=context_id,
+            grade=grade,
+            topic=topic,
+        )
+    except Exception as e:
+        logger.error(f"Error asking question: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to give answer",
         )
-        return response
+
+    async def events():
+        try:
+            async for text_chunk in gemini_service.stream_context_based_response(
+                prepared=prepared,
+                question=question,
+                persona=persona,
+                answer_cache=answer_cache,
+                context_id=context_id,
+                grade=grade,
+                topic=topic,
+            ):
+                yield _sse_event("token", {"text": text_chunk})
+            yield _sse_event("done", {"persona": persona})
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}")
+            yield _sse_event("error", {"detail": "Failed to give answer"})
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        **_answer_headers(prepared),
+    }
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
 
 @router.get(
     "/query-log",
     response_model=List[QueryLogResponse],
+    description=(
+        "Query log oldest first, one page at a time. The cursor for the next "
+        "page is returned in the X-Next-Cursor header. format=ndjson or csv "
+        "streams every row after the cursor instead."
+    ),
 )
-async def get_query_log(
+def get_query_log(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    format: Literal["json", "ndjson", "csv"] = "json",
     db: Session = Depends(get_db),
 ):
+    columns = [getattr(QueryLog, name) for name in QUERY_LOG_FIELDS]
     try:
-        query_logs = (
-            db.query(QueryLog)
-            .order_by(
-                QueryLog.created_at,
+        if format != "json":
+            if cursor:
+                # Reject a bad cursor before the streamed body starts
+                decode_cursor(cursor)
+            return export_response(
+                SessionLocal,
+                lambda session: after_cursor(
+                    session.query(*columns),
+                    QueryLog.created_at,
+                    QueryLog.id,
+                    cursor,
+                ),
+                QUERY_LOG_FIELDS,
+                format,
+                "query-log",
             )
-            .all()
+        rows, next_cursor = keyset_page(
+            db.query(*columns),
+            QueryLog.created_at,
+            QueryLog.id,
+            cursor,
+            limit,
         )
-        return [QueryLogResponse(**query_log.__dict__) for query_log in query_logs]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting query log: {e}")
         raise HTTPException(
             status_code=500,
             detail="Failed to get query log",
         )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [QueryLogResponse(**row._mapping) for row in rows]
 
 
-
+@router.get(
+    "/cache-stats",
+    summary="Cache statistics",
+    description="Hit, miss and eviction counters for the in-process caches",
+)
+async def get_cache_stats(
+    vector_store: EmbeddingService = Depends(get_embedding_service),
+    answer_cache: SemanticAnswerCache = Depends(get_answer_cache),
+):
+    return {
+        "query_embedding": vector_store.query_cache.stats(),
+        "answer": answer_cache.stats(),
+        "nl_sql": get_sql_cache().stats(),
+    }
@@ -1,24 +1,55 @@
 import logging
 from app.models.content import Content
-from app.models.query_log import QueryLog
-from app.schemas.models import MetrixResponse, TopicResponse
-from app.services.embedding_service import EmbeddingService
-from fastapi import APIRouter, Depends
+from app.models.ingest_job import IngestJob
+from app.schemas.models import (
+    IngestJobResponse,
+    MetrixResponse,
+    QuerySeriesPoint,
+    TopicResponse,
+)
+from app.services.embedding_service import (
+    EmbeddingService,
+    get_embedding_service,
+)
+from app.services.answer_cache import get_answer_cache
+from app.services.metrics_service import MetricsService, get_metrics_service
+from app.services.document_loader import iter_decoded, iter_upload
+from app.services.ingest_jobs import cancel_jobs, enqueue_ingest, job_status
+from app.services.ingest_service import (
+    bulk_ingest,
+    delete_content_chunks,
+    store_text,
+)
+from app.config.settings import get_settings
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
 from app.db import get_db
+from app.db.database import SessionLocal
+from app.services.telemetry import span
+from app.services.pagination import (
+    after_cursor,
+    decode_cursor,
+    export_response,
+    keyset_page,
+)
 from fastapi import HTTPException, File
 from fastapi import UploadFile
-from typing import List, Optional
+from typing import List, Literal, Optional
 from fastapi import Form
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["content"])
 
+TOPIC_FIELDS = list(TopicResponse.model_fields)
+TOPIC_COLUMNS = [getattr(Content, name) for name in TOPIC_FIELDS]
+
 
 @router.post(
     "/upload-content",
+    status_code=202,
     summary="Upload content",
-    description="Upload content to be processed and stored in the database",
+    description="Store uploaded content and queue it for chunking and embedding. "
+    "Poll the returned job with GET /jobs/{job_id}.",
 )
 def upload_content(
     title: str = Form(..., description="Title of the content"),
@@ -28,28 +59,163 @@ def upload_content(
     db: Session = Depends(get_db),
 ):
     try:
-        text_content = file.file.read().decode("utf-8")
-
+        settings = get_settings()
         content_instance = Content(
             title=title,
             topic=topic,
             grade=grade,
-            content=text_content,
+            content="",
+            file_name=file.filename,
+        )
+        with span("store_text"):
+            db.add(content_instance)
+            db.flush()
+            store_text(
+                db,
+                content_instance,
+                iter_decoded(file.file, settings.upload_read_block_bytes),
+            )
+        with span("enqueue"):
+            job = enqueue_ingest(db, content_instance.id)
+            db.commit()
+        get_metrics_service().invalidate()
+        return {
+            "message": "Content uploaded, indexing queued",
+            "content_id": content_instance.id,
+            "job_id": job.id,
+        }
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error uploading content: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to upload content",
         )
-        db.add(content_instance)
+
+
+@router.put(
+    "/content/{content_id}",
+    status_code=202,
+    summary="Replace content",
+    description="Replace the text and details of existing content and queue it "
+    "for re-indexing. The old chunks are served until the job has indexed all of "
+    "the new text, and stay if it fails; meanwhile passages of both versions can "
+    "be retrieved.",
+)
+def replace_content(
+    content_id: int,
+    title: str = Form(..., description="Title of the content"),
+    topic: str = Form(..., description="Topic of the content"),
+    grade: str = Form(..., description="Grade of the content"),
+    file: UploadFile = File(..., description="File to upload"),
+    db: Session = Depends(get_db),
+):
+    content_instance = db.query(Content).filter(Content.id == content_id).first()
+    if content_instance is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Content not found",
+        )
+    try:
+        settings = get_settings()
+        content_instance.title = title
+        content_instance.topic = topic
+        content_instance.grade = grade
+        content_instance.content = ""
+        content_instance.file_name = file.filename
         db.flush()
-        vector_store = EmbeddingService()
-        vector_store.add(
-            content_instance.id,
-            text_content,
+        store_text(
+            db,
+            content_instance,
+            iter_decoded(file.file, settings.upload_read_block_bytes),
         )
+        job = enqueue_ingest(db, content_id)
         db.commit()
+        get_answer_cache().invalidate_content([content_id])
+        get_metrics_service().invalidate()
         return {
-            "message": "Content uploaded successfully",
+            "message": "Content replaced, re-indexing queued",
+            "content_id": content_id,
+            "job_id": job.id,
         }
     except Exception as e:
         db.rollback()
-        logger.error(f"Error uploading content: {e}")
+        logger.error(f"Error replacing content: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to replace content",
+        )
+
+
+@router.delete(
+    "/content/{content_id}",
+    summary="Delete content",
+    description="Delete content along with its chunks and vectors",
+)
+def delete_content(
+    content_id: int,
+    db: Session = Depends(get_db),
+    vector_store: EmbeddingService = Depends(get_embedding_service),
+):
+    content_instance = db.query(Content).filter(Content.id == content_id).first()
+    if content_instance is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Content not found",
+        )
+    try:
+        chunk_ids = delete_content_chunks(db, content_id)
+        cancel_jobs(db, content_id, "Content deleted")
+        db.delete(content_instance)
+        db.commit()
+        vector_store.remove(chunk_ids)
+        get_answer_cache().invalidate_content([content_id])
+        get_metrics_service().invalidate()
+        return {
+            "message": "Content deleted successfully",
+        }
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error deleting content: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to delete content",
+        )
+
+
+@router.post(
+    "/upload-content/bulk",
+    summary="Bulk upload content",
+    description="Upload many text files or zip/tar archives in one batch. "
+    "Titles are taken from the file names.",
+)
+def bulk_upload_content(
+    topic: str = Form(..., description="Topic of the content"),
+    grade: str = Form(..., description="Grade of the content"),
+    files: List[UploadFile] = File(..., description="Files or archives to upload"),
+    db: Session = Depends(get_db),
+    vector_store: EmbeddingService = Depends(get_embedding_service),
+):
+    try:
+        documents = [
+            document
+            for file in files
+            for document in iter_upload(file.filename, file.file)
+        ]
+        stats = bulk_ingest(
+            db=db,
+            documents=documents,
+            topic=topic,
+            grade=grade,
+            vector_store=vector_store,
+        )
+        get_metrics_service().invalidate()
+        return {
+            "message": "Content uploaded successfully",
+            **stats,
+        }
+    except Exception as e:
+        logger.error(f"Error bulk uploading content: {e}")
         raise HTTPException(
             status_code=500,
             detail="Failed to upload content",
@@ -59,38 +225,74 @@ def upload_content(
 @router.get(
     "/topics",
     summary="fitler topic based on grades and title",
-    description="Filter topic based on grades and title",
+    description=(
+        "Filter topic based on grades and title, one page at a time. The "
+        "cursor for the next page is returned in the X-Next-Cursor header. "
+        "format=ndjson or csv streams every match after the cursor instead."
+    ),
     response_model=List[TopicResponse,],
 )
 def get_topics(
+    response: Response,
     db: Session = Depends(get_db),
     grade: Optional[str] = None,
     title: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    format: Literal["json", "ndjson", "csv"] = "json",
 ):
-    try:
-        query: List[Content] = db.query(Content)
+    def build_query(session: Session):
+        # Only the listed columns, never the full content text
+        query = session.query(Content.created_at, *TOPIC_COLUMNS)
         if grade:
-            print("grade available as ", grade)
             query = query.filter(Content.grade == grade)
         if title:
-            print("title available as ", title)
             query = query.filter(Content.title.contains(title))
-        topics = query.all()
-        return [
-            TopicResponse(
-                id= topic.id,
-                topic=topic.topic,
-                grade=topic.grade,
-                title=topic.title,
+        return query
+
+    try:
+        if format != "json":
+            if cursor:
+                # Reject a bad cursor before the streamed body starts
+                decode_cursor(cursor)
+            return export_response(
+                SessionLocal,
+                lambda session: after_cursor(
+                    build_query(session),
+                    Content.created_at,
+                    Content.id,
+                    cursor,
+                ),
+                TOPIC_FIELDS,
+                format,
+                "topics",
             )
-            for topic in topics
-        ]
+        topics, next_cursor = keyset_page(
+            build_query(db),
+            Content.created_at,
+            Content.id,
+            cursor,
+            limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting topics: {e}")
         raise HTTPException(
             status_code=500,
             detail="Failed to get topics",
         )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        TopicResponse(
+            id= topic.id,
+            topic=topic.topic,
+            grade=topic.grade,
+            title=topic.title,
+        )
+        for topic in topics
+    ]
 
 @router.get(
     "/metrix",
@@ -100,19 +302,54 @@ def get_topics(
 )
 def get_metrix(
     db: Session = Depends(get_db),
+    metrics: MetricsService = Depends(get_metrics_service),
 ):
     try:
-        total_topics = db.query(Content.topic).distinct().count()
-        total_file_uploaded = db.query(Content).count()
-        total_queries = db.query(QueryLog).count()
-        return {
-            "total_topics": total_topics,
-            "total_file_uploaded": total_file_uploaded,
-            "total_queries": total_queries,
-        }
+        return metrics.summary(db)
     except Exception as e:
         logger.error(f"Error getting metrix: {e}")
         raise HTTPException(
             status_code=500,
             detail="Failed to get metrix",
-        )
\ No newline at end of file
+        )
+
+
+@router.get(
+    "/metrix/series",
+    summary="get query series",
+    description="Queries per hour for the last `hours` hours, oldest first, "
+    "with a per-persona breakdown",
+    response_model=List[QuerySeriesPoint],
+)
+def get_metrix_series(
+    hours: int = Query(24, ge=1),
+    db: Session = Depends(get_db),
+    metrics: MetricsService = Depends(get_metrics_service),
+):
+    try:
+        return metrics.series(db, hours)
+    except Exception as e:
+        logger.error(f"Error getting query series: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to get query series",
+        )
+
+
+@router.get(
+    "/jobs/{job_id}",
+    summary="get ingest job",
+    description="Status and progress of a queued upload",
+    response_model=IngestJobResponse,
+)
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+):
+    job = db.query(IngestJob).filter(IngestJob.id == job_id).first()
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found",
+        )
+    return job_status(job)
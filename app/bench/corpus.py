@@ -0,0 +1,134 @@
+import random
+from dataclasses import dataclass
+from typing import Iterator, List
+
+TOPICS = {
+    "Science": [
+        "photosynthesis", "evaporation", "magnetism", "friction", "digestion",
+        "the water cycle", "food chains", "electric circuits", "erosion", "gravity",
+    ],
+    "Mathematics": [
+        "fractions", "prime numbers", "area", "perimeter", "long division",
+        "ratios", "place value", "angles", "probability", "linear equations",
+    ],
+    "History": [
+        "ancient Egypt", "the industrial revolution", "the Silk Road", "democracy in Athens",
+        "the printing press", "the Roman Empire", "world trade", "early farming",
+        "the age of exploration", "independence movements",
+    ],
+    "Geography": [
+        "plate tectonics", "climate zones", "river deltas", "monsoons", "map scales",
+        "population density", "mountain formation", "deserts", "glaciers", "ocean currents",
+    ],
+    "English": [
+        "nouns", "verb tenses", "paragraph structure", "persuasive writing", "similes",
+        "punctuation", "reading comprehension", "poetry", "main ideas", "summarizing",
+    ],
+    "Computer Science": [
+        "algorithms", "binary numbers", "loops", "variables", "debugging",
+        "the internet", "sorting", "data storage", "networks", "online safety",
+    ],
+}
+GRADES = [f"Grade {grade}" for grade in range(1, 13)]
+
+_SENTENCES = [
+    "Students learn about {concept} by looking at {example}.",
+    "A simple way to explain {concept} is to compare it with {example}.",
+    "Teachers often use {example} to show how {concept} works.",
+    "{Concept} matters because it helps us understand {example}.",
+    "When studying {concept}, remember that {example} is a common case.",
+    "One experiment with {example} makes {concept} easy to observe.",
+    "Many questions about {concept} can be answered by thinking about {example}.",
+    "The key idea behind {concept} appears again in {example}.",
+]
+_EXAMPLES = [
+    "everyday objects", "a classroom activity", "a short story", "a diagram",
+    "a real-world problem", "a worked example", "a group project", "a field trip",
+    "a historical record", "a simple model", "a game", "a daily routine",
+]
+_QUESTIONS = [
+    "What is {concept}?",
+    "Can you explain {concept} with an example?",
+    "Why is {concept} important?",
+    "How does {concept} work?",
+    "What should I remember about {concept}?",
+]
+
+
+@dataclass
+class SyntheticDocument:
+    file_name: str
+    title: str
+    topic: str
+    grade: str
+    # Unique to the document, so questions can target it
+    concept: str
+    text: str
+
+
+def _concept(topic: str, number: int) -> str:
+    concepts = TOPICS[topic]
+    return f"{concepts[number % len(concepts)]} (unit {number})"
+
+
+def generate_curriculum(
+    num_docs: int,
+    words_per_doc: int = 250,
+    seed: int = 0,
+    start: int = 0,
+) -> Iterator[SyntheticDocument]:
+    """Yield reproducible lesson texts spread across every topic and grade.
+
+    The same seed and document number always produce the same document, so
+    corpora of different sizes share their first documents and runs on
+    different commits see identical input.
+    """
+    topics = list(TOPICS)
+    for number in range(start, start + num_docs):
+        rng = random.Random(f"{seed}:{number}")
+        topic = topics[number % len(topics)]
+        grade = GRADES[(number // len(topics)) % len(GRADES)]
+        concept = _concept(topic, number)
+        sentences: List[str] = []
+        words = 0
+        while words < words_per_doc:
+            sentence = rng.choice(_SENTENCES).format(
+                concept=concept,
+                Concept=concept[0].upper() + concept[1:],
+                example=rng.choice(_EXAMPLES),
+            )
+            sentences.append(sentence)
+            words += len(sentence.split())
+        paragraphs = [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+        yield SyntheticDocument(
+            file_name=f"lesson_{number:06d}.txt",
+            title=f"{topic} lesson {number}",
+            topic=topic,
+            grade=grade,
+            concept=concept,
+            text="\n\n".join(paragraphs),
+        )
+
+
+def generate_questions(
+    num_docs: int,
+    num_questions: int,
+    seed: int = 0,
+    phrasing: int = 0,
+) -> List[str]:
+    """Distinct student questions about documents of a corpus of num_docs.
+
+    Each question names a different document's concept where possible, so
+    neither the query embedding cache nor the answer cache is hit by
+    accident. Question sets with different `phrasing` never share a
+    question.
+    """
+    rng = random.Random(f"{seed}:questions")
+    topics = list(TOPICS)
+    numbers = rng.sample(range(num_docs), min(num_questions, num_docs))
+    questions = []
+    for position in range(num_questions):
+        number = numbers[position % len(numbers)]
+        template = _QUESTIONS[(position // len(numbers) + phrasing) % len(_QUESTIONS)]
+        questions.append(template.format(concept=_concept(topics[number % len(topics)], number)))
+    return questions
@@ -0,0 +1,258 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Dict, Iterable, List, Sequence
+import numpy as np
+from app.bench.corpus import SyntheticDocument, generate_curriculum, generate_questions
+
+logger = logging.getLogger(__name__)
+
+# Documents per bulk_ingest transaction when loading the corpus
+LOAD_BATCH_DOCS = 1000
+JOB_POLL_INTERVAL = 0.05
+
+
+def latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    """count, mean, p50/p95/p99 and max of a list of durations, in ms"""
+    if not len(seconds):
+        return {"count": 0}
+    ms = np.asarray(seconds, dtype="float64") * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def reset_database():
+    """Drop every table of the app so each run starts from an empty schema"""
+    from app.db.database import engine
+    from app.models import Base
+
+    Base.metadata.drop_all(bind=engine)
+
+
+def load_corpus(documents: Iterable[SyntheticDocument]) -> Dict[str, float]:
+    """Bulk-load documents straight through bulk_ingest, batch by batch"""
+    from app.db import get_database_session
+    from app.services.embedding_service import get_embedding_service
+    from app.services.ingest_service import bulk_ingest
+
+    vector_store = get_embedding_service()
+    started = time.perf_counter()
+    num_docs = num_chunks = 0
+    documents = iter(documents)
+    while True:
+        batch = list(itertools.islice(documents, LOAD_BATCH_DOCS))
+        if not batch:
+            break
+        batch.sort(key=lambda document: (document.topic, document.grade))
+        for (topic, grade), group in itertools.groupby(
+            batch, key=lambda document: (document.topic, document.grade)
+        ):
+            db = get_database_session()
+            try:
+                stats = bulk_ingest(
+                    db=db,
+                    documents=[(document.file_name, document.text) for document in group],
+                    topic=topic,
+                    grade=grade,
+                    vector_store=vector_store,
+                )
+            finally:
+                db.close()
+            num_docs += stats["documents"]
+            num_chunks += stats["chunks"]
+    elapsed = time.perf_counter() - started
+    return {
+        "documents": num_docs,
+        "chunks": num_chunks,
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(num_docs / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_sec": round(num_chunks / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+async def bench_ingest(client, documents: List[SyntheticDocument], concurrency: int) -> Dict:
+    """Upload documents through /upload-content and wait for their ingest jobs.
+
+    Throughput runs from the first upload to the last finished job, so it
+    covers chunking and embedding, not just the 202 response.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    upload_seconds: List[float] = []
+    job_ids: List[int] = []
+    errors = 0
+
+    async def upload(document: SyntheticDocument):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/v1/upload-content",
+                data={"title": document.title, "topic": document.topic, "grade": document.grade},
+                files={"file": (document.file_name, document.text.encode("utf-8"), "text/plain")},
+            )
+            upload_seconds.append(time.perf_counter() - started)
+            if response.status_code == 202:
+                job_ids.append(response.json()["job_id"])
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(upload(document) for document in documents))
+
+    chunks = failed = 0
+    pending = list(job_ids)
+    while pending:
+        still_running = []
+        for job_id in pending:
+            job = (await client.get(f"/api/v1/jobs/{job_id}")).json()
+            if job["status"] == "done":
+                chunks += job["chunks_total"] or 0
+            elif job["status"] == "failed":
+                failed += 1
+            else:
+                still_running.append(job_id)
+        pending = still_running
+        if pending:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+    elapsed = time.perf_counter() - started
+
+    done = len(job_ids) - failed
+    return {
+        "documents": done,
+        "chunks": chunks,
+        "errors": errors + failed,
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(done / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_sec": round(chunks / elapsed, 2) if elapsed else 0.0,
+        "upload_latency": latency_summary(upload_seconds),
+    }
+
+
+def bench_search(questions: List[str], top_k: int) -> Dict:
+    """EmbeddingService.search latency, with and without the query embedding cached"""
+    from app.services.embedding_service import get_embedding_service
+
+    vector_store = get_embedding_service()
+    passes = {}
+    for name in ("cold", "cached_embedding"):
+        seconds = []
+        for question in questions:
+            started = time.perf_counter()
+            vector_store.search(question, top_k=top_k)
+            seconds.append(time.perf_counter() - started)
+        passes[name] = latency_summary(seconds)
+    return {"vectors": vector_store.ntotal, "top_k": top_k, **passes}
+
+
+async def bench_ask(client, questions: List[str], concurrency: int) -> Dict:
+    """/ask latency and throughput with `concurrency` requests in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    seconds: List[float] = []
+    errors = 0
+
+    async def ask(question: str):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/api/v1/ask", params={"question": question})
+            seconds.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(ask(question) for question in questions))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(questions),
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(questions) / elapsed, 2) if elapsed else 0.0,
+        "latency": latency_summary(seconds),
+    }
+
+
+async def run_benchmark(
+    num_docs: int,
+    ingest_docs: int,
+    words_per_doc: int,
+    search_queries: int,
+    ask_requests: int,
+    concurrency: int,
+    top_k: int,
+    seed: int = 0,
+) -> Dict:
+    """Load a synthetic corpus of num_docs documents and measure the service.
+
+    The last `ingest_docs` documents go through /upload-content to measure
+    ingest throughput, the rest are bulk-loaded first. Settings (database,
+    LLM backend) are read from the environment, so this is meant to run in
+    a process of its own for each corpus size.
+    """
+    import httpx
+    from app.config.settings import get_settings
+    from app.db.database import engine
+    from app.services.llm_backend import get_llm_client
+    from app.services.warmup import get_warmup
+
+    reset_database()
+    # main creates the tables and starts the background services on startup
+    import main
+
+    app = main.app
+    ingest_docs = min(ingest_docs, num_docs)
+    result = {
+        "documents": num_docs,
+        "database": engine.dialect.name,
+        "index_type": get_settings().faiss_index_type,
+        "llm_backend": get_llm_client().backend.name,
+    }
+    async with app.router.lifespan_context(app):
+        warmup = get_warmup()
+        await warmup.async_wait()
+        if not warmup.ready:
+            raise RuntimeError(f"Warmup failed: {warmup.error}")
+        result["warmup"] = warmup.stats()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://bench",
+            timeout=None,
+        ) as client:
+            logger.info(f"Loading {num_docs - ingest_docs} documents")
+            result["bulk_load"] = await asyncio.to_thread(
+                load_corpus,
+                generate_curriculum(num_docs - ingest_docs, words_per_doc, seed=seed),
+            )
+            logger.info(f"Uploading {ingest_docs} documents")
+            result["ingest"] = await bench_ingest(
+                client,
+                list(generate_curriculum(
+                    ingest_docs, words_per_doc, seed=seed, start=num_docs - ingest_docs
+                )),
+                concurrency,
+            )
+            logger.info(f"Running {search_queries} searches")
+            result["search"] = await asyncio.to_thread(
+                bench_search,
+                generate_questions(num_docs, search_queries, seed=seed),
+                top_k,
+            )
+            logger.info(f"Sending {ask_requests} questions to /ask")
+            result["ask"] = await bench_ask(
+                client,
+                # Different questions from the search pass, so /ask doesn't
+                # start with the query embeddings cached
+                generate_questions(num_docs, ask_requests, seed=seed, phrasing=1),
+                concurrency,
+            )
+    result["ask"]["llm"] = get_llm_client().stats()
+    return result
@@ -0,0 +1,167 @@
+"""Benchmark ingest, search and /ask offline on a synthetic curriculum.
+
+Usage:
+    python -m app.cli.bench [--sizes 1000,10000,100000] [--output bench.jsonl]
+                            [--database-url URL] [--llm-latency-ms 500]
+
+Every corpus size runs in a fresh process against an empty database and
+index, with the local LLM backend (LLM_BACKEND=local) answering after
+--llm-latency-ms instead of Gemini.
+SQLite files under --workdir are used unless --database-url points at a
+local PostgreSQL; its tables are DROPPED before each size, so only use a
+scratch database.
+
+The run is printed as one JSON object: ingest throughput through
+/upload-content, EmbeddingService.search latency and /ask p50/p95/p99
+under --concurrency requests, for each size. --output appends it as a line
+to a JSON Lines file, together with the commit, to track regressions.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _child_env(args, num_docs: int, workdir: str) -> dict:
+    """Environment of the process benchmarking one corpus size"""
+    env = dict(os.environ)
+    env["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    # The index (./faiss_index, relative to the working directory) and
+    # app.log go to the workdir, never the developer's own index store
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT_DIR, env.get("PYTHONPATH")]))
+    env["LLM_BACKEND"] = "local"
+    env["LOCAL_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    env["LOCAL_LLM_JITTER_MS"] = str(args.llm_jitter_ms)
+    if not args.answer_cache:
+        env["ANSWER_CACHE_SIZE"] = "0"
+    # The child runs in the workdir, so .env isn't read; give every
+    # required setting a value (the Gemini key is unused with the local backend)
+    env.setdefault("APP_NAME", "AI Tutoring System benchmark")
+    env.setdefault("DEBUG", "False")
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    return env
+
+
+def _run_size(args, argv, num_docs: int) -> dict:
+    workdir = os.path.abspath(tempfile.mkdtemp(prefix=f"bench-{num_docs}-", dir=args.workdir))
+    result_path = os.path.join(workdir, "result.json")
+    command = [
+        sys.executable, "-m", "app.cli.bench",
+        "--run-size", str(num_docs),
+        "--result-file", result_path,
+    ] + argv
+    try:
+        started = time.perf_counter()
+        subprocess.run(
+            command,
+            env=_child_env(args, num_docs, workdir),
+            cwd=workdir,
+            check=True,
+        )
+        with open(result_path) as result_file:
+            result = json.load(result_file)
+        result["total_seconds"] = round(time.perf_counter() - started, 3)
+        return result
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _benchmark_size(args):
+    from app.bench.runner import run_benchmark
+
+    result = asyncio.run(
+        run_benchmark(
+            num_docs=args.run_size,
+            ingest_docs=args.ingest_docs,
+            words_per_doc=args.words_per_doc,
+            search_queries=args.search_queries,
+            ask_requests=args.ask_requests,
+            concurrency=args.concurrency,
+            top_k=args.top_k,
+            seed=args.seed,
+        )
+    )
+    with open(args.result_file, "w") as result_file:
+        json.dump(result, result_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Corpus sizes in documents")
+    parser.add_argument("--ingest-docs", type=int, default=200, help="Documents sent to /upload-content")
+    parser.add_argument("--words-per-doc", type=int, default=250)
+    parser.add_argument("--search-queries", type=int, default=200)
+    parser.add_argument("--ask-requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    parser.add_argument("--llm-jitter-ms", type=float, default=0)
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="Scratch PostgreSQL database (tables are dropped)")
+    parser.add_argument("--workdir", help="Where per-size databases and indexes are created")
+    parser.add_argument("--keep", action="store_true", help="Keep the per-size databases and indexes")
+    parser.add_argument("--output", help="JSON Lines file the run is appended to")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    if argv is None:
+        argv = sys.argv[1:]
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    if args.run_size is not None:
+        # One line per request would drown the progress messages
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        _benchmark_size(args)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    run = {
+        "commit": _commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {
+            name: value
+            for name, value in vars(args).items()
+            if name not in ("run_size", "result_file", "database_url", "workdir", "keep", "output")
+        },
+        "results": [],
+    }
+    for num_docs in sizes:
+        logging.info(f"Benchmarking {num_docs} documents")
+        run["results"].append(_run_size(args, argv, num_docs))
+
+    line = json.dumps(run)
+    print(line)
+    if args.output:
+        with open(args.output, "a") as output:
+            output.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
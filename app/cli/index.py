@@ -0,0 +1,162 @@
+"""Maintain the FAISS index.
+
+Usage:
+    python -m app.cli.index rebuild
+    python -m app.cli.index report [--top-k 10] [--queries 200] [--removed-fraction 0.1] [--json]
+    python -m app.cli.index encodings [--index-type flat] [--top-k 10] [--queries 200] [--json]
+    python -m app.cli.index migrate-vectors
+
+`rebuild` rebuilds (and for IVF, trains) the index configured by
+FAISS_INDEX_TYPE from the vectors stored in content_chunks. Stop the API
+before running it: only the process holding the index writer lock can
+replace the index, and a running server holds it.
+
+`report` prints recall@k and per-query latency of IVF and HNSW settings
+against the exact flat index, to help pick FAISS_IVF_NPROBE or
+FAISS_HNSW_EF_SEARCH. IVF is measured again after removing
+--removed-fraction of the vectors, as deletes and re-uploads do.
+
+`encodings` prints bytes per vector, index size, recall@k and latency of
+each FAISS_INDEX_ENCODING (float32, fp16, int8, pq) for one index type.
+
+`migrate-vectors` moves embedding backups still stored as JSON into the
+binary embedding column.
+"""
+import argparse
+import json
+import logging
+import sys
+from app.config.settings import get_settings
+from app.db import get_database_session
+from app.services.index_factory import INDEX_TYPES
+from app.services.index_tuning import (
+    encoding_report,
+    load_stored_vectors,
+    migrate_vector_backups,
+    rebuild_index,
+    recall_report,
+)
+
+
+def _rebuild(args):
+    from app.services.embedding_service import get_embedding_service
+
+    vector_store = get_embedding_service()
+    db = get_database_session()
+    try:
+        stats = rebuild_index(db, vector_store)
+    finally:
+        db.close()
+        vector_store.close()
+    print(json.dumps(stats))
+
+
+def _report(args):
+    settings = get_settings()
+    db = get_database_session()
+    try:
+        _, vectors = load_stored_vectors(db, dimension=384)
+    finally:
+        db.close()
+    report = recall_report(
+        vectors,
+        top_k=args.top_k,
+        num_queries=args.queries,
+        nlist=settings.faiss_ivf_nlist,
+        hnsw_m=settings.faiss_hnsw_m,
+        ef_construction=settings.faiss_hnsw_ef_construction,
+        removed_fraction=args.removed_fraction,
+    )
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"{len(vectors)} vectors, recall@{args.top_k}")
+    print(f"{'index':<6} {'param':<14} {'removed':>8} {'recall':>8} {'ms/query':>10}")
+    for row in report:
+        print(
+            f"{row['index']:<6} {row['param'] or '-':<14} {row['removed']:>8} "
+            f"{row['recall']:>8.4f} {row['ms_per_query']:>10.4f}"
+        )
+
+
+def _encodings(args):
+    settings = get_settings()
+    db = get_database_session()
+    try:
+        _, vectors = load_stored_vectors(db, dimension=384)
+    finally:
+        db.close()
+    report = encoding_report(
+        vectors,
+        top_k=args.top_k,
+        num_queries=args.queries,
+        index_type=args.index_type or settings.faiss_index_type,
+        nlist=settings.faiss_ivf_nlist,
+        nprobe=settings.faiss_ivf_nprobe,
+        hnsw_m=settings.faiss_hnsw_m,
+        ef_construction=settings.faiss_hnsw_ef_construction,
+        ef_search=settings.faiss_hnsw_ef_search,
+        pq_m=settings.faiss_pq_m,
+        pq_nbits=settings.faiss_pq_nbits,
+    )
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"{len(vectors)} vectors, recall@{args.top_k} against exact float32")
+    print(
+        f"{'encoding':<9} {'index':<6} {'code B':>7} {'bytes/vec':>10} {'index MB':>10} "
+        f"{'recall':>8} {'ms/query':>10}"
+    )
+    for row in report:
+        print(
+            f"{row['encoding']:<9} {row['index']:<6} {row['code_bytes']:>7.0f} "
+            f"{row['bytes_per_vector']:>10.1f} "
+            f"{row['index_mb']:>10.3f} {row['recall']:>8.4f} {row['ms_per_query']:>10.4f}"
+        )
+
+
+def _migrate_vectors(args):
+    db = get_database_session()
+    try:
+        stats = migrate_vector_backups(db)
+    finally:
+        db.close()
+    print(json.dumps(stats))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("rebuild", help="Rebuild/train the configured index")
+
+    report_parser = subparsers.add_parser("report", help="Recall vs latency report")
+    report_parser.add_argument("--top-k", type=int, default=10)
+    report_parser.add_argument("--queries", type=int, default=200)
+    report_parser.add_argument(
+        "--removed-fraction", type=float, default=0.1, help="Share of vectors removed from IVF"
+    )
+    report_parser.add_argument("--json", action="store_true")
+
+    encodings_parser = subparsers.add_parser("encodings", help="Size vs recall of each encoding")
+    encodings_parser.add_argument("--index-type", choices=INDEX_TYPES, help="Defaults to FAISS_INDEX_TYPE")
+    encodings_parser.add_argument("--top-k", type=int, default=10)
+    encodings_parser.add_argument("--queries", type=int, default=200)
+    encodings_parser.add_argument("--json", action="store_true")
+
+    subparsers.add_parser("migrate-vectors", help="Convert JSON vector backups to binary")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    if args.command == "rebuild":
+        _rebuild(args)
+    elif args.command == "encodings":
+        _encodings(args)
+    elif args.command == "migrate-vectors":
+        _migrate_vectors(args)
+    else:
+        _report(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Bulk-load a directory, archive or text file into the content store.
+
+Usage:
+    python -m app.cli.ingest PATH --topic TOPIC --grade GRADE
+"""
+import argparse
+import json
+import logging
+import sys
+from app.db import create_tables, get_database_session
+from app.services.document_loader import iter_path
+from app.services.embedding_service import get_embedding_service
+from app.services.ingest_service import bulk_ingest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="Text file, directory or zip/tar archive")
+    parser.add_argument("--topic", required=True, help="Topic for every document")
+    parser.add_argument("--grade", required=True, help="Grade for every document")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    create_tables()
+    vector_store = get_embedding_service()
+    db = get_database_session()
+    try:
+        stats = bulk_ingest(
+            db=db,
+            documents=list(iter_path(args.path)),
+            topic=args.topic,
+            grade=args.grade,
+            vector_store=vector_store,
+        )
+    finally:
+        db.close()
+        vector_store.close()
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Profile how long the API takes to start.
+
+Usage:
+    python -m app.cli.startup [--budget 3] [--top 15] [--port 8765] [--json]
+
+First imports `main` in a fresh interpreter under `python -X importtime`
+and lists the packages that took longest to import. Then starts
+`uvicorn main:app` on --port and measures, from process start, how long
+until /health first answers and until the background warmup has finished,
+with the time each warmup stage took.
+
+Uses the database and settings of the current environment. Exits with
+status 1 when /health took longer than --budget seconds, so it can run
+in CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+POLL_INTERVAL = 0.01
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT_DIR, env.get("PYTHONPATH")]))
+    return env
+
+
+def profile_imports(top: int) -> Dict:
+    """Import `main` under -X importtime and total the time spent per package.
+
+    Each module's own (self) time is added to its top-level package, so a
+    heavy dependency shows up by name even when imported through app code.
+    """
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env=_env(),
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - started
+    if completed.returncode:
+        raise RuntimeError(f"Importing main failed:\n{completed.stderr[-2000:]}")
+
+    packages: Dict[str, float] = defaultdict(float)
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(own) / 1e6
+    slowest: List[Tuple[str, float]] = sorted(packages.items(), key=lambda item: -item[1])
+    return {
+        "wall_seconds": round(wall, 3),
+        "import_seconds": round(sum(packages.values()), 3),
+        "packages": {name: round(seconds, 3) for name, seconds in slowest[:top]},
+    }
+
+
+def profile_boot(port: int, timeout: float) -> Dict:
+    """Start uvicorn and time /health and the warmup from process start"""
+    import httpx
+
+    url = f"http://127.0.0.1:{port}/health"
+    log = tempfile.TemporaryFile(mode="w+")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        env=_env(),
+        stdout=subprocess.DEVNULL,
+        stderr=log,
+    )
+    result = {"health_seconds": None, "ready_seconds": None, "warmup": None}
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                if server.poll() is not None:
+                    log.seek(0)
+                    raise RuntimeError(
+                        f"uvicorn exited with status {server.returncode}:\n{log.read()[-2000:]}"
+                    )
+                try:
+                    response = client.get(url)
+                except httpx.TransportError:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                elapsed = time.perf_counter() - started
+                if result["health_seconds"] is None:
+                    result["health_seconds"] = round(elapsed, 3)
+                health = response.json()
+                result["warmup"] = health.get("warmup")
+                if health.get("status") != "starting":
+                    result["status"] = health.get("status")
+                    if health.get("status") == "healthy":
+                        result["ready_seconds"] = round(elapsed, 3)
+                    break
+                time.sleep(POLL_INTERVAL)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=3.0, help="Seconds allowed until /health answers")
+    parser.add_argument("--top", type=int, default=15, help="Slowest packages to list")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for the warmup")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = {
+        "imports": profile_imports(args.top),
+        "boot": profile_boot(args.port, args.timeout),
+        "budget_seconds": args.budget,
+    }
+    health_seconds = report["boot"]["health_seconds"]
+    report["within_budget"] = health_seconds is not None and health_seconds <= args.budget
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        imports = report["imports"]
+        print(
+            f"import main: {imports['import_seconds']:.3f}s "
+            f"({imports['wall_seconds']:.3f}s with interpreter start)"
+        )
+        for name, seconds in imports["packages"].items():
+            print(f"  {name:<28} {seconds:>8.3f}s")
+        boot = report["boot"]
+        print(f"/health answered after {health_seconds}s (budget {args.budget}s)")
+        print(f"warmup finished after {boot['ready_seconds']}s")
+        warmup = boot["warmup"] or {}
+        for stage, seconds in (warmup.get("stages") or {}).items():
+            print(f"  {stage:<28} {seconds:>8.3f}s")
+        if warmup.get("error"):
+            print(f"warmup failed: {warmup['error']}")
+    if not report["within_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,145 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 import os
 
 class Settings(BaseSettings):
     # Database
     database_url: str = os.getenv("DATABASE_URL")
     
-    # OpenAI
-    openai_api_key: str = os.getenv("OPENAI_API_KEY")
-    openai_embedding_model: str = os.getenv("OPENAI_EMBEDDING_MODEL")
-    openai_chat_model: str = os.getenv("OPENAI_CHAT_MODEL")
+    # OpenAI (unused, kept so existing .env files stay valid)
+    openai_api_key: Optional[str] = os.getenv("OPENAI_API_KEY")
+    openai_embedding_model: Optional[str] = os.getenv("OPENAI_EMBEDDING_MODEL")
+    openai_chat_model: Optional[str] = os.getenv("OPENAI_CHAT_MODEL")
     
     # FAISS
-    faiss_index_path: str = os.getenv("FAISS_INDEX_PATH")
+    # Unused: the index lives in ./faiss_index under the working directory
+    faiss_index_path: Optional[str] = os.getenv("FAISS_INDEX_PATH")
+    index_checkpoint_interval_seconds: float = float(
+        os.getenv("INDEX_CHECKPOINT_INTERVAL_SECONDS", 60)
+    )
+    index_checkpoint_max_records: int = int(
+        os.getenv("INDEX_CHECKPOINT_MAX_RECORDS", 10000)
+    )
+    index_log_fsync: bool = os.getenv("INDEX_LOG_FSYNC", "True") == "True"
+    index_reload_interval_seconds: float = float(
+        os.getenv("INDEX_RELOAD_INTERVAL_SECONDS", 1.0)
+    )
+    # flat, ivf or hnsw
+    faiss_index_type: str = os.getenv("FAISS_INDEX_TYPE", "flat")
+    faiss_ivf_nlist: int = int(os.getenv("FAISS_IVF_NLIST", 1024))
+    faiss_ivf_nprobe: int = int(os.getenv("FAISS_IVF_NPROBE", 16))
+    faiss_hnsw_m: int = int(os.getenv("FAISS_HNSW_M", 32))
+    faiss_hnsw_ef_construction: int = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", 80))
+    faiss_hnsw_ef_search: int = int(os.getenv("FAISS_HNSW_EF_SEARCH", 64))
+    # float32 (exact), fp16, int8 (scalar quantization) or pq
+    faiss_index_encoding: str = os.getenv("FAISS_INDEX_ENCODING", "float32")
+    # Product quantization: sub-vectors (bytes per vector at 8 bits), which
+    # must divide the embedding dimension, and bits per sub-vector code
+    faiss_pq_m: int = int(os.getenv("FAISS_PQ_M", 48))
+    faiss_pq_nbits: int = int(os.getenv("FAISS_PQ_NBITS", 8))
     
     # Application
     app_name: str = os.getenv("APP_NAME")
     debug: bool = os.getenv("DEBUG")
     
-    # Chunking
+    # Gemini
     gemini_api_key: str = os.getenv("GEMINI_API_KEY")
-    gemini_chat_model: str = os.getenv("GEMINI_CHAT_MODEL")
-    
-    class Config:
-        env_file = ".env"
+    # The model used before this was configurable, when unset
+    gemini_chat_model: str = os.getenv("GEMINI_CHAT_MODEL", "gemini-2.0-flash-exp")
 
-@lru_cache()
-def get_settings():
-    return Settings()
+    # LLM client: gemini, or local for an offline stand-in
+    llm_backend: str = os.getenv("LLM_BACKEND", "gemini")
+    llm_timeout_seconds: float = float(os.getenv("LLM_TIMEOUT_SECONDS", 30))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", 2))
+    llm_retry_backoff_seconds: float = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", 0.5))
+    llm_retry_max_backoff_seconds: float = float(
+        os.getenv("LLM_RETRY_MAX_BACKOFF_SECONDS", 8)
+    )
+    # Concurrent identical prompts share one upstream call
+    llm_coalesce_requests: bool = os.getenv("LLM_COALESCE_REQUESTS", "True") == "True"
+    local_llm_latency_ms: float = float(os.getenv("LOCAL_LLM_LATENCY_MS", 500))
+    local_llm_jitter_ms: float = float(os.getenv("LOCAL_LLM_JITTER_MS", 0))
+
+    # Chunking
+    chunk_size_tokens: int = int(os.getenv("CHUNK_SIZE_TOKENS", 200))
+    chunk_overlap_tokens: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", 40))
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+    # Uploads are read in blocks of this many bytes and indexed this many
+    # chunks at a time, which bounds memory regardless of file size
+    upload_read_block_bytes: int = int(os.getenv("UPLOAD_READ_BLOCK_BYTES", 64 * 1024))
+    ingest_window_chunks: int = int(os.getenv("INGEST_WINDOW_CHUNKS", 256))
+    # Uploads are chunked by background jobs and embedded in this many
+    # worker processes (0 embeds in a thread of the API process)
+    ingest_workers: int = int(os.getenv("INGEST_WORKERS", 2))
+    ingest_job_poll_interval_seconds: float = float(
+        os.getenv("INGEST_JOB_POLL_INTERVAL_SECONDS", 1.0)
+    )
+    # A running job whose heartbeat is older than this is retried elsewhere
+    ingest_job_lease_seconds: float = float(os.getenv("INGEST_JOB_LEASE_SECONDS", 300))
+    ingest_job_max_attempts: int = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", 3))
+    retrieval_top_k: int = int(os.getenv("RETRIEVAL_TOP_K", 5))
+    # Retrieved passages are packed into the prompt up to this many tokens
+    context_token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+    token_count_cache_size: int = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", 10000))
+    # /ask/batch: questions per request, and LLM calls in flight per batch
+    ask_batch_max_questions: int = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", 500))
+    ask_batch_llm_concurrency: int = int(os.getenv("ASK_BATCH_LLM_CONCURRENCY", 8))
+
+    # Hybrid retrieval: PostgreSQL full-text search fused with FAISS results
+    hybrid_search_enabled: bool = os.getenv("HYBRID_SEARCH_ENABLED", "True") == "True"
+    # Candidates fetched from each leg before reciprocal-rank fusion
+    hybrid_search_candidates: int = int(os.getenv("HYBRID_SEARCH_CANDIDATES", 20))
+    hybrid_search_rrf_k: int = int(os.getenv("HYBRID_SEARCH_RRF_K", 60))
+    hybrid_search_workers: int = int(os.getenv("HYBRID_SEARCH_WORKERS", 8))
 
+    # Caching
+    query_embedding_cache_size: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 2048))
+    query_embedding_cache_ttl_seconds: float = float(
+        os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", 3600)
+    )
+    # Set ANSWER_CACHE_SIZE=0 to disable the semantic answer cache
+    answer_cache_size: int = int(os.getenv("ANSWER_CACHE_SIZE", 1000))
+    answer_cache_ttl_seconds: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 86400))
+    answer_cache_similarity_threshold: float = float(
+        os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.95)
+    )
 
+    # NL-to-SQL: generated queries are cached per normalized question and
+    # run read-only with a timeout and a row cap
+    nl_sql_cache_size: int = int(os.getenv("NL_SQL_CACHE_SIZE", 512))
+    nl_sql_cache_ttl_seconds: float = float(os.getenv("NL_SQL_CACHE_TTL_SECONDS", 3600))
+    nl_sql_statement_timeout_ms: int = int(os.getenv("NL_SQL_STATEMENT_TIMEOUT_MS", 5000))
+    nl_sql_max_rows: int = int(os.getenv("NL_SQL_MAX_ROWS", 1000))
+    # Results with more rows than this are summarized for the explanation
+    nl_sql_prompt_rows: int = int(os.getenv("NL_SQL_PROMPT_ROWS", 20))
 
-# First call – initializes and caches
-s1 = get_settings()
+    # Query logs are queued and written by a background thread in batches
+    query_log_queue_size: int = int(os.getenv("QUERY_LOG_QUEUE_SIZE", 10000))
+    query_log_batch_size: int = int(os.getenv("QUERY_LOG_BATCH_SIZE", 500))
+    query_log_flush_interval_seconds: float = float(
+        os.getenv("QUERY_LOG_FLUSH_INTERVAL_SECONDS", 1.0)
+    )
 
-# Second call – uses cache, does not reinitialize
-s2 = get_settings()
+    # Metrics: /metrix totals may lag other workers' writes by at most this long
+    metrics_max_staleness_seconds: float = float(
+        os.getenv("METRICS_MAX_STALENESS_SECONDS", 30)
+    )
+    # How far back the hourly query series reaches
+    metrics_series_hours: int = int(os.getenv("METRICS_SERIES_HOURS", 168))
+    # Requests slower than this are logged with their stage breakdown; 0 is off
+    slow_request_ms: float = float(os.getenv("SLOW_REQUEST_MS", 0))
 
-# Clear cache
-get_settings.cache_clear()
+    # Startup: the model, index and LLM client are loaded by a background
+    # warmup so /health answers straight away; API requests arriving before
+    # it finishes wait up to this long, then get a 503
+    warmup_in_background: bool = os.getenv("WARMUP_IN_BACKGROUND", "True") == "True"
+    warmup_request_wait_seconds: float = float(os.getenv("WARMUP_REQUEST_WAIT_SECONDS", 30))
+
+    class Config:
+        env_file = ".env"
 
-# Next call – reinitializes because cache was cleared
-s3 = get_settings()
+@lru_cache()
+def get_settings():
+    """Build the settings once per process; every later call returns the same object"""
+    return Settings()
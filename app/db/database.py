@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine
+import logging
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
 from app.config.settings import get_settings
 from app.models import Base
 
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
 
 engine = create_engine(
@@ -14,8 +18,90 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# PostgreSQL-only search structures. They live outside the ORM models so the
+# schema stays portable, and use IF NOT EXISTS so existing databases pick
+# them up on the next start.
+FULL_TEXT_DDL = [
+    "ALTER TABLE content_chunks ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', chunk_text)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_content_chunks_search_vector "
+    "ON content_chunks USING GIN (search_vector)",
+]
+
+TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_contents_title_trgm "
+    "ON contents USING GIN (title gin_trgm_ops)",
+]
+
+def supports_full_text_search() -> bool:
+    return engine.dialect.name == "postgresql"
+
+def create_search_indexes():
+    if not supports_full_text_search():
+        return
+    with engine.begin() as connection:
+        for statement in FULL_TEXT_DDL:
+            connection.execute(text(statement))
+    try:
+        with engine.begin() as connection:
+            for statement in TRIGRAM_DDL:
+                connection.execute(text(statement))
+    except SQLAlchemyError as e:
+        # Creating an extension needs extra privileges on some servers
+        logger.warning(f"Trigram title index not created: {e}")
+
+def add_missing_columns():
+    # create_all never alters existing tables; nullable columns added to a
+    # model later are appended here
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                )
+                logger.info(f"Added column {table.name}.{column.name}")
+
+def create_missing_indexes():
+    # create_all skips tables that already exist, indexes added later included
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+# Keyset-paged columns that older versions stamped with the database's now()
+KEYSET_TIMESTAMP_COLUMNS = [("contents", "created_at"), ("query_logs", "created_at")]
+
+def normalize_sqlite_timestamps():
+    # SQLite's CURRENT_TIMESTAMP is stored as 'YYYY-MM-DD HH:MM:SS' while
+    # SQLAlchemy binds datetimes with microseconds, so a cursor compared
+    # against the shorter text skips the rest of that second's rows
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as connection:
+        for table, column in KEYSET_TIMESTAMP_COLUMNS:
+            result = connection.execute(
+                text(
+                    f"UPDATE {table} SET {column} = {column} || '.000000' "
+                    f"WHERE length({column}) = 19"
+                )
+            )
+            if result.rowcount:
+                logger.info(f"Added microseconds to {result.rowcount} {table}.{column} values")
+
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    create_missing_indexes()
+    normalize_sqlite_timestamps()
+    create_search_indexes()
 
 def get_db():
     db = SessionLocal()
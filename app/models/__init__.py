@@ -1,10 +1,14 @@
 from app.models.content import Content, Base
 from app.models.content_chunk import ContentChunk
+from app.models.ingest_job import IngestJob
 from app.models.query_log import QueryLog
+from app.models.query_stat import QueryStat
 
 __all__ = [
     "Base",
     "Content",
     "ContentChunk",
+    "IngestJob",
     "QueryLog",
+    "QueryStat",
 ]
@@ -1,11 +1,16 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON, Index
+from datetime import datetime
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.sql import func
 
 Base = declarative_base()
 
 class Content(Base):
     __tablename__ = "contents"
+    # Keyset pagination of /topics, unfiltered and filtered by grade
+    __table_args__ = (
+        Index("ix_contents_created_at_id", "created_at", "id"),
+        Index("ix_contents_grade_created_at_id", "grade", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
@@ -14,6 +19,9 @@ class Content(Base):
     content = Column(Text, nullable=False)
     file_name = Column(String(255), nullable=True)
     chunk_count = Column(Integer, default=0)
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # Stamped in Python, not with the database's now(): SQLite's drops the
+    # microseconds, so a keyset cursor bound with them would skip the rest
+    # of a second's rows
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
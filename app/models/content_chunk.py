@@ -1,15 +1,23 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON, LargeBinary
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
-
-Base = declarative_base()
+from app.models.content import Base
 
 class ContentChunk(Base):
     __tablename__ = "content_chunks"
+    # Chunk ids double as FAISS ids, so they must never be reused
+    __table_args__ = {"sqlite_autoincrement": True}
     
     id = Column(Integer, primary_key=True, index=True)
-    content_id = Column(Integer, nullable=False)
+    content_id = Column(Integer, nullable=False, index=True)
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
-    embedding_vector = Column(JSON, nullable=True)  # Store as JSON for backup
-    created_at = Column(DateTime, default=func.now())
\ No newline at end of file
+    # Ingest job that wrote the chunk; a re-index keeps the chunks of the
+    # previous version until its job has written all of the new ones
+    ingest_job_id = Column(Integer, nullable=True)
+    # Backup of the chunk's vector, packed by app.services.vector_codec.
+    # Deferred, since loading chunks for a prompt never needs it
+    embedding = deferred(Column(LargeBinary, nullable=True))
+    # Older JSON backup, only read for rows written before `embedding`
+    embedding_vector = deferred(Column(JSON, nullable=True))
+    created_at = Column(DateTime, default=func.now())
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy.sql import func
+from app.models.content import Base
+
+class IngestJob(Base):
+    """Chunking and embedding work queued for one content row.
+
+    The table is the queue: runners claim a row by bumping `attempts`, so
+    the (status, attempts) pair identifies one claim, and keep
+    `heartbeat_at` fresh while they work. A running job whose heartbeat is
+    older than the lease is claimed again by any runner.
+    """
+    __tablename__ = "ingest_jobs"
+    __table_args__ = (
+        Index("ix_ingest_jobs_status_id", "status", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_id = Column(Integer, nullable=False, index=True)
+    # queued, running, done or failed
+    status = Column(String(20), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    # Only known once the whole text has been chunked
+    chunks_total = Column(Integer, nullable=True)
+    chunks_done = Column(Integer, nullable=False, default=0)
+    # Progress while running: characters of the stored text chunked so far
+    chars_total = Column(Integer, nullable=True)
+    chars_done = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
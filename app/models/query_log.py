@@ -1,14 +1,19 @@
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON, Index
+from datetime import datetime
+from app.models.content import Base
 
-Base = declarative_base()
 class QueryLog(Base):
     __tablename__ = "query_logs"
+    # Supports keyset pagination and streaming export in (created_at, id) order
+    __table_args__ = (Index("ix_query_logs_created_at_id", "created_at", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_question = Column(Text, nullable=False)
     ai_response = Column(Text, nullable=False)
     persona = Column(String(50), default="friendly")
-    created_at = Column(DateTime, default=func.now())
+    # Seconds from receiving the question to having the full answer
+    response_time = Column(Float, nullable=True)
+    retrieved_chunks = Column(Integer, nullable=True)
+    # Stamped in Python like Content.created_at, see there
+    created_at = Column(DateTime, default=datetime.now)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from app.models.content import Base
+
+class QueryStat(Base):
+    """Number of logged queries per hour and persona.
+
+    Kept up to date in the same transaction as the query log, so totals and
+    time series never need to scan query_logs.
+    """
+    __tablename__ = "query_stats"
+
+    hour = Column(DateTime, primary_key=True)
+    persona = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
@@ -1,6 +1,6 @@
 from datetime import datetime
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Dict, Optional, List
 
 
 class QueryLogResponse(BaseModel):
@@ -8,6 +8,8 @@ class QueryLogResponse(BaseModel):
     user_question: str
     persona: str
     ai_response: str
+    response_time: Optional[float] = None
+    retrieved_chunks: Optional[int] = None
     created_at: datetime
 
 
@@ -27,3 +29,54 @@ class MetrixResponse(BaseModel):
     total_topics: int
     total_file_uploaded: int
     total_queries: int
+
+
+class QuerySeriesPoint(BaseModel):
+    hour: datetime
+    total: int
+    by_persona: Dict[str, int]
+
+
+class IngestJobResponse(BaseModel):
+    id: int
+    content_id: int
+    # queued, running, done or failed
+    status: str
+    attempts: int
+    chunks_total: Optional[int] = None
+    chunks_done: int
+    # Fraction of chunks embedded, once the text has been chunked
+    progress: Optional[float] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class AskBatchQuestion(BaseModel):
+    question: str = Field(..., min_length=1)
+    persona: str = "friendly"
+    context_id: Optional[int] = None
+    # Only retrieve passages from content of this grade / on this topic
+    grade: Optional[str] = None
+    topic: Optional[str] = None
+
+
+class AskBatchRequest(BaseModel):
+    questions: List[AskBatchQuestion] = Field(..., min_length=1)
+
+
+class AskBatchResult(BaseModel):
+    # Position of the question in the request
+    index: int
+    persona: str
+    answer: Optional[str] = None
+    # Answered from the semantic answer cache
+    cached: bool = False
+    error: Optional[str] = None
+
+
+class AskBatchResponse(BaseModel):
+    results: List[AskBatchResult]
+    succeeded: int
+    failed: int
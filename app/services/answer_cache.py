@@ -0,0 +1,176 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Hashable, Iterable, Optional
+import numpy as np
+from app.config.settings import get_settings
+
+
+@dataclass
+class CachedAnswer:
+    key: Hashable
+    embedding: np.ndarray
+    answer: str
+    # content id -> updated_at of every Content row the answer was built from
+    content_versions: Dict[int, datetime]
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    """Cache of generated answers looked up by question similarity.
+
+    Answers are bucketed by persona, context_id and the grade/topic search
+    filters. A new question hits when
+    the cosine similarity between its embedding and a cached question in the
+    same bucket reaches `threshold`. Entries remember which Content rows (and
+    their `updated_at`) they were generated from so callers can reject stale
+    answers, and `invalidate_content` drops them eagerly when content changes
+    in this process.
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 1000, ttl: float = 0):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(
+        persona: str,
+        context_id: Optional[int],
+        grade: Optional[str] = None,
+        topic: Optional[str] = None,
+    ) -> Hashable:
+        return persona.lower(), context_id, grade, topic
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype="float32").reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def lookup(
+        self,
+        embedding: np.ndarray,
+        persona: str,
+        context_id: Optional[int],
+        grade: Optional[str] = None,
+        topic: Optional[str] = None,
+    ) -> Optional[CachedAnswer]:
+        """Return the most similar cached answer above the threshold"""
+        key = self.make_key(persona, context_id, grade, topic)
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                entry_id
+                for entry_id, entry in self._entries.items()
+                if entry.expires_at and entry.expires_at < now
+            ]
+            for entry_id in expired:
+                del self._entries[entry_id]
+
+            candidates = [
+                (entry_id, entry)
+                for entry_id, entry in self._entries.items()
+                if entry.key == key
+            ]
+            if candidates:
+                matrix = np.stack([entry.embedding for _, entry in candidates])
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        embedding: np.ndarray,
+        persona: str,
+        context_id: Optional[int],
+        answer: str,
+        content_versions: Dict[int, datetime],
+        grade: Optional[str] = None,
+        topic: Optional[str] = None,
+    ):
+        if self.maxsize <= 0:
+            return
+        entry = CachedAnswer(
+            key=self.make_key(persona, context_id, grade, topic),
+            embedding=self._normalize(embedding),
+            answer=answer,
+            content_versions=content_versions,
+            expires_at=time.monotonic() + self.ttl if self.ttl else 0,
+        )
+        with self._lock:
+            self._entries[next(self._ids)] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, entry: CachedAnswer):
+        with self._lock:
+            for entry_id, cached in list(self._entries.items()):
+                if cached is entry:
+                    del self._entries[entry_id]
+                    self.invalidations += 1
+
+    def invalidate_content(self, content_ids: Iterable[int]):
+        """Drop every answer generated from any of the given content rows"""
+        content_ids = set(content_ids)
+        with self._lock:
+            stale = [
+                entry_id
+                for entry_id, entry in self._entries.items()
+                if content_ids & entry.content_versions.keys()
+            ]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            self.invalidations += len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "similarity_threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Return the process-wide answer cache"""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                settings = get_settings()
+                _answer_cache = SemanticAnswerCache(
+                    threshold=settings.answer_cache_similarity_threshold,
+                    maxsize=settings.answer_cache_size,
+                    ttl=settings.answer_cache_ttl_seconds,
+                )
+    return _answer_cache
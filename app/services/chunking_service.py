@@ -0,0 +1,99 @@
+import re
+from typing import Iterable, Iterator, List
+
+_TRAILING_WORD = re.compile(r"\S*\Z")
+
+
+class TextChunker:
+    """Split text into overlapping, token-bounded chunks.
+
+    Token boundaries come from the embedding model's own tokenizer so every
+    chunk fits inside the model's sequence length instead of being silently
+    truncated. Chunks are sliced out of the original text using the
+    tokenizer's character offsets, so the stored passage reads exactly like
+    the source.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        chunk_size: int = 200,
+        chunk_overlap: int = 40,
+    ):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def _offsets(self, text: str) -> List[tuple]:
+        encoding = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            truncation=False,
+            verbose=False,
+        )
+        return list(encoding["offset_mapping"])
+
+    def split(self, text: str) -> List[str]:
+        """Split text into chunks of at most chunk_size tokens"""
+        if not text or not text.strip():
+            return []
+
+        offsets = self._offsets(text)
+        if not offsets:
+            return []
+
+        step = self.chunk_size - self.chunk_overlap
+        chunks = []
+        for start in range(0, len(offsets), step):
+            end = min(start + self.chunk_size, len(offsets))
+            chunk = text[offsets[start][0] : offsets[end - 1][1]].strip()
+            if chunk:
+                chunks.append(chunk)
+            if end == len(offsets):
+                break
+        return chunks
+
+    def split_stream(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Chunk text arriving in pieces, yielding the same chunks as `split`.
+
+        Only the current window plus the unread tail of the last piece is
+        held in memory. Text after the last whitespace of the buffer is held
+        back until more arrives, so a word cut between two pieces is never
+        tokenized in halves.
+        """
+        step = self.chunk_size - self.chunk_overlap
+        buffer = ""
+        emitted = False
+        for piece in pieces:
+            buffer += piece
+            safe_end = len(buffer) - len(_TRAILING_WORD.search(buffer).group())
+            offsets = self._offsets(buffer[:safe_end]) if safe_end else []
+            while len(offsets) >= self.chunk_size:
+                chunk = buffer[offsets[0][0] : offsets[self.chunk_size - 1][1]].strip()
+                if chunk:
+                    yield chunk
+                emitted = True
+                # Keep the overlap: the next window starts `step` tokens in
+                cut = offsets[step][0] if step < len(offsets) else offsets[-1][1]
+                buffer = buffer[cut:]
+                offsets = [(start - cut, end - cut) for start, end in offsets[step:]]
+
+        offsets = self._offsets(buffer) if buffer.strip() else []
+        while offsets:
+            end = min(self.chunk_size, len(offsets))
+            # After a window has been emitted the buffer starts with its
+            # overlap, so only emit when there are tokens beyond it
+            if emitted and len(offsets) <= self.chunk_overlap:
+                break
+            chunk = buffer[offsets[0][0] : offsets[end - 1][1]].strip()
+            if chunk:
+                yield chunk
+            emitted = True
+            if end == len(offsets):
+                break
+            cut = offsets[step][0]
+            buffer = buffer[cut:]
+            offsets = [(start - cut, stop - cut) for start, stop in offsets[step:]]
@@ -0,0 +1,179 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+from app.config.settings import get_settings
+from app.services.cache import TTLCache, normalize_text
+from app.services.embedding_service import get_embedding_service
+
+# Characters of the next passage used to find where two passages overlap
+_OVERLAP_PROBE = 16
+
+
+@dataclass
+class Passage:
+    """A retrieved chunk of text, in ranking order when passed to build"""
+
+    key: Hashable
+    text: str
+    content_id: Optional[int] = None
+    chunk_index: Optional[int] = None
+
+
+@dataclass
+class BuiltContext:
+    text: str
+    tokens: int
+    passages: List[Passage] = field(default_factory=list)
+    # Passages that did not fit in the token budget
+    dropped: int = 0
+    # Passages skipped as exact or contained duplicates of selected ones
+    duplicates: int = 0
+
+
+def _overlap(before: str, after: str) -> int:
+    """Length of the longest suffix of `before` that is a prefix of `after`"""
+    if not before or not after:
+        return 0
+    probe = after[: min(_OVERLAP_PROBE, len(after))]
+    start = before.find(probe, max(0, len(before) - len(after)))
+    while start != -1:
+        length = len(before) - start
+        if after.startswith(before[start:]):
+            return length
+        start = before.find(probe, start + 1)
+    return 0
+
+
+class ContextBuilder:
+    """Pack ranked passages into a prompt context under a token budget.
+
+    Passages are taken in ranking order. Exact and contained duplicates are
+    skipped, and text a passage shares with an already selected neighbour
+    from the same document (the chunker's overlap) is trimmed. Each passage
+    is then added if it still fits in the budget, so a long passage that
+    doesn't fit doesn't stop shorter, lower-ranked ones from being used.
+    Selected neighbours are stitched back into one span in document order.
+
+    Token counts come from the embedding model's tokenizer and are cached
+    per passage key, since the same chunks are retrieved again and again.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int],
+        token_budget: int = 1500,
+        cache_size: int = 10000,
+    ):
+        self._count_tokens = count_tokens
+        self.token_budget = token_budget
+        self.token_cache = TTLCache(maxsize=cache_size)
+
+    def count_tokens(self, text: str, key: Optional[Hashable] = None) -> int:
+        if key is None:
+            return self._count_tokens(text)
+        tokens = self.token_cache.get(key)
+        if tokens is None:
+            tokens = self._count_tokens(text)
+            self.token_cache.set(key, tokens)
+        return tokens
+
+    def build(self, passages: Sequence[Passage], token_budget: Optional[int] = None) -> BuiltContext:
+        budget = self.token_budget if token_budget is None else token_budget
+        # (content_id, chunk_index) -> (rank, trimmed text) of selected passages
+        selected: Dict[Tuple, Tuple[int, str]] = {}
+        selected_texts: List[str] = []
+        chosen: List[Passage] = []
+        used = dropped = duplicates = 0
+
+        for rank, passage in enumerate(passages):
+            normalized = normalize_text(passage.text)
+            if not normalized or any(normalized in text for text in selected_texts):
+                duplicates += 1
+                continue
+
+            text, start, end = passage.text, 0, len(passage.text)
+            if passage.content_id is not None and passage.chunk_index is not None:
+                previous = selected.get((passage.content_id, passage.chunk_index - 1))
+                following = selected.get((passage.content_id, passage.chunk_index + 1))
+                if previous is not None:
+                    start = _overlap(previous[1], text)
+                if following is not None:
+                    end = max(start, len(text) - _overlap(text, following[1]))
+            trimmed = text[start:end]
+            tokens = self.count_tokens(trimmed, key=(passage.key, start, end))
+            if used + tokens > budget:
+                dropped += 1
+                continue
+
+            used += tokens
+            chosen.append(passage)
+            selected_texts.append(normalized)
+            position = (
+                (passage.content_id, passage.chunk_index)
+                if passage.chunk_index is not None
+                else (passage.key, None)
+            )
+            selected[position] = (rank, trimmed)
+
+        return BuiltContext(
+            text=self._assemble(selected),
+            tokens=used,
+            passages=chosen,
+            dropped=dropped,
+            duplicates=duplicates,
+        )
+
+    @staticmethod
+    def _assemble(selected: Dict[Tuple, Tuple[int, str]]) -> str:
+        """Join consecutive chunks of a document into spans, best span first"""
+        spans: List[Tuple[int, str]] = []
+        current_key = current_index = None
+        current_rank, current_parts = 0, []
+        for (key, index), (rank, text) in sorted(
+            selected.items(),
+            key=lambda item: (str(item[0][0]), item[0][1] if item[0][1] is not None else -1),
+        ):
+            continues = (
+                index is not None
+                and key == current_key
+                and current_index is not None
+                and index == current_index + 1
+            )
+            if continues:
+                current_parts.append(text)
+                current_rank = min(current_rank, rank)
+            else:
+                if current_parts:
+                    spans.append((current_rank, "".join(current_parts).strip()))
+                current_parts, current_rank = [text], rank
+            current_key, current_index = key, index
+        if current_parts:
+            spans.append((current_rank, "".join(current_parts).strip()))
+        return "\n\n".join(text for _, text in sorted(spans))
+
+
+_context_builder: Optional[ContextBuilder] = None
+_context_builder_lock = threading.Lock()
+
+
+def get_context_builder() -> ContextBuilder:
+    """Return the process-wide context builder"""
+    global _context_builder
+    if _context_builder is None:
+        with _context_builder_lock:
+            if _context_builder is None:
+                settings = get_settings()
+                tokenizer = get_embedding_service().model.tokenizer
+                _context_builder = ContextBuilder(
+                    count_tokens=lambda text: len(
+                        tokenizer(
+                            text,
+                            add_special_tokens=False,
+                            truncation=False,
+                            verbose=False,
+                        )["input_ids"]
+                    ),
+                    token_budget=settings.context_token_budget,
+                    cache_size=settings.token_count_cache_size,
+                )
+    return _context_builder
@@ -0,0 +1,99 @@
+import codecs
+import io
+import logging
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = (".txt", ".md")
+
+
+def is_archive(file_name: str) -> bool:
+    name = file_name.lower()
+    return name.endswith((".zip", ".tar", ".tar.gz", ".tgz"))
+
+
+def _is_text_file(file_name: str) -> bool:
+    base_name = os.path.basename(file_name)
+    return not base_name.startswith(".") and base_name.lower().endswith(
+        TEXT_EXTENSIONS
+    )
+
+
+def _decode(data: bytes, file_name: str) -> str:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        logger.warning(f"{file_name} is not valid UTF-8, replacing bad bytes")
+        return data.decode("utf-8", errors="replace")
+
+
+def iter_decoded(fileobj: BinaryIO, block_size: int = 64 * 1024) -> Iterator[str]:
+    """Read and decode a UTF-8 file incrementally, block_size bytes at a time"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        block = fileobj.read(block_size)
+        if not block:
+            break
+        text = decoder.decode(block)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_archive(
+    file_name: str,
+    fileobj: BinaryIO,
+) -> Iterator[Tuple[str, str]]:
+    """Yield (file_name, text) for every text file inside a zip or tar archive"""
+    if file_name.lower().endswith(".zip"):
+        # zipfile needs a seekable file
+        if not fileobj.seekable():
+            fileobj = io.BytesIO(fileobj.read())
+        with zipfile.ZipFile(fileobj) as archive:
+            for member in sorted(archive.namelist()):
+                if member.endswith("/") or not _is_text_file(member):
+                    continue
+                yield member, _decode(archive.read(member), member)
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r:*") as archive:
+            for member in archive:
+                if not member.isfile() or not _is_text_file(member.name):
+                    continue
+                data = archive.extractfile(member).read()
+                yield member.name, _decode(data, member.name)
+
+
+def iter_upload(
+    file_name: str,
+    fileobj: BinaryIO,
+) -> Iterator[Tuple[str, str]]:
+    """Yield (file_name, text) for an uploaded file, expanding archives"""
+    if is_archive(file_name):
+        yield from iter_archive(file_name, fileobj)
+    else:
+        yield file_name, _decode(fileobj.read(), file_name)
+
+
+def iter_path(path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (file_name, text) for a text file, archive or directory tree"""
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full_path = os.path.join(root, name)
+                if is_archive(name) or _is_text_file(name):
+                    yield from iter_path(full_path)
+    else:
+        with open(path, "rb") as fileobj:
+            yield from iter_upload(os.path.basename(path), fileobj)
+
+
+def title_from_file_name(file_name: str) -> str:
+    base_name = os.path.splitext(os.path.basename(file_name))[0]
+    return base_name.replace("_", " ").replace("-", " ").strip() or file_name
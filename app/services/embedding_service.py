@@ -1,49 +1,627 @@
-import faiss
+import itertools
 import numpy as np
 import os
-from sentence_transformers import SentenceTransformer
+import threading
+import logging
+from typing import List, Optional
+from app.config.settings import get_settings
+from app.services.cache import TTLCache, normalize_text
+from app.services.chunking_service import TextChunker
+from app.services.index_factory import (
+    apply_search_params_from_settings,
+    build_index_from_settings,
+    index_encoding_of,
+    index_type_of,
+    search_parameters,
+    with_ids,
+)
+from app.services.index_store import IndexStore, OP_ADD, OP_REMOVE
+from app.services.metadata_index import MetadataIndex
+
+logger = logging.getLogger(__name__)
+
+# faiss is imported by the methods that use it, which first run in the
+# warmup, so the API starts serving /health without waiting for it to load
 
 
 class EmbeddingService:
+    """Embedding model plus a FAISS index shared by every worker.
+
+    One process, the writer, keeps the index in memory, applies the vector
+    log to it and publishes checkpoints. Every other process is a reader:
+    it maps the newest checkpoint read-only and keeps vectors added since
+    then in a small in-memory delta index, with removed ids filtered out of
+    results. A reader that sees a newer checkpoint loads it and swaps it in
+    with one assignment, so a search uses either the old snapshot or the
+    new one, never a mix; the delta starts over from the new checkpoint.
+    """
+
     def __init__(
         self,
-        index_path="./faiss_index/index.faiss",
-        id_map_path="./faiss_index/id_map.npy",
+        index_dir="./faiss_index",
+        model_name="all-MiniLM-L6-v2",
     ):
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+        # Imports torch, which takes seconds; paid during warmup, not at import
+        from sentence_transformers import SentenceTransformer
+
+        settings = get_settings()
+        self.settings = settings
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
         self.embedding_size = 384
-        self.index_path = index_path
-        self.id_map_path = id_map_path
+        self.batch_size = settings.embedding_batch_size
+        self.chunker = TextChunker(
+            self.model.tokenizer,
+            chunk_size=settings.chunk_size_tokens,
+            chunk_overlap=settings.chunk_overlap_tokens,
+        )
+        self.query_cache = TTLCache(
+            maxsize=settings.query_embedding_cache_size,
+            ttl=settings.query_embedding_cache_ttl_seconds,
+        )
+        self.metadata = MetadataIndex()
+        self.index_dir = index_dir
+        self.ready = False
+        # Guards the index, delta and removed ids; the model is safe to share.
+        self._lock = threading.RLock()
+        # Readers only: vectors logged after the loaded checkpoint, and ids
+        # removed since, which may still be in the checkpoint
+        self.delta = None
+        self.removed = frozenset()
+        self.base_seq = -1
+        self._applied_seq = 0
+
+        self.store = IndexStore(
+            index_dir,
+            self.embedding_size,
+            snapshot_fn=self._snapshot,
+            checkpoint_interval=settings.index_checkpoint_interval_seconds,
+            checkpoint_max_records=settings.index_checkpoint_max_records,
+            fsync=settings.index_log_fsync,
+            poll_fn=self._poll,
+            poll_interval=settings.index_reload_interval_seconds,
+        )
+        self.store.acquire_writer()
+        self._load()
+
+    @property
+    def is_writer(self) -> bool:
+        return self.store.is_writer
+
+    @property
+    def ntotal(self) -> int:
+        with self._lock:
+            if self.delta is None:
+                return self.index.ntotal
+            return self.index.ntotal + self.delta.ntotal - len(self.removed)
+
+    def _read_checkpoint(self):
+        """Return (seq, index) for the newest checkpoint, or (-1, None)"""
+        import faiss
+
+        # Readers map the vectors rather than copying them, so every worker
+        # shares one copy through the page cache
+        read_only_mmap = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+        while True:
+            checkpoint = self.store.latest_checkpoint()
+            if not checkpoint:
+                return -1, None
+            seq, index_path = checkpoint
+            legacy_ids_path = self.store.legacy_ids_path(seq)
+            try:
+                if os.path.exists(legacy_ids_path):
+                    index = _with_ids(
+                        faiss.read_index(index_path),
+                        np.fromfile(legacy_ids_path, dtype="int64"),
+                    )
+                elif self.is_writer:
+                    index = faiss.read_index(index_path)
+                else:
+                    index = faiss.read_index(index_path, read_only_mmap)
+            except RuntimeError:
+                if os.path.exists(index_path):
+                    raise
+                # Superseded and pruned by the writer in the meantime
+                continue
+            return seq, index
+
+    def _load(self):
+        """Load the newest checkpoint and replay the vector log on top of it"""
+        import faiss
+
+        readd_backups = False
+        with self._lock:
+            seq, index = self._read_checkpoint()
+            if index is None:
+                index = with_ids(self._new_index())
+            elif _wraps_ivf(index):
+                index, readd_backups = self._unwrap_ivf(index)
+            self.index, self.base_seq = index, seq
+            self.delta = None if self.is_writer else faiss.IndexIDMap2(
+                faiss.IndexFlatL2(self.embedding_size)
+            )
+            self.removed = frozenset()
+            if seq < 0 and self.is_writer:
+                self._load_legacy()
+
+            with self.store.locked():
+                records = self.store.replay(after_seq=max(seq, 0))
+            self._applied_seq = max(seq, 0)
+            self._apply(records)
+            if records:
+                logger.info(f"Replayed {len(records)} records from the index log")
+
+        configured_type = self.settings.faiss_index_type
+        if index_type_of(self.index) != configured_type:
+            logger.warning(
+                f"Loaded a {index_type_of(self.index)} index but FAISS_INDEX_TYPE "
+                f"is {configured_type}; run `python -m app.cli.index rebuild`"
+            )
+        configured_encoding = self.settings.faiss_index_encoding
+        if index_encoding_of(self.index) != configured_encoding:
+            logger.warning(
+                f"Loaded a {index_encoding_of(self.index)} index but FAISS_INDEX_ENCODING "
+                f"is {configured_encoding}; run `python -m app.cli.index rebuild`"
+            )
+        apply_search_params_from_settings(self.index, self.settings)
+        if readd_backups:
+            self._readd_backups()
+
+    def _unwrap_ivf(self, wrapped):
+        """Take an IVF index out of the IndexIDMap2 older checkpoints wrap it in.
+
+        Returns the index to load and whether the writer must then re-add
+        every vector from the database backups. That is needed when the
+        checkpoint was taken after a removal: the wrapper had compacted its
+        id map but not the positions in the inverted lists, so the ids no
+        longer match the vectors and can't be recovered.
+        """
+        import faiss
+
+        ivf = faiss.downcast_index(wrapped.index)
+        ids = faiss.vector_to_array(wrapped.id_map)
+        intact = np.array_equal(np.sort(_ivf_labels(ivf)), np.arange(len(ids)))
+        if not self.is_writer:
+            if intact:
+                # Readers never remove from the checkpoint, so its searches
+                # stay right until the writer publishes a native one
+                return wrapped, False
+            logger.error(
+                "Index checkpoint has scrambled IVF ids; serving only new vectors "
+                "until the writer has re-added the rest from the database"
+            )
+            return with_ids(faiss.IndexFlatL2(self.embedding_size)), False
+        native = faiss.clone_index(ivf)
+        if not intact:
+            logger.error(
+                "Index checkpoint has IVF ids scrambled by an earlier removal; "
+                "re-adding every vector from the database backups"
+            )
+            native.reset()
+            return native, True
+        native.set_direct_map_type(faiss.DirectMap.NoMap)
+        invlists = native.invlists
+        for list_no in range(native.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                labels = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+                labels[:] = ids[labels]
+        logger.info(f"Moved the ids of {native.ntotal} vectors into the IVF index")
+        return native, False
+
+    def _readd_backups(self):
+        """Rebuild the index, keeping its training, from the stored vectors"""
+        import faiss
+        from app.db.database import SessionLocal
+        from app.services.index_tuning import load_stored_vectors
+
+        db = SessionLocal()
+        try:
+            db_ids, embeddings = load_stored_vectors(db, self.embedding_size)
+        finally:
+            db.close()
+        index = faiss.clone_index(self.index)
+        index.reset()
+        self.rebuild(index, db_ids, embeddings)
 
-        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+    def _apply(self, records):
+        """Apply log records to the index (writer) or the delta (reader)"""
+        import faiss
 
-        # Load or initialize FAISS index
-        if os.path.exists(self.index_path):
-            self.index = faiss.read_index(self.index_path)
-            self.id_map = np.load(self.id_map_path, allow_pickle=True).item()
-        else:
-            self.index = faiss.IndexFlatL2(self.embedding_size)
-            self.id_map = {}
+        for op, group in _group_records(records):
+            db_ids = np.array([record[2] for record in group], dtype="int64")
+            if op == OP_ADD:
+                vectors = np.stack([record[3] for record in group])
+                target = self.index if self.delta is None else self.delta
+                target.add_with_ids(vectors, db_ids)
+                self.metadata.track(db_ids)
+            else:
+                if self.delta is None:
+                    self._remove_from_index(db_ids)
+                else:
+                    in_delta = np.isin(db_ids, faiss.vector_to_array(self.delta.id_map))
+                    self.delta.remove_ids(db_ids[in_delta])
+                    self.removed = self.removed.union(db_ids[~in_delta].tolist())
+                self.metadata.remove(db_ids)
+        if records:
+            self._applied_seq = records[-1][0]
+
+    def sync(self):
+        """Apply vectors added or removed by any process since the last sync"""
+        with self._lock:
+            records = self.store.read_new()
+            if records and self.delta is not None and records[0][0] > self._applied_seq + 1:
+                # Part of the log was checkpointed and pruned before this
+                # reader got to it; start over from the newest checkpoint
+                logger.info("Index log moved past this reader, reloading checkpoint")
+                self._load()
+                return
+            self._apply(records)
+
+    def _poll(self):
+        """Run by the store's background thread every poll interval"""
+        if not self.is_writer and self.store.acquire_writer():
+            logger.info("Took over as index writer")
+            self._load()
+        elif not self.is_writer:
+            latest = self.store.latest_checkpoint()
+            if latest and latest[0] > self.base_seq:
+                self._load()
+                logger.info(f"Switched to index checkpoint at seq {self.base_seq}")
+        self.sync()
+        self.metadata.resolve_pending()
+
+    def _new_index(self):
+        """Build an empty index of the configured type.
+
+        IVF, and the int8 and pq encodings, need centroids or codebooks fitted
+        on real data before they can take vectors, so until `rebuild` has been
+        run an exact flat index is used instead.
+        """
+        import faiss
+
+        index = build_index_from_settings(self.embedding_size, self.settings)
+        if not index.is_trained:
+            return faiss.IndexFlatL2(self.embedding_size)
+        return index
+
+    def rebuild(self, index, db_ids: np.ndarray, embeddings: np.ndarray):
+        """Swap in a freshly built index holding exactly the given vectors"""
+        import faiss
+
+        if not self.is_writer:
+            raise RuntimeError(
+                "Another process is the index writer; stop the API before rebuilding"
+            )
+        index = with_ids(index)
+        apply_search_params_from_settings(index, self.settings)
+        if len(db_ids):
+            index.add_with_ids(
+                np.ascontiguousarray(embeddings, dtype="float32"),
+                np.asarray(db_ids, dtype="int64"),
+            )
+        with self._lock:
+            # Logged vectors up to now are already in the stored ones
+            self.sync()
+            self.index = index
+        self.store.checkpoint(bump=True)
+        logger.info(
+            f"Rebuilt {index_type_of(index)} {index_encoding_of(index)} index "
+            f"with {index.ntotal} vectors"
+        )
+
+    def _load_legacy(self):
+        """Import an index.faiss / id_map.npy pair written by older versions"""
+        import faiss
+
+        index_path = os.path.join(self.index_dir, "index.faiss")
+        id_map_path = os.path.join(self.index_dir, "id_map.npy")
+        if not os.path.exists(index_path):
+            return
+        index = faiss.read_index(index_path)
+        legacy_map = np.load(id_map_path, allow_pickle=True).item()
+        self.index = _with_ids(
+            index,
+            np.array([legacy_map[position] for position in range(index.ntotal)]),
+        )
+        # Checkpoint straight away so the pickle is never read again
+        self.store.write_checkpoint(0, faiss.serialize_index(self.index))
+        os.remove(index_path)
+        os.remove(id_map_path)
+        logger.info(f"Imported {self.index.ntotal} vectors from legacy index")
+
+    def start(self):
+        """Begin following the log, and checkpointing if this is the writer"""
+        self.store.start()
+
+    def close(self):
+        """Stop the background thread; the writer writes a final checkpoint"""
+        self.store.close()
+
+    def _snapshot(self, bump: bool = False):
+        import faiss
+
+        with self._lock:
+            with self.store.locked():
+                self.sync()
+                seq = self.store.rotate(bump)
+            if seq is None:
+                return None
+            self._applied_seq = seq
+            return seq, faiss.serialize_index(self.index)
+
+    def warmup(self):
+        """Run one encode and search so the first request doesn't pay for it"""
+        self.embed_text("warmup")
+        if self.ntotal:
+            self.search("warmup", top_k=1)
+        self.ready = True
+        role = "writer" if self.is_writer else "reader"
+        logger.info(f"Embedding service ready as index {role} with {self.ntotal} vectors")
 
     def embed_text(self, text):
         embedding = self.model.encode([text])
         return np.array(embedding).astype("float32")
 
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a search query, reusing cached embeddings for repeat questions"""
+        key = normalize_text(query)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = self.embed_text(key)
+            embedding.setflags(write=False)
+            self.query_cache.set(key, embedding)
+        return embedding
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Encode many texts in batches of `batch_size`"""
+        if not texts:
+            return np.empty((0, self.embedding_size), dtype="float32")
+        embeddings = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        return np.asarray(embeddings, dtype="float32")
+
+    def chunk_text(self, text: str) -> List[str]:
+        return self.chunker.split(text)
+
     def save(self):
-        faiss.write_index(self.index, self.index_path)
-        np.save(self.id_map_path, self.id_map)
+        """Force a checkpoint of the current index"""
+        self.store.checkpoint()
 
     def add(self, db_id, text):
-        embedding = self.embed_text(text)
-        self.index.add(embedding)
-        self.id_map[self.index.ntotal - 1] = db_id
-        self.save()
-
-    def search(self, query, top_k=3):
-        embedding = self.embed_text(query)
-        distances, indices = self.index.search(embedding, top_k)
+        self.add_embeddings([db_id], self.embed_text(text))
+
+    def add_embeddings(self, db_ids: List[int], embeddings: np.ndarray):
+        """Add precomputed embeddings under their database ids.
+
+        Only the new vectors are written (to the append-only log), so the cost
+        does not grow with the size of the index. They are searchable in this
+        process on return and in other workers after their next poll.
+        """
+        if not len(db_ids):
+            return
+        db_ids = np.asarray(db_ids, dtype="int64")
+        self.store.append(OP_ADD, db_ids, embeddings)
+        self.sync()
+
+    def remove(self, db_ids: List[int]):
+        """Remove the vectors (and filter metadata) stored under the given ids"""
+        if not len(db_ids):
+            return
+        db_ids = np.asarray(db_ids, dtype="int64")
+        self.store.append(OP_REMOVE, db_ids)
+        self.sync()
+
+    def _remove_from_index(self, db_ids: np.ndarray):
+        try:
+            self.index.remove_ids(db_ids)
+        except RuntimeError:
+            # HNSW graphs don't support removal; rebuild without the vectors.
+            # IVF indexes hold the ids themselves and remove them in place.
+            self.index = _without_ids(self.index, db_ids)
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed many search queries with one batched forward pass.
+
+        Queries already in the query embedding cache are not encoded again;
+        the rest are encoded together and cached. Returns one row per query.
+        """
+        keys = [normalize_text(query) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        missing = sorted({key for key, embedding in zip(keys, embeddings) if embedding is None})
+        if missing:
+            encoded = dict(zip(missing, self.embed_texts(missing)))
+            for key, embedding in encoded.items():
+                embedding = embedding.reshape(1, -1)
+                embedding.setflags(write=False)
+                self.query_cache.set(key, embedding)
+                encoded[key] = embedding
+            embeddings = [
+                encoded[key] if embedding is None else embedding
+                for key, embedding in zip(keys, embeddings)
+            ]
+        if not embeddings:
+            return np.empty((0, self.embedding_size), dtype="float32")
+        return np.vstack(embeddings)
+
+    def search(self, query, top_k=3, grade=None, topic=None, ids=None):
+        """Return the ids of the top_k chunks closest to the query.
+
+        With grade and/or topic set, or an explicit list of candidate ids,
+        the search is restricted to matching chunks inside FAISS through an
+        ID selector, so the top_k come back in one pass. On IVF and HNSW
+        indexes the filter applies to the lists probed / nodes visited, as
+        with any approximate search. A flat pq index can't take a selector,
+        so it is searched deeper and its results filtered instead.
+        """
+        embedding = self.embed_query(query)
+        return self.search_embeddings(embedding, top_k, grade=grade, topic=topic, ids=ids)[0]
+
+    def search_many(self, queries: List[str], top_k=3, grade=None, topic=None) -> List[List[int]]:
+        """`search` for many queries: one batched encode, one multi-row search"""
+        if not queries:
+            return []
+        return self.search_embeddings(self.embed_queries(queries), top_k, grade=grade, topic=topic)
+
+    def search_embeddings(
+        self,
+        embeddings: np.ndarray,
+        top_k: int,
+        grade=None,
+        topic=None,
+        ids=None,
+    ) -> List[List[int]]:
+        """Ids of the top_k chunks closest to each row of embeddings"""
+        import faiss
+
+        rows = len(embeddings)
+        allowed_ids = None
+        if grade is not None or topic is not None:
+            allowed_ids = self.metadata.ids_for(grade=grade, topic=topic)
+        if ids is not None:
+            ids = np.asarray(ids, dtype="int64")
+            allowed_ids = ids if allowed_ids is None else np.intersect1d(allowed_ids, ids)
+        selector = None
+        if allowed_ids is not None:
+            if not len(allowed_ids):
+                return [[] for _ in range(rows)]
+            selector = faiss.IDSelectorBatch(allowed_ids)
+        with self._lock:
+            index, delta, removed = self.index, self.delta, self.removed
+            if delta is None:
+                distances, labels = _search(index, embeddings, top_k, selector, allowed_ids)
+                return [[int(label) for label in row if label != -1] for row in labels]
+            if delta.ntotal:
+                hits = [_hits(*row) for row in zip(*_search(delta, embeddings, top_k, selector, allowed_ids))]
+            else:
+                hits = [[] for _ in range(rows)]
+        # A published checkpoint never changes, so it is searched without the
+        # lock; fetch extra results to make up for ids removed since
+        depth = min(top_k + len(removed), index.ntotal)
+        if depth:
+            for row_hits, row in zip(hits, zip(*_search(index, embeddings, depth, selector, allowed_ids))):
+                row_hits += [hit for hit in _hits(*row) if hit[1] not in removed]
         results = []
-        for idx in indices[0]:
-            if idx in self.id_map:
-                results.append(self.id_map[idx])
+        for row_hits in hits:
+            row_hits.sort()
+            results.append([label for _, label in row_hits[:top_k]])
         return results
+
+
+def _search(index, embedding: np.ndarray, top_k: int, selector=None, allowed_ids=None):
+    params = search_parameters(index, selector) if selector else None
+    if selector is None or params is not None:
+        return index.search(embedding, top_k, params=params)
+    # The index can't take a selector; search deeper until every row has
+    # top_k allowed hits, or the whole index has been ranked
+    depth = top_k
+    while True:
+        depth = max(1, min(depth * 4, index.ntotal))
+        distances, labels = index.search(embedding, depth)
+        allowed = np.isin(labels, allowed_ids)
+        if depth >= index.ntotal or (allowed.sum(axis=1) >= top_k).all():
+            break
+    kept_distances = np.full((len(labels), top_k), np.inf, dtype="float32")
+    kept_labels = np.full((len(labels), top_k), -1, dtype="int64")
+    for row, keep in enumerate(allowed):
+        columns = np.flatnonzero(keep)[:top_k]
+        kept_distances[row, :len(columns)] = distances[row, columns]
+        kept_labels[row, :len(columns)] = labels[row, columns]
+    return kept_distances, kept_labels
+
+
+def _hits(distances: np.ndarray, labels: np.ndarray):
+    """(distance, id) pairs of one row of search results"""
+    return [
+        (float(distance), int(label))
+        for distance, label in zip(distances, labels)
+        if label != -1
+    ]
+
+
+def _with_ids(index, db_ids: np.ndarray):
+    """Re-add the vectors of a positional index under the given ids"""
+    import faiss
+
+    vectors = _reconstruct_all(index)
+    index.reset()
+    if isinstance(index, faiss.IndexIVF):
+        # The direct map used to reconstruct only allows positional ids
+        index.set_direct_map_type(faiss.DirectMap.NoMap)
+    wrapped = with_ids(index)
+    if len(vectors):
+        wrapped.add_with_ids(vectors, np.asarray(db_ids, dtype="int64"))
+    return wrapped
+
+
+def _without_ids(index, db_ids: np.ndarray):
+    """Rebuild an IndexIDMap2 without the given ids, for indexes that can't remove"""
+    import faiss
+
+    ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(ids, db_ids)
+    base = faiss.downcast_index(index.index)
+    vectors = _reconstruct_all(base)[keep]
+    new_base = faiss.clone_index(base)
+    new_base.reset()
+    wrapped = faiss.IndexIDMap2(new_base)
+    if len(vectors):
+        wrapped.add_with_ids(vectors, ids[keep])
+    logger.info(f"Rebuilt index to remove {int((~keep).sum())} vectors")
+    return wrapped
+
+
+def _wraps_ivf(index) -> bool:
+    import faiss
+
+    return isinstance(index, faiss.IndexIDMap) and isinstance(
+        faiss.downcast_index(index.index), faiss.IndexIVF
+    )
+
+
+def _ivf_labels(ivf) -> np.ndarray:
+    """Every label stored in the inverted lists of an IVF index"""
+    import faiss
+
+    invlists = ivf.invlists
+    labels = [
+        faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+        for list_no in range(ivf.nlist)
+        if invlists.list_size(list_no)
+    ]
+    return np.concatenate(labels) if labels else np.empty(0, dtype="int64")
+
+
+def _reconstruct_all(index) -> np.ndarray:
+    import faiss
+
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    if not index.ntotal:
+        return np.empty((0, index.d), dtype="float32")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _group_records(records):
+    """Group consecutive log records by operation, preserving order"""
+    return [
+        (op, list(group))
+        for op, group in itertools.groupby(records, key=lambda record: record[1])
+    ]
+
+
+_embedding_service: Optional[EmbeddingService] = None
+_embedding_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Return the process-wide embedding service, loading it on first use"""
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService()
+    return _embedding_service
@@ -1,28 +1,91 @@
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass, field
+import threading
+import time
 from typing import (
+    AsyncIterator,
     Optional,
-    Tuple,
     Dict,
     List,
     Any,
+    Sequence,
+    Set,
+    Union,
 )
+from app.db.database import SessionLocal
 from app.models.content import Content
+from app.models.content_chunk import ContentChunk
+from app.services.answer_cache import CachedAnswer, SemanticAnswerCache
 from app.services.embedding_service import EmbeddingService
-import google.generativeai as genai
+from app.services.cache import normalize_text
+from app.services.context_builder import Passage, get_context_builder
+from app.services.hybrid_search import HybridRetriever
+from app.services.llm_backend import LLMClient, get_llm_client
+from app.services.nl_sql import (
+    SQLResult,
+    UnsafeSQLError,
+    clean_sql,
+    get_sql_cache,
+    run_read_only,
+    summarize_rows,
+    validate_read_only,
+)
+from app.services.query_log_writer import get_query_log_writer
+from app.services.telemetry import record, span
 from app.config.settings import get_settings
 import logging
 from fastapi import HTTPException
-from sqlalchemy import text
-from app.models.query_log import QueryLog
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
+# Persona prompt variations
+PERSONA_INSTRUCTIONS = {
+    "friendly": "Respond in a kind and encouraging way.",
+    "strict": "Respond strictly and directly without any casual tone.",
+    "humorous": "Add a slight touch of humor to make learning fun.",
+}
+
+
+def persona_prompt_for(persona: str) -> str:
+    return PERSONA_INSTRUCTIONS.get(
+        persona.lower(), PERSONA_INSTRUCTIONS["friendly"]
+    )
+
+
+@dataclass
+class PreparedAnswer:
+    """Everything needed to answer a question once retrieval is done"""
+
+    question_embedding: Any
+    cached_answer: Optional[str] = None
+    prompt: Optional[str] = None
+    content_ids: Set[int] = field(default_factory=set)
+    # Milliseconds spent in each retrieval leg, empty on cache hits
+    retrieval_timings: Dict[str, float] = field(default_factory=dict)
+    retrieved_chunks: int = 0
+    # Prompt size and passages left out to stay within the token budget
+    prompt_tokens: int = 0
+    dropped_passages: int = 0
+    # time.perf_counter() when answering started, for the query log
+    started_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class BatchQuestion:
+    question: str
+    persona: str = "friendly"
+    context_id: Optional[int] = None
+    grade: Optional[str] = None
+    topic: Optional[str] = None
+
 
 class GeminiService:
-    def __init__(self):
-        settings = get_settings()
-        genai.configure(api_key=settings.gemini_api_key)
-        self.model = genai.GenerativeModel("gemini-2.0-flash-exp")
+    def __init__(self, llm: Optional[LLMClient] = None):
+        # Shared by every request; see get_gemini_service
+        self.llm = llm or get_llm_client()
         self.schema_context = """
         Database Schema for AI Tutoring System:
         
@@ -42,7 +105,7 @@ class GeminiService:
         - content_id (INTEGER): Foreign key to contents table
         - chunk_text (TEXT): Text content of the chunk
         - chunk_index (INTEGER): Index of chunk within the content
-        - embedding_vector (JSON): Vector embedding (stored as JSON)
+        - embedding (BINARY): Vector embedding (packed float32)
         - created_at (DATETIME): When chunk was created
         
         Table: query_logs
@@ -62,14 +125,16 @@ class GeminiService:
         """
 
     def generate_content(self, prompt):
-        response = self.model.generate_content(prompt)
-        return response.text
+        return self.llm.generate(prompt)
 
-    def generate_sql_query(
-        self,
-        nl_question: str,
-    ) -> str:
-        """Convert natural language to SQL query"""
+    async def agenerate_content(self, prompt) -> str:
+        return await self.llm.agenerate(prompt)
+
+    async def astream_content(self, prompt) -> AsyncIterator[str]:
+        async for text_chunk in self.llm.astream(prompt):
+            yield text_chunk
+
+    def _build_sql_prompt(self, nl_question: str) -> str:
         system_prompt = f"""You are a SQL expert. Convert natural language questions to SQL queries.
         
         Database Schema:
@@ -82,11 +147,16 @@ class GeminiService:
         4. For counting, use COUNT(*)
         5. For filtering, use proper WHERE conditions
         """
+        return f"{system_prompt}\n\nQuestion: {nl_question}"
 
+    async def generate_sql_query(
+        self,
+        nl_question: str,
+    ) -> str:
+        """Convert natural language to SQL query"""
         try:
-            full_prompt = f"{system_prompt}\n\nQuestion: {nl_question}"
-
-            response = self.generate_content(full_prompt)
+            full_prompt = self._build_sql_prompt(nl_question)
+            response = await self.agenerate_content(full_prompt)
             return response
         except Exception as e:
             logger.error(f"Error generating SQL: {e}")
@@ -95,51 +165,133 @@ class GeminiService:
                 detail="Failed to generate SQL query",
             )
 
-    def generate_context_based_response(
+    def prepare_context_based_response(
         self,
         question: str,
         persona: str,
         db: Session,
+        vector_store: EmbeddingService,
+        retriever: HybridRetriever,
+        answer_cache: SemanticAnswerCache,
         context_id: Optional[int] = None,
-    ) -> str:
-        """Generate context based response"""
-        try:
-            vector_store = EmbeddingService()
-            matched_ids = vector_store.search(question)
+        grade: Optional[str] = None,
+        topic: Optional[str] = None,
+    ) -> PreparedAnswer:
+        """Embed, check the answer cache and retrieve context for a question.
+
+        This is the blocking part of answering (model forward pass, FAISS
+        and full-text search, DB reads) and is meant to run in a worker
+        thread.
+        """
+        started_at = time.perf_counter()
+        with span("embed"):
+            question_embedding = vector_store.embed_query(question)
+        with span("answer_cache"):
+            cached = answer_cache.lookup(
+                question_embedding,
+                persona,
+                context_id,
+                grade=grade,
+                topic=topic,
+            )
+            fresh = cached is not None and self._is_cache_fresh(db, answer_cache, cached)
+        if fresh:
+            return PreparedAnswer(
+                question_embedding=question_embedding,
+                cached_answer=cached.answer,
+                started_at=started_at,
+            )
 
-            # Retrieve matched contents from DB
-            if context_id:
-                contents = (
-                    db.query(Content)
+        # Retrieve matched passages from DB
+        retrieval_timings = {}
+        if context_id:
+            with span("fetch_chunks"):
+                chunks = (
+                    db.query(ContentChunk)
                     .filter(
-                        Content.id == context_id,
+                        ContentChunk.content_id == context_id,
                     )
+                    .order_by(ContentChunk.chunk_index)
                     .all()
                 )
-            else:
-                contents = (
-                    db.query(Content)
-                    .filter(
-                        Content.id.in_(matched_ids),
+            # Rank the document's own chunks against the question so the
+            # most relevant parts win the token budget
+            ranked_ids = []
+            if chunks:
+                with span("retrieve"):
+                    ranked_ids = vector_store.search(
+                        question,
+                        top_k=len(chunks),
+                        ids=[chunk.id for chunk in chunks],
                     )
-                    .all()
+            ranks = {chunk_id: rank for rank, chunk_id in enumerate(ranked_ids)}
+            chunks.sort(key=lambda chunk: (ranks.get(chunk.id, len(ranks)), chunk.chunk_index))
+        else:
+            with span("retrieve"):
+                retrieved = retriever.search(
+                    question,
+                    top_k=get_settings().retrieval_top_k,
+                    grade=grade,
+                    topic=topic,
                 )
-
-            contexts = [content.content for content in contents]
-            combined_context = "\n".join(contexts)
-
-            # Persona prompt variations
-            persona_instructions = {
-                "friendly": "Respond in a kind and encouraging way.",
-                "strict": "Respond strictly and directly without any casual tone.",
-                "humorous": "Add a slight touch of humor to make learning fun.",
-            }
-            persona_prompt = persona_instructions.get(
-                persona.lower(), persona_instructions["friendly"]
+            matched_ids = retrieved.chunk_ids
+            retrieval_timings = retrieved.timings
+            # The legs run concurrently; report each as part of "retrieve"
+            for leg in ("vector", "lexical"):
+                if leg in retrieval_timings:
+                    record(f"retrieve.{leg}", retrieval_timings[leg] / 1000)
+            with span("fetch_chunks"):
+                chunks_by_id = {
+                    chunk.id: chunk
+                    for chunk in db.query(ContentChunk).filter(
+                        ContentChunk.id.in_(matched_ids),
+                    )
+                }
+            # Keep the passages in ranking order
+            chunks = [
+                chunks_by_id[chunk_id]
+                for chunk_id in matched_ids
+                if chunk_id in chunks_by_id
+            ]
+
+        return self._prepare_prompt(
+            question,
+            persona,
+            question_embedding,
+            chunks,
+            retrieval_timings=retrieval_timings,
+            started_at=started_at,
+        )
+
+    def _prepare_prompt(
+        self,
+        question: str,
+        persona: str,
+        question_embedding: Any,
+        chunks: List[ContentChunk],
+        retrieval_timings: Dict[str, float],
+        started_at: float,
+    ) -> PreparedAnswer:
+        """Pack ranked chunks into the tutoring prompt for a question"""
+        context_builder = get_context_builder()
+        with span("build_context"):
+            context = context_builder.build(
+                [
+                    Passage(
+                        key=chunk.id,
+                        text=chunk.chunk_text,
+                        content_id=chunk.content_id,
+                        chunk_index=chunk.chunk_index,
+                    )
+                    for chunk in chunks
+                ]
             )
+        content_ids = {passage.content_id for passage in context.passages}
+        combined_context = context.text
+        persona_prompt = persona_prompt_for(persona)
 
-            # Generate Gemini answer
-            prompt = f"""
+        # Generate Gemini answer
+        prompt = f"""
             You are an educational tutor. {persona_prompt}
 
             Use this context to answer clearly for students. If you couldn't find the answer in the context, respond with "I don't know, It is out of context question.".
@@ -150,19 +302,99 @@ class GeminiService:
 
             Answer:
             """
-            response = self.generate_content(prompt)
+        return PreparedAnswer(
+            question_embedding=question_embedding,
+            prompt=prompt,
+            content_ids=content_ids,
+            retrieval_timings=retrieval_timings,
+            retrieved_chunks=len(context.passages),
+            prompt_tokens=context_builder.count_tokens(prompt),
+            dropped_passages=context.dropped,
+            started_at=started_at,
+        )
+
+    def finish_context_based_response(
+        self,
+        prepared: PreparedAnswer,
+        question: str,
+        persona: str,
+        answer: str,
+        db: Session,
+        answer_cache: SemanticAnswerCache,
+        context_id: Optional[int] = None,
+        grade: Optional[str] = None,
+        topic: Optional[str] = None,
+    ):
+        """Cache a freshly generated answer and write the query log"""
+        # Answers built without any context would go stale as soon as
+        # matching content is uploaded, so only grounded answers are cached
+        if prepared.cached_answer is None and prepared.content_ids:
+            with span("answer_cache_store"):
+                answer_cache.store(
+                    prepared.question_embedding,
+                    persona,
+                    context_id,
+                    answer=answer,
+                    content_versions=self._content_versions(db, prepared.content_ids),
+                    grade=grade,
+                    topic=topic,
+                )
+        self._log_query(
+            question,
+            persona,
+            answer,
+            response_time=time.perf_counter() - prepared.started_at,
+            retrieved_chunks=prepared.retrieved_chunks,
+        )
+
+    async def generate_context_based_response(
+        self,
+        question: str,
+        persona: str,
+        db: Session,
+        vector_store: EmbeddingService,
+        retriever: HybridRetriever,
+        answer_cache: SemanticAnswerCache,
+        context_id: Optional[int] = None,
+        grade: Optional[str] = None,
+        topic: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Generate context based response"""
+        try:
+            prepared = await run_in_threadpool(
+                self.prepare_context_based_response,
+                question=question,
+                persona=persona,
+                db=db,
+                vector_store=vector_store,
+                retriever=retriever,
+                answer_cache=answer_cache,
+                context_id=context_id,
+                grade=grade,
+                topic=topic,
+            )
+            if prepared.cached_answer is not None:
+                answer = prepared.cached_answer
+            else:
+                with span("llm"):
+                    answer = await self.agenerate_content(prepared.prompt)
 
-            # save respone to the db for query log
-            query_log = QueryLog(
-                user_question=question,
+            await run_in_threadpool(
+                self.finish_context_based_response,
+                prepared=prepared,
+                question=question,
                 persona=persona,
-                ai_response=response,
+                answer=answer,
+                db=db,
+                answer_cache=answer_cache,
+                context_id=context_id,
+                grade=grade,
+                topic=topic,
             )
-            db.add(query_log)
-            db.commit()
             return {
                 "persona": persona,
-                "answer": response,
+                "answer": answer,
+                "prepared": prepared,
             }
         except Exception as e:
             logger.error(f"Error asking question: {e}")
@@ -171,57 +403,423 @@ class GeminiService:
                 detail="Failed to give answer",
             )
 
-    def process_nl_query(
+    async def stream_context_based_response(
+        self,
+        prepared: PreparedAnswer,
+        question: str,
+        persona: str,
+        answer_cache: SemanticAnswerCache,
+        context_id: Optional[int] = None,
+        grade: Optional[str] = None,
+        topic: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Yield answer text as it is generated, then cache and log it.
+
+        Takes the result of `prepare_context_based_response` so retrieval
+        errors surface before the response starts streaming. The request's
+        session is closed once streaming starts, so the log is written with a
+        session of its own.
+        """
+        if prepared.cached_answer is not None:
+            parts = [prepared.cached_answer]
+            yield prepared.cached_answer
+        else:
+            parts = []
+            with span("llm"):
+                async for text_chunk in self.astream_content(prepared.prompt):
+                    parts.append(text_chunk)
+                    yield text_chunk
+
+        db = SessionLocal()
+        try:
+            await run_in_threadpool(
+                self.finish_context_based_response,
+                prepared=prepared,
+                question=question,
+                persona=persona,
+                answer="".join(parts),
+                db=db,
+                answer_cache=answer_cache,
+                context_id=context_id,
+                grade=grade,
+                topic=topic,
+            )
+        finally:
+            db.close()
+
+    def prepare_batch(
+        self,
+        items: Sequence[BatchQuestion],
+        db: Session,
+        vector_store: EmbeddingService,
+        retriever: HybridRetriever,
+        answer_cache: SemanticAnswerCache,
+    ) -> List[Union[PreparedAnswer, Exception]]:
+        """`prepare_context_based_response` for many questions at once.
+
+        All questions are embedded in one batched forward pass, questions
+        sharing grade/topic filters are searched with one multi-row FAISS
+        search, and chunks and content versions are read with one IN query
+        each. Items that fail get their exception in place of a result.
+        """
+        started_at = time.perf_counter()
+        results: List[Union[PreparedAnswer, Exception, None]] = [None] * len(items)
+        with span("embed"):
+            embeddings = vector_store.embed_queries([item.question for item in items])
+
+        with span("answer_cache"):
+            cached = [
+                answer_cache.lookup(
+                    embeddings[position],
+                    item.persona,
+                    item.context_id,
+                    grade=item.grade,
+                    topic=item.topic,
+                )
+                for position, item in enumerate(items)
+            ]
+            versions = self._content_versions(
+                db,
+                {content_id for entry in cached if entry for content_id in entry.content_versions},
+            )
+            for position, entry in enumerate(cached):
+                if entry is None:
+                    continue
+                current = {content_id: versions.get(content_id) for content_id in entry.content_versions}
+                if current == entry.content_versions:
+                    results[position] = PreparedAnswer(
+                        question_embedding=embeddings[position:position + 1],
+                        cached_answer=entry.answer,
+                        started_at=started_at,
+                    )
+                else:
+                    answer_cache.discard(entry)
+
+        ranked_ids: Dict[int, List[int]] = {}
+        timings: Dict[int, Dict[str, float]] = {}
+        groups = defaultdict(list)
+        documents = defaultdict(list)
+        for position, item in enumerate(items):
+            if results[position] is not None:
+                continue
+            if item.context_id:
+                documents[item.context_id].append(position)
+            else:
+                groups[(item.grade, item.topic)].append(position)
+
+        top_k = get_settings().retrieval_top_k
+        with span("retrieve"):
+            for (grade, topic), positions in groups.items():
+                try:
+                    retrieved = retriever.search_many(
+                        [items[position].question for position in positions],
+                        top_k=top_k,
+                        grade=grade,
+                        topic=topic,
+                    )
+                except Exception as e:
+                    for position in positions:
+                        results[position] = e
+                    continue
+                for position, result in zip(positions, retrieved):
+                    ranked_ids[position] = result.chunk_ids
+                    timings[position] = result.timings
+
+        with span("fetch_chunks"):
+            chunks_by_id = {}
+            wanted = list({chunk_id for chunk_ids in ranked_ids.values() for chunk_id in chunk_ids})
+            if wanted or documents:
+                query = db.query(ContentChunk)
+                if documents:
+                    query = query.filter(
+                        ContentChunk.id.in_(wanted) | ContentChunk.content_id.in_(list(documents))
+                    )
+                else:
+                    query = query.filter(ContentChunk.id.in_(wanted))
+                chunks_by_id = {chunk.id: chunk for chunk in query}
+
+        # Questions about one document rank that document's own chunks
+        document_chunks = defaultdict(list)
+        for chunk in chunks_by_id.values():
+            if chunk.content_id in documents:
+                document_chunks[chunk.content_id].append(chunk)
+        with span("retrieve"):
+            for content_id, positions in documents.items():
+                chunks = sorted(document_chunks[content_id], key=lambda chunk: chunk.chunk_index)
+                for position in positions:
+                    if not chunks:
+                        ranked_ids[position] = []
+                        continue
+                    try:
+                        ranking = vector_store.search_embeddings(
+                            embeddings[position:position + 1],
+                            top_k=len(chunks),
+                            ids=[chunk.id for chunk in chunks],
+                        )[0]
+                    except Exception as e:
+                        results[position] = e
+                        continue
+                    ranks = {chunk_id: rank for rank, chunk_id in enumerate(ranking)}
+                    ranked_ids[position] = [
+                        chunk.id
+                        for chunk in sorted(
+                            chunks,
+                            key=lambda chunk: (ranks.get(chunk.id, len(ranks)), chunk.chunk_index),
+                        )
+                    ]
+
+        for position, chunk_ids in ranked_ids.items():
+            if results[position] is not None:
+                continue
+            item = items[position]
+            try:
+                results[position] = self._prepare_prompt(
+                    item.question,
+                    item.persona,
+                    embeddings[position:position + 1],
+                    [chunks_by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in chunks_by_id],
+                    retrieval_timings=timings.get(position, {}),
+                    started_at=started_at,
+                )
+            except Exception as e:
+                results[position] = e
+        return results
+
+    def finish_batch(
+        self,
+        items: Sequence[BatchQuestion],
+        prepared: Sequence[Union[PreparedAnswer, Exception]],
+        answers: Sequence[Union[str, Exception]],
+        db: Session,
+        answer_cache: SemanticAnswerCache,
+    ):
+        """Cache and log every answered question of a batch"""
+        fresh = [
+            position
+            for position, (prepared_item, answer) in enumerate(zip(prepared, answers))
+            if isinstance(prepared_item, PreparedAnswer)
+            and not isinstance(answer, Exception)
+            and prepared_item.cached_answer is None
+            and prepared_item.content_ids
+        ]
+        if fresh:
+            with span("answer_cache_store"):
+                versions = self._content_versions(
+                    db,
+                    set().union(*(prepared[position].content_ids for position in fresh)),
+                )
+                for position in fresh:
+                    item, prepared_item = items[position], prepared[position]
+                    answer_cache.store(
+                        prepared_item.question_embedding,
+                        item.persona,
+                        item.context_id,
+                        answer=answers[position],
+                        content_versions={
+                            content_id: versions[content_id]
+                            for content_id in prepared_item.content_ids
+                            if content_id in versions
+                        },
+                        grade=item.grade,
+                        topic=item.topic,
+                    )
+        for item, prepared_item, answer in zip(items, prepared, answers):
+            if isinstance(prepared_item, Exception) or isinstance(answer, Exception):
+                continue
+            self._log_query(
+                item.question,
+                item.persona,
+                answer,
+                response_time=time.perf_counter() - prepared_item.started_at,
+                retrieved_chunks=prepared_item.retrieved_chunks,
+            )
+
+    async def answer_batch(
+        self,
+        items: Sequence[BatchQuestion],
+        db: Session,
+        vector_store: EmbeddingService,
+        retriever: HybridRetriever,
+        answer_cache: SemanticAnswerCache,
+        concurrency: int = 8,
+    ) -> List[Dict[str, Any]]:
+        """Answer many questions, with at most `concurrency` LLM calls at once.
+
+        Returns one result per question, in order. A question that fails
+        gets an `error` instead of an `answer`; the rest are unaffected.
+        """
+        prepared = await run_in_threadpool(
+            self.prepare_batch,
+            items=items,
+            db=db,
+            vector_store=vector_store,
+            retriever=retriever,
+            answer_cache=answer_cache,
+        )
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def answer(prepared_item: Union[PreparedAnswer, Exception]):
+            if isinstance(prepared_item, Exception):
+                return prepared_item
+            if prepared_item.cached_answer is not None:
+                return prepared_item.cached_answer
+            async with semaphore:
+                try:
+                    with span("llm"):
+                        return await self.agenerate_content(prepared_item.prompt)
+                except Exception as e:
+                    return e
+
+        answers = await asyncio.gather(*(answer(prepared_item) for prepared_item in prepared))
+        await run_in_threadpool(
+            self.finish_batch,
+            items=items,
+            prepared=prepared,
+            answers=answers,
+            db=db,
+            answer_cache=answer_cache,
+        )
+
+        results = []
+        for position, (item, prepared_item, answer) in enumerate(zip(items, prepared, answers)):
+            result = {
+                "index": position,
+                "persona": item.persona,
+                "answer": None,
+                "cached": False,
+                "error": None,
+            }
+            if isinstance(answer, Exception):
+                logger.error(f"Error answering batch question {position}: {answer}")
+                result["error"] = "Failed to give answer"
+            else:
+                result["answer"] = answer
+                result["cached"] = prepared_item.cached_answer is not None
+            results.append(result)
+        return results
+
+    def _content_versions(self, db: Session, content_ids):
+        if not content_ids:
+            return {}
+        return dict(
+            db.query(Content.id, Content.updated_at).filter(
+                Content.id.in_(content_ids),
+            )
+        )
+
+    def _is_cache_fresh(
+        self,
+        db: Session,
+        answer_cache: SemanticAnswerCache,
+        cached: CachedAnswer,
+    ) -> bool:
+        """Check the content behind a cached answer hasn't changed since"""
+        if self._content_versions(db, cached.content_versions) == cached.content_versions:
+            return True
+        answer_cache.discard(cached)
+        return False
+
+    def _log_query(
+        self,
+        question: str,
+        persona: str,
+        answer: str,
+        response_time: Optional[float] = None,
+        retrieved_chunks: Optional[int] = None,
+    ):
+        # queue the response for the query log, written in the background
+        with span("log"):
+            get_query_log_writer().submit(
+                question,
+                persona,
+                answer,
+                response_time=response_time,
+                retrieved_chunks=retrieved_chunks,
+            )
+
+    def _execute_sql(self, db: Session, sql_query: str) -> SQLResult:
+        settings = get_settings()
+        return run_read_only(
+            db.get_bind(),
+            sql_query,
+            max_rows=settings.nl_sql_max_rows,
+            timeout_ms=settings.nl_sql_statement_timeout_ms,
+        )
+
+    def _results_for_prompt(self, result: SQLResult) -> Any:
+        """Rows as dicts when few enough, otherwise a summary of them"""
+        prompt_rows = get_settings().nl_sql_prompt_rows
+        if len(result.rows) <= prompt_rows:
+            return [dict(zip(result.columns, row)) for row in result.rows]
+        summary = summarize_rows(result.columns, result.rows, sample_size=prompt_rows)
+        if result.truncated:
+            summary["note"] = f"Only the first {len(result.rows)} rows were read"
+        return summary
+
+    async def process_nl_query(
         self,
         nl_question: str,
         persona: str,
         db: Session,
-    ) -> Tuple[str, str, List[Dict[str, Any]]]:
+    ) -> Dict[str, Any]:
         """Process natural language query and return SQL + results"""
+        started_at = time.perf_counter()
+        sql_cache = get_sql_cache()
+        cache_key = normalize_text(nl_question)
         try:
-            # Generate SQL query
-            sql_query = self.generate_sql_query(
-                nl_question=nl_question,
-            )
-
-            # Clean up the SQL query (remove markdown formatting if present)
-            sql_query = sql_query.strip()
-            if sql_query.startswith("```sql"):
-                sql_query = sql_query[6:]
-            if sql_query.endswith("```"):
-                sql_query = sql_query[:-3]
-            sql_query = sql_query.strip()
-            logger.info(f"Generated SQL query: {sql_query}")
+            sql_query = sql_cache.get(cache_key)
+            if sql_query is None:
+                # Generate SQL query
+                with span("llm.sql"):
+                    sql_query = clean_sql(
+                        await self.generate_sql_query(
+                            nl_question=nl_question,
+                        )
+                    )
+                logger.info(f"Generated SQL query: {sql_query}")
+                validate_read_only(sql_query)
 
             # Execute the query
-            result = db.execute(text(sql_query))
-
-            # Convert results to list of dictionaries
-            columns = result.keys()
-            data = []
-            for row in result:
-                data.append(dict(zip(columns, row)))
+            try:
+                with span("sql_execute"):
+                    result = await run_in_threadpool(self._execute_sql, db, sql_query)
+            except Exception:
+                sql_cache.pop(cache_key)
+                raise
+            sql_cache.set(cache_key, sql_query)
 
             # Generate human-readable answer
-            answer = self._generate_human_readable_answer(
-                question=nl_question,
-                sql_query=sql_query,
-                persona=persona,
-                data=data,
-            )
-            query_log = QueryLog(
-                user_question=nl_question,
-                persona=persona,
-                ai_response=answer,
+            with span("llm.answer"):
+                answer = await self._generate_human_readable_answer(
+                    question=nl_question,
+                    sql_query=sql_query,
+                    persona=persona,
+                    data=self._results_for_prompt(result),
+                    row_count=len(result.rows),
+                )
+            # In a worker thread like the other answers' logging, since
+            # without a running writer thread it inserts synchronously
+            await run_in_threadpool(
+                self._log_query,
+                nl_question,
+                persona,
+                answer,
+                response_time=time.perf_counter() - started_at,
             )
-            db.add(query_log)
-            db.commit()
 
             return {
                 "persona": persona,
                 "answer": answer,
             }
 
+        except UnsafeSQLError as e:
+            logger.warning(f"Rejected generated SQL: {e}")
+            raise HTTPException(
+                status_code=400,
+                detail="Question can't be answered with a read-only query",
+            )
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error processing NL query: {e}")
             raise HTTPException(
@@ -229,31 +827,24 @@ class GeminiService:
                 detail="Failed to process NL query",
             )
 
-    def _generate_human_readable_answer(
+    async def _generate_human_readable_answer(
         self,
         question: str,
         sql_query: str,
         persona: str,
-        data: List[Dict[str, Any]],
+        data: Any,
+        row_count: int,
     ) -> str:
         """Generate a human-readable answer from SQL results"""
         try:
-
-            # Persona prompt variations
-            persona_instructions = {
-                "friendly": "Respond in a kind and encouraging way.",
-                "strict": "Respond strictly and directly without any casual tone.",
-                "humorous": "Add a slight touch of humor to make learning fun.",
-            }
-            persona_prompt = persona_instructions.get(
-                persona.lower(), persona_instructions["friendly"]
-            )
+            persona_prompt = persona_prompt_for(persona)
 
             system_prompt = f"""You are a helpful assistant that explains database query results in natural language.
             {persona_prompt}
             Given a user's question, the SQL query used to answer it, and the results, provide a clear, 
             conversational explanation of what the data shows.            
             If there are multiple results, summarize them appropriately.
+            Large results are given as a summary: the row count, statistics per column and sample rows.
             """
 
             user_message = f"""
@@ -268,7 +859,7 @@ class GeminiService:
                 f"{system_prompt}\n\nQuestion: {user_message}"
             )
 
-            response = self.generate_content(
+            response = await self.agenerate_content(
                 full_prompt,
             )
 
@@ -276,4 +867,18 @@ class GeminiService:
 
         except Exception as e:
             logger.error(f"Error generating human-readable answer: {e}")
-            return f"Found {len(data)} results for your query."
+            return f"Found {row_count} results for your query."
+
+
+_gemini_service: Optional[GeminiService] = None
+_gemini_service_lock = threading.Lock()
+
+
+def get_gemini_service() -> GeminiService:
+    """Return the process-wide tutoring service and its LLM client"""
+    global _gemini_service
+    if _gemini_service is None:
+        with _gemini_service_lock:
+            if _gemini_service is None:
+                _gemini_service = GeminiService()
+    return _gemini_service
@@ -0,0 +1,239 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy import func, literal_column
+from app.config.settings import get_settings
+from app.db.database import SessionLocal, supports_full_text_search
+from app.models.content import Content
+from app.models.content_chunk import ContentChunk
+from app.services.embedding_service import EmbeddingService, get_embedding_service
+
+logger = logging.getLogger(__name__)
+
+TEXT_SEARCH_CONFIG = "english"
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]],
+    k: int = 60,
+    limit: Optional[int] = None,
+) -> List[int]:
+    """Fuse ranked id lists, scoring each id by the sum of 1 / (k + rank)"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    # sorted() is stable, so ties keep the order ids were first seen in
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return fused[:limit] if limit is not None else fused
+
+
+@dataclass
+class RetrievalResult:
+    chunk_ids: List[int]
+    # Wall time of each leg and of the whole retrieval, in milliseconds
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+class HybridRetriever:
+    """Retrieve chunks with FAISS and PostgreSQL full-text search at once.
+
+    The lexical leg catches exact terms (formula names, vocabulary words)
+    that the embedding model blurs. Both legs run concurrently, each
+    returning `candidates` ids, and are fused with reciprocal-rank fusion.
+    On databases without full-text search only the vector leg runs.
+    """
+
+    def __init__(
+        self,
+        vector_store: EmbeddingService,
+        enabled: bool = True,
+        candidates: int = 20,
+        rrf_k: int = 60,
+        workers: int = 8,
+    ):
+        self.vector_store = vector_store
+        self.enabled = enabled and supports_full_text_search()
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="lexical-search",
+        )
+
+    def lexical_search(
+        self,
+        question: str,
+        limit: int,
+        grade: Optional[str] = None,
+        topic: Optional[str] = None,
+    ) -> List[int]:
+        """Chunk ids matching the question's terms, best ts_rank_cd first"""
+        query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, question)
+        search_vector = literal_column("content_chunks.search_vector")
+        # Runs on a worker thread, so it cannot share the request's session
+        db = SessionLocal()
+        try:
+            rows = db.query(ContentChunk.id).filter(search_vector.op("@@")(query))
+            if grade is not None or topic is not None:
+                rows = rows.join(Content, Content.id == ContentChunk.content_id)
+                if grade is not None:
+                    rows = rows.filter(Content.grade == grade)
+                if topic is not None:
+                    rows = rows.filter(Content.topic == topic)
+            rows = rows.order_by(
+                func.ts_rank_cd(search_vector, query).desc(),
+                ContentChunk.id,
+            ).limit(limit)
+            return [chunk_id for chunk_id, in rows]
+        finally:
+            db.close()
+
+    def _timed_lexical_search(self, *args, **kwargs):
+        started = time.perf_counter()
+        ids = self.lexical_search(*args, **kwargs)
+        return ids, (time.perf_counter() - started) * 1000
+
+    def search(
+        self,
+        question: str,
+        top_k: int,
+        grade: Optional[str] = None,
+        topic: Optional[str] = None,
+    ) -> RetrievalResult:
+        started = time.perf_counter()
+        if not self.enabled:
+            ids = self.vector_store.search(question, top_k=top_k, grade=grade, topic=topic)
+            elapsed = (time.perf_counter() - started) * 1000
+            return RetrievalResult(ids, {"vector": elapsed, "total": elapsed})
+
+        candidates = max(self.candidates, top_k)
+        lexical = self._executor.submit(
+            self._timed_lexical_search,
+            question,
+            candidates,
+            grade=grade,
+            topic=topic,
+        )
+        vector_ids = self.vector_store.search(
+            question,
+            top_k=candidates,
+            grade=grade,
+            topic=topic,
+        )
+        vector_ms = (time.perf_counter() - started) * 1000
+        try:
+            lexical_ids, lexical_ms = lexical.result()
+        except Exception as e:
+            # Full-text search is an enhancement; fall back to vectors only
+            logger.error(f"Lexical search failed: {e}")
+            lexical_ids, lexical_ms = [], 0.0
+
+        chunk_ids = reciprocal_rank_fusion(
+            [vector_ids, lexical_ids],
+            k=self.rrf_k,
+            limit=top_k,
+        )
+        timings = {
+            "vector": vector_ms,
+            "lexical": lexical_ms,
+            "total": (time.perf_counter() - started) * 1000,
+        }
+        logger.debug(
+            f"Hybrid retrieval: vector {vector_ms:.1f}ms ({len(vector_ids)} hits), "
+            f"lexical {lexical_ms:.1f}ms ({len(lexical_ids)} hits)"
+        )
+        return RetrievalResult(chunk_ids, timings)
+
+    def search_many(
+        self,
+        questions: List[str],
+        top_k: int,
+        grade: Optional[str] = None,
+        topic: Optional[str] = None,
+    ) -> List[RetrievalResult]:
+        """`search` for many questions sharing the same filters.
+
+        The vector leg is one batched encode and one multi-row FAISS search;
+        the lexical queries run concurrently meanwhile, one per question.
+        """
+        started = time.perf_counter()
+        if not questions:
+            return []
+        candidates = top_k
+        lexical = []
+        if self.enabled:
+            candidates = max(self.candidates, top_k)
+            lexical = [
+                self._executor.submit(
+                    self._timed_lexical_search,
+                    question,
+                    candidates,
+                    grade=grade,
+                    topic=topic,
+                )
+                for question in questions
+            ]
+        vector_ids = self.vector_store.search_many(
+            questions,
+            top_k=candidates,
+            grade=grade,
+            topic=topic,
+        )
+        vector_ms = (time.perf_counter() - started) * 1000
+        if not self.enabled:
+            return [
+                RetrievalResult(ids, {"vector": vector_ms, "total": vector_ms})
+                for ids in vector_ids
+            ]
+
+        results = []
+        for question_vector_ids, future in zip(vector_ids, lexical):
+            try:
+                lexical_ids, lexical_ms = future.result()
+            except Exception as e:
+                logger.error(f"Lexical search failed: {e}")
+                lexical_ids, lexical_ms = [], 0.0
+            chunk_ids = reciprocal_rank_fusion(
+                [question_vector_ids, lexical_ids],
+                k=self.rrf_k,
+                limit=top_k,
+            )
+            results.append(
+                RetrievalResult(
+                    chunk_ids,
+                    {
+                        "vector": vector_ms,
+                        "lexical": lexical_ms,
+                        "total": (time.perf_counter() - started) * 1000,
+                    },
+                )
+            )
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+_hybrid_retriever: Optional[HybridRetriever] = None
+_hybrid_retriever_lock = threading.Lock()
+
+
+def get_hybrid_retriever() -> HybridRetriever:
+    """Return the process-wide hybrid retriever"""
+    global _hybrid_retriever
+    if _hybrid_retriever is None:
+        with _hybrid_retriever_lock:
+            if _hybrid_retriever is None:
+                settings = get_settings()
+                _hybrid_retriever = HybridRetriever(
+                    get_embedding_service(),
+                    enabled=settings.hybrid_search_enabled,
+                    candidates=settings.hybrid_search_candidates,
+                    rrf_k=settings.hybrid_search_rrf_k,
+                    workers=settings.hybrid_search_workers,
+                )
+    return _hybrid_retriever
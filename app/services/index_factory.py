@@ -0,0 +1,190 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+# How vectors are stored inside the index, from exact to most compressed:
+# 4, 2 or 1 bytes per dimension, or pq_m bytes per vector
+ENCODINGS = ("float32", "fp16", "int8", "pq")
+
+# faiss is imported inside the functions below rather than here, so that
+# importing the API does not load it before the warmup builds the index;
+# for the same reason the quantizers are named, not faiss constants
+SCALAR_QUANTIZERS = {
+    "fp16": "QT_fp16",
+    "int8": "QT_8bit",
+}
+
+
+def build_index(
+    dimension: int,
+    index_type: str = "flat",
+    nlist: int = 1024,
+    hnsw_m: int = 32,
+    ef_construction: int = 80,
+    encoding: str = "float32",
+    pq_m: int = 48,
+    pq_nbits: int = 8,
+):
+    """Create an empty FAISS index of the given type and vector encoding.
+
+    IVF indexes and int8 / pq encodings come back untrained; call
+    `train_index` before adding.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown index encoding {encoding!r}, expected one of {ENCODINGS}")
+    if encoding == "pq" and dimension % pq_m:
+        raise ValueError(f"FAISS_PQ_M={pq_m} must divide the dimension {dimension}")
+    import faiss
+
+    qtype = None
+    if encoding in SCALAR_QUANTIZERS:
+        qtype = getattr(faiss.ScalarQuantizer, SCALAR_QUANTIZERS[encoding])
+    if index_type == "flat":
+        if encoding == "float32":
+            return faiss.IndexFlatL2(dimension)
+        if encoding == "pq":
+            return faiss.IndexPQ(dimension, pq_m, pq_nbits, faiss.METRIC_L2)
+        return faiss.IndexScalarQuantizer(dimension, qtype, faiss.METRIC_L2)
+    if index_type == "ivf":
+        quantizer = faiss.IndexFlatL2(dimension)
+        if encoding == "float32":
+            return faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_L2)
+        if encoding == "pq":
+            return faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits, faiss.METRIC_L2)
+        return faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, qtype, faiss.METRIC_L2)
+    if index_type == "hnsw":
+        if encoding == "float32":
+            index = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_L2)
+        elif encoding == "pq":
+            index = faiss.IndexHNSWPQ(dimension, pq_m, hnsw_m, pq_nbits)
+        else:
+            index = faiss.IndexHNSWSQ(dimension, qtype, hnsw_m, faiss.METRIC_L2)
+        index.hnsw.efConstruction = ef_construction
+        return index
+    raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+
+def build_index_from_settings(dimension: int, settings, nlist: int = None):
+    return build_index(
+        dimension,
+        index_type=settings.faiss_index_type,
+        nlist=nlist or settings.faiss_ivf_nlist,
+        hnsw_m=settings.faiss_hnsw_m,
+        ef_construction=settings.faiss_hnsw_ef_construction,
+        encoding=settings.faiss_index_encoding,
+        pq_m=settings.faiss_pq_m,
+        pq_nbits=settings.faiss_pq_nbits,
+    )
+
+
+def with_ids(index):
+    """Return `index` ready to store database ids through add_with_ids.
+
+    IVF indexes keep ids in their inverted lists, so they are used as they
+    are. Every other index only knows positions and is wrapped in an
+    IndexIDMap2. An IVF index must never be wrapped: on removal the wrapper
+    compacts its id map while the inverted lists keep the old positions,
+    so later searches return the wrong ids.
+    """
+    import faiss
+
+    if isinstance(index, faiss.IndexIVF):
+        return index
+    return faiss.IndexIDMap2(index)
+
+
+def index_type_of(index) -> str:
+    """Return which of INDEX_TYPES a loaded index is"""
+    import faiss
+
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def index_encoding_of(index) -> str:
+    """Return which of ENCODINGS a loaded index stores its vectors in"""
+    import faiss
+
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        qtype = index.sq.qtype
+        for encoding, scalar_quantizer in SCALAR_QUANTIZERS.items():
+            if qtype == getattr(faiss.ScalarQuantizer, scalar_quantizer):
+                return encoding
+    return "float32"
+
+
+def apply_search_params(index, nprobe: int = None, ef_search: int = None):
+    """Set query-time parameters; they are not all persisted with the index"""
+    import faiss
+
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexIVF) and nprobe:
+        index.nprobe = nprobe
+    if isinstance(index, faiss.IndexHNSW) and ef_search:
+        index.hnsw.efSearch = ef_search
+
+
+def search_parameters(index, selector):
+    """Build SearchParameters restricting a search to `selector`.
+
+    The subclass matching the index is used and the index's current
+    nprobe / efSearch are copied in, since a parameters object would
+    otherwise reset them to FAISS defaults. Returns None for a flat pq
+    index, whose search FAISS can't restrict; filter its results instead.
+    """
+    import faiss
+
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    if isinstance(index, faiss.IndexPQ):
+        return None
+    return faiss.SearchParameters(sel=selector)
+
+
+def apply_search_params_from_settings(index, settings):
+    apply_search_params(
+        index,
+        nprobe=settings.faiss_ivf_nprobe,
+        ef_search=settings.faiss_hnsw_ef_search,
+    )
+
+
+def effective_nlist(nlist: int, num_vectors: int) -> int:
+    """Clamp nlist so every centroid gets a reasonable number of training points"""
+    # FAISS wants roughly 39 points per centroid; fall back to sqrt(n) below that
+    if num_vectors >= nlist * 39:
+        return nlist
+    clamped = max(1, min(nlist, int(np.sqrt(num_vectors))))
+    logger.warning(
+        f"Only {num_vectors} vectors for nlist={nlist}, using nlist={clamped}"
+    )
+    return clamped
+
+
+def train_index(index, vectors: np.ndarray, max_training_points: int = 256 * 1024):
+    """Fit IVF centroids and quantizer codebooks on (a sample of) the vectors"""
+    if index.is_trained:
+        return
+    if len(vectors) > max_training_points:
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(vectors), max_training_points, replace=False)
+        vectors = vectors[sample]
+    index.train(np.ascontiguousarray(vectors, dtype="float32"))
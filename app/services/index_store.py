@@ -0,0 +1,419 @@
+import fcntl
+import glob
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Log record layout: sequence number, operation, database id, then the
+# float32 vector (zeros for removals). Records are fixed size, so a torn
+# write at the end of the log shows up as a short trailing record and is
+# dropped on replay.
+RECORD_HEADER = struct.Struct("<qBq")
+OP_ADD = 1
+OP_REMOVE = 2
+
+CHECKPOINT_PATTERN = re.compile(r"checkpoint-(\d+)\.faiss$")
+ROTATED_LOG_PATTERN = re.compile(r"vectors-(\d+)\.log$")
+
+# (seq, op, db_id, vector)
+LogRecord = Tuple[int, int, int, np.ndarray]
+
+
+def _fsync_dir(directory: str):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _atomic_write(path: str, data: bytes):
+    """Write data to path via a temp file and rename"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _inode(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+class IndexStore:
+    """Append-only vector log plus versioned checkpoints for a FAISS index.
+
+    Every add is appended to `vectors.log` and fsynced, so the cost of a
+    write depends on the batch size rather than the size of the corpus.
+    Checkpoints are whole-index snapshots named `checkpoint-<seq>.faiss`,
+    written to a temp file and atomically renamed into place, so a file
+    with that name is complete and never changes afterwards.
+
+    Several processes (uvicorn workers, CLIs) can share one directory. Any
+    of them may append: appends are serialized with an flock on
+    `vectors.lock`, which also hands out sequence numbers. Exactly one of
+    them, the one holding an flock on `writer.lock`, checkpoints; the
+    others follow the log with `read_new()` and pick up new checkpoints as
+    they appear. When the writer exits the lock is released and the next
+    process to poll takes over.
+
+    `snapshot_fn` must block appends, call `rotate()` and return
+    (seq, serialized_index), or None if there is nothing new. `poll_fn` is
+    called from the background thread every `poll_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        dimension: int,
+        snapshot_fn: Callable,
+        checkpoint_interval: float = 60.0,
+        checkpoint_max_records: int = 10000,
+        fsync: bool = True,
+        poll_fn: Optional[Callable] = None,
+        poll_interval: float = 1.0,
+    ):
+        self.directory = directory
+        self.dimension = dimension
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_max_records = checkpoint_max_records
+        self.fsync = fsync
+        self.poll_interval = poll_interval
+        self.record_size = RECORD_HEADER.size + 4 * dimension
+        self.log_path = os.path.join(directory, "vectors.log")
+        # Highest sequence number read from the log by this process
+        self.last_seq = 0
+        self.checkpointed_seq = 0
+        self.pending_records = 0
+        self.is_writer = False
+
+        os.makedirs(directory, exist_ok=True)
+        self._log_file = None
+        # (file, inode, offset) of the log being followed by read_new
+        self._tail: Optional[list] = None
+        self._lock_file = open(os.path.join(directory, "vectors.lock"), "a+b")
+        self._writer_file = None
+        # flock excludes other processes; threads of this one share the
+        # lock file's description, so they need a lock of their own
+        self._append_lock = threading.Lock()
+        self._snapshot_fn = snapshot_fn
+        self._poll_fn = poll_fn
+        self._checkpoint_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Paths
+
+    def _checkpoint_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"checkpoint-{seq:020d}.faiss")
+
+    def legacy_ids_path(self, seq: int) -> str:
+        """Positional id list written next to checkpoints by older versions"""
+        return os.path.join(self.directory, f"checkpoint-{seq:020d}.ids")
+
+    def _rotated_log_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"vectors-{seq:020d}.log")
+
+    def _list(self, pattern: re.Pattern) -> List[Tuple[int, str]]:
+        found = []
+        for path in glob.glob(os.path.join(self.directory, "*")):
+            match = pattern.search(os.path.basename(path))
+            if match:
+                found.append((int(match.group(1)), path))
+        return sorted(found)
+
+    # Coordination
+
+    def acquire_writer(self) -> bool:
+        """Try to become the process that checkpoints; never blocks"""
+        if self.is_writer:
+            return True
+        writer_file = open(os.path.join(self.directory, "writer.lock"), "a+b")
+        try:
+            fcntl.flock(writer_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            writer_file.close()
+            return False
+        self._writer_file = writer_file
+        self.is_writer = True
+        return True
+
+    def release_writer(self):
+        if self._writer_file is not None:
+            fcntl.flock(self._writer_file, fcntl.LOCK_UN)
+            self._writer_file.close()
+            self._writer_file = None
+        self.is_writer = False
+
+    @contextmanager
+    def locked(self):
+        """Block appends and rotation from every process sharing the directory"""
+        with self._append_lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    # Loading
+
+    def latest_checkpoint(self) -> Optional[Tuple[int, str]]:
+        """Return (seq, index_path) for the newest checkpoint"""
+        checkpoints = self._list(CHECKPOINT_PATTERN)
+        return checkpoints[-1] if checkpoints else None
+
+    def _parse(self, data: bytes) -> List[LogRecord]:
+        records = []
+        for offset in range(0, len(data) - len(data) % self.record_size, self.record_size):
+            seq, op, db_id = RECORD_HEADER.unpack_from(data, offset)
+            vector = np.frombuffer(
+                data,
+                dtype="float32",
+                count=self.dimension,
+                offset=offset + RECORD_HEADER.size,
+            )
+            records.append((seq, op, db_id, vector))
+        return records
+
+    def _read_log(self, path: str, truncate_torn: bool) -> List[LogRecord]:
+        with open(path, "rb") as f:
+            data = f.read()
+        complete = len(data) - len(data) % self.record_size
+        if complete != len(data):
+            logger.warning(
+                f"Dropping {len(data) - complete} bytes of torn record from {path}"
+            )
+            if truncate_torn:
+                with open(path, "r+b") as f:
+                    f.truncate(complete)
+        return self._parse(data[:complete])
+
+    def replay(self, after_seq: int) -> List[LogRecord]:
+        """Return log records newer than after_seq, oldest first.
+
+        Must be called under `locked()`. Afterwards `read_new()` follows the
+        log from where the replay stopped.
+        """
+        records = []
+        for _, path in self._list(ROTATED_LOG_PATTERN):
+            records.extend(self._read_log(path, truncate_torn=False))
+        self._close_tail()
+        if os.path.exists(self.log_path):
+            current = self._read_log(self.log_path, truncate_torn=True)
+            records.extend(current)
+            tail_file = open(self.log_path, "rb")
+            self._tail = [
+                tail_file,
+                os.fstat(tail_file.fileno()).st_ino,
+                len(current) * self.record_size,
+            ]
+
+        records = [record for record in records if record[0] > after_seq]
+        records.sort(key=lambda record: record[0])
+        self.checkpointed_seq = after_seq
+        self.last_seq = records[-1][0] if records else after_seq
+        self.pending_records = len(records)
+        return records
+
+    def read_new(self) -> List[LogRecord]:
+        """Return complete records appended since the last replay or read.
+
+        When the writer rotates the log, the rest of the old file is read
+        before moving on to the new one. If a rotated file was already
+        pruned, the returned records skip over its sequence numbers; the
+        caller should then reload from the newest checkpoint.
+        """
+        records: List[LogRecord] = []
+        while True:
+            if self._tail is None:
+                try:
+                    tail_file = open(self.log_path, "rb")
+                except FileNotFoundError:
+                    break
+                self._tail = [tail_file, os.fstat(tail_file.fileno()).st_ino, 0]
+            tail_file, inode, offset = self._tail
+            # Checked before reading: once the log is rotated nothing more
+            # is appended to the old file, so this read gets all of it
+            rotated = _inode(self.log_path) != inode
+            size = os.fstat(tail_file.fileno()).st_size
+            complete = offset + (size - offset) // self.record_size * self.record_size
+            if complete > offset:
+                tail_file.seek(offset)
+                records.extend(self._parse(tail_file.read(complete - offset)))
+                self._tail[2] = complete
+            if not rotated:
+                break
+            self._close_tail()
+        if records:
+            self.last_seq = max(self.last_seq, records[-1][0])
+            self.pending_records += len(records)
+            if self.is_writer and self.pending_records >= self.checkpoint_max_records:
+                self._wakeup.set()
+        return records
+
+    def _close_tail(self):
+        if self._tail is not None:
+            self._tail[0].close()
+            self._tail = None
+
+    # Writing
+
+    def _open_log(self):
+        """Return the append handle, reopening it if the log was rotated"""
+        if self._log_file is not None:
+            if _inode(self.log_path) == os.fstat(self._log_file.fileno()).st_ino:
+                return self._log_file
+            self._log_file.close()
+        self._log_file = open(self.log_path, "ab")
+        return self._log_file
+
+    def _disk_seq(self, log_file) -> int:
+        """Highest sequence number handed out by any process"""
+        size = os.fstat(log_file.fileno()).st_size
+        torn = size % self.record_size
+        if torn:
+            # Left by a process that died mid-append
+            logger.warning(f"Dropping {torn} bytes of torn record from {self.log_path}")
+            size -= torn
+            log_file.truncate(size)
+        if size:
+            with open(self.log_path, "rb") as f:
+                f.seek(size - self.record_size)
+                return RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))[0]
+        sealed = self._list(CHECKPOINT_PATTERN) + self._list(ROTATED_LOG_PATTERN)
+        return max([seq for seq, _ in sealed], default=0)
+
+    def append(self, op: int, db_ids: List[int], vectors: np.ndarray = None):
+        """Append one record per id and make it durable.
+
+        The records are not applied to anything here; every process,
+        this one included, picks them up through `read_new()`.
+        """
+        if vectors is None:
+            vectors = np.zeros((len(db_ids), self.dimension), dtype="float32")
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        with self.locked():
+            log_file = self._open_log()
+            seq = self._disk_seq(log_file)
+            buffer = bytearray()
+            for db_id, vector in zip(db_ids, vectors):
+                seq += 1
+                buffer += RECORD_HEADER.pack(seq, op, int(db_id))
+                buffer += vector.tobytes()
+            log_file.write(buffer)
+            log_file.flush()
+            if self.fsync:
+                os.fsync(log_file.fileno())
+
+    def rotate(self, bump: bool = False) -> Optional[int]:
+        """Seal the current log so a checkpoint can cover it.
+
+        Must be called under `locked()`, after applying `read_new()`, together
+        with taking the index snapshot. Returns the sequence number the
+        snapshot covers, or None when nothing was written since the last
+        checkpoint. `bump` forces a new sequence number even without new
+        records, for when the index was replaced wholesale.
+        """
+        if bump:
+            self.last_seq += 1
+        if self.last_seq == self.checkpointed_seq:
+            return None
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        rotated_path = self._rotated_log_path(self.last_seq)
+        if os.path.exists(self.log_path):
+            os.replace(self.log_path, rotated_path)
+        else:
+            # Empty marker, so appenders see the sequence number is taken
+            open(rotated_path, "wb").close()
+        self.pending_records = 0
+        return self.last_seq
+
+    def write_checkpoint(self, seq: int, index_bytes: np.ndarray):
+        """Persist a snapshot and drop the logs and checkpoints it supersedes.
+
+        Readers may still have an older checkpoint mapped; on POSIX removing
+        the file leaves their mapping intact until they let go of it.
+        """
+        _atomic_write(self._checkpoint_path(seq), index_bytes.tobytes())
+        _fsync_dir(self.directory)
+
+        for old_seq, path in self._list(CHECKPOINT_PATTERN):
+            if old_seq < seq:
+                os.remove(path)
+            ids_path = self.legacy_ids_path(old_seq)
+            if os.path.exists(ids_path):
+                os.remove(ids_path)
+        for old_seq, path in self._list(ROTATED_LOG_PATTERN):
+            if old_seq <= seq:
+                os.remove(path)
+        self.checkpointed_seq = max(self.checkpointed_seq, seq)
+        logger.info(f"Wrote index checkpoint at seq {seq}")
+
+    def checkpoint(self, bump: bool = False):
+        """Snapshot the index through the snapshot function"""
+        if not self.is_writer:
+            return
+        with self._checkpoint_lock:
+            snapshot = self._snapshot_fn(bump)
+            if snapshot is None:
+                return
+            self.write_checkpoint(*snapshot)
+
+    # Background polling and checkpointing
+
+    def start(self):
+        """Start following the log and checkpointing in the background"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run,
+            name="index-checkpoint",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self):
+        last_checkpoint = time.monotonic()
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                if self._poll_fn is not None:
+                    self._poll_fn()
+                due = time.monotonic() - last_checkpoint >= self.checkpoint_interval
+                if self.is_writer and (due or self.pending_records >= self.checkpoint_max_records):
+                    self.checkpoint()
+                    last_checkpoint = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error maintaining index: {e}")
+
+    def close(self):
+        """Stop the background thread; the writer writes a final checkpoint"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.checkpoint()
+        self.release_writer()
+        self._close_tail()
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
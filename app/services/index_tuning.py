@@ -0,0 +1,302 @@
+import logging
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+from sqlalchemy import null, or_
+from sqlalchemy.orm import Session, undefer
+from app.models.content_chunk import ContentChunk
+from app.services.embedding_service import EmbeddingService
+from app.services.index_factory import (
+    ENCODINGS,
+    apply_search_params,
+    build_index,
+    build_index_from_settings,
+    effective_nlist,
+    train_index,
+    with_ids,
+)
+from app.services.vector_codec import pack_vector, unpack_vector
+
+logger = logging.getLogger(__name__)
+
+
+def load_stored_vectors(db: Session, dimension: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Read every chunk id and its backed-up embedding from the database.
+
+    Rows written before the binary `embedding` column existed are read from
+    the legacy JSON column instead.
+    """
+    ids = []
+    vectors = []
+    rows = (
+        db.query(ContentChunk.id, ContentChunk.embedding, ContentChunk.embedding_vector)
+        .filter(or_(ContentChunk.embedding.isnot(None), ContentChunk.embedding_vector.isnot(None)))
+        .order_by(ContentChunk.id)
+        .yield_per(10000)
+    )
+    for chunk_id, embedding, embedding_vector in rows:
+        ids.append(chunk_id)
+        if embedding is not None:
+            vectors.append(unpack_vector(embedding, dimension))
+        else:
+            vectors.append(embedding_vector)
+    if not ids:
+        return np.empty(0, dtype="int64"), np.empty((0, dimension), dtype="float32")
+    return np.array(ids, dtype="int64"), np.array(vectors, dtype="float32")
+
+
+def migrate_vector_backups(db: Session, batch_size: int = 1000) -> Dict[str, int]:
+    """Move legacy JSON embedding backups into the binary `embedding` column.
+
+    Runs in batches, committing after each, so it can be interrupted and
+    resumed; migrated rows have their JSON copy cleared.
+    """
+    migrated = 0
+    while True:
+        chunks = (
+            db.query(ContentChunk)
+            .options(undefer(ContentChunk.embedding), undefer(ContentChunk.embedding_vector))
+            .filter(ContentChunk.embedding_vector.isnot(None))
+            .order_by(ContentChunk.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not chunks:
+            break
+        for chunk in chunks:
+            if chunk.embedding is None:
+                chunk.embedding = pack_vector(chunk.embedding_vector)
+            # SQL NULL rather than a JSON null, so the row isn't matched again
+            chunk.embedding_vector = null()
+        db.commit()
+        migrated += len(chunks)
+        logger.info(f"Migrated {migrated} vector backups")
+    return {"migrated": migrated}
+
+
+def rebuild_index(db: Session, vector_store: EmbeddingService) -> Dict[str, float]:
+    """Rebuild the configured index type from the stored chunk vectors.
+
+    For IVF and the int8 / pq encodings this is also where centroids and
+    codebooks are trained, so it has to be run once after switching
+    FAISS_INDEX_TYPE or FAISS_INDEX_ENCODING and again whenever the corpus
+    has drifted enough that they are stale.
+    """
+    settings = vector_store.settings
+    started = time.perf_counter()
+    ids, vectors = load_stored_vectors(db, vector_store.embedding_size)
+
+    nlist = effective_nlist(settings.faiss_ivf_nlist, len(vectors))
+    index = build_index_from_settings(vector_store.embedding_size, settings, nlist=nlist)
+    if not index.is_trained:
+        if not len(vectors):
+            raise ValueError(
+                f"Cannot train a {settings.faiss_index_type} {settings.faiss_index_encoding} "
+                f"index without stored vectors"
+            )
+        if settings.faiss_index_encoding == "pq" and len(vectors) < 2 ** settings.faiss_pq_nbits:
+            raise ValueError(
+                f"Training pq needs at least {2 ** settings.faiss_pq_nbits} stored vectors, "
+                f"found {len(vectors)}; lower FAISS_PQ_NBITS or use another encoding"
+            )
+        train_index(index, vectors)
+    vector_store.rebuild(index, ids, vectors)
+
+    return {
+        "index_type": settings.faiss_index_type,
+        "encoding": settings.faiss_index_encoding,
+        "vectors": len(ids),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _search_latency(index, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, float]:
+    """Search one query at a time, like the API does, returning ids and ms/query"""
+    results = np.empty((len(queries), top_k), dtype="int64")
+    started = time.perf_counter()
+    for row, query in enumerate(queries):
+        _, indices = index.search(query.reshape(1, -1), top_k)
+        results[row] = indices[0]
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return results, elapsed_ms / len(queries)
+
+
+def _recall(results: np.ndarray, ground_truth: np.ndarray) -> float:
+    hits = sum(
+        len(set(row) & set(truth)) for row, truth in zip(results, ground_truth)
+    )
+    return hits / ground_truth.size
+
+
+def recall_report(
+    vectors: np.ndarray,
+    top_k: int = 10,
+    num_queries: int = 200,
+    nlist: int = 1024,
+    nprobe_values: Tuple[int, ...] = (1, 4, 8, 16, 32, 64),
+    hnsw_m: int = 32,
+    ef_construction: int = 80,
+    ef_search_values: Tuple[int, ...] = (16, 32, 64, 128, 256),
+    removed_fraction: float = 0.1,
+) -> List[Dict[str, float]]:
+    """Measure recall@k and per-query latency of IVF and HNSW against flat.
+
+    Queries are sampled from the stored vectors themselves and the flat
+    index provides the exact ground truth. The IVF index holds ids the way
+    the service stores them and is measured again after `removed_fraction`
+    of them are removed in place, against a flat index without them, so a
+    removal returning wrong ids shows up as lost recall. HNSW is rebuilt
+    without removed vectors rather than changed, so it is measured once.
+    """
+    if not len(vectors):
+        raise ValueError("No stored vectors to benchmark")
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    dimension = vectors.shape[1]
+    top_k = min(top_k, len(vectors))
+    rng = np.random.default_rng(0)
+    queries = vectors[
+        rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)
+    ]
+
+    flat = build_index(dimension, "flat")
+    flat.add(vectors)
+    ground_truth, flat_ms = _search_latency(flat, queries, top_k)
+    report = [
+        {"index": "flat", "param": None, "removed": 0, "recall": 1.0, "ms_per_query": flat_ms}
+    ]
+
+    ids = np.arange(len(vectors), dtype="int64")
+    ivf = build_index(dimension, "ivf", nlist=effective_nlist(nlist, len(vectors)))
+    train_index(ivf, vectors)
+    ivf = with_ids(ivf)
+    ivf.add_with_ids(vectors, ids)
+    removed = rng.choice(ids, int(len(ids) * removed_fraction), replace=False)
+    kept = np.setdiff1d(ids, removed)
+    kept_flat = with_ids(build_index(dimension, "flat"))
+    kept_flat.add_with_ids(vectors[kept], kept)
+    kept_truth, _ = _search_latency(kept_flat, queries, top_k)
+    for removed_ids, truth in ((removed[:0], ground_truth), (removed, kept_truth)):
+        ivf.remove_ids(removed_ids)
+        for nprobe in nprobe_values:
+            apply_search_params(ivf, nprobe=nprobe)
+            results, ms = _search_latency(ivf, queries, top_k)
+            report.append(
+                {
+                    "index": "ivf",
+                    "param": f"nprobe={nprobe}",
+                    "removed": len(removed_ids),
+                    "recall": _recall(results, truth),
+                    "ms_per_query": ms,
+                }
+            )
+
+    hnsw = build_index(dimension, "hnsw", hnsw_m=hnsw_m, ef_construction=ef_construction)
+    hnsw.add(vectors)
+    for ef_search in ef_search_values:
+        apply_search_params(hnsw, ef_search=ef_search)
+        results, ms = _search_latency(hnsw, queries, top_k)
+        report.append(
+            {
+                "index": "hnsw",
+                "param": f"efSearch={ef_search}",
+                "removed": 0,
+                "recall": _recall(results, ground_truth),
+                "ms_per_query": ms,
+            }
+        )
+
+    for row in report:
+        row["recall"] = round(row["recall"], 4)
+        row["ms_per_query"] = round(row["ms_per_query"], 4)
+    return report
+
+
+def _index_bytes(index) -> int:
+    """Size of an index once serialized, which is also roughly its RAM footprint"""
+    import faiss
+
+    return len(faiss.serialize_index(index))
+
+
+def _code_bytes(encoding: str, dimension: int, pq_m: int, pq_nbits: int) -> int:
+    """Bytes each vector is stored in, leaving out codebooks and graph links"""
+    if encoding == "pq":
+        return -(-pq_m * pq_nbits // 8)
+    return dimension * {"float32": 4, "fp16": 2, "int8": 1}[encoding]
+
+
+def encoding_report(
+    vectors: np.ndarray,
+    top_k: int = 10,
+    num_queries: int = 200,
+    index_type: str = "flat",
+    nlist: int = 1024,
+    nprobe: int = 8,
+    hnsw_m: int = 32,
+    ef_construction: int = 80,
+    ef_search: int = 64,
+    pq_m: int = 48,
+    pq_nbits: int = 8,
+) -> List[Dict[str, float]]:
+    """Compare the size, recall@k and latency of each vector encoding.
+
+    Every encoding of ENCODINGS is built as `index_type` over the same
+    vectors; recall is measured against an exact flat float32 index, so it
+    shows what compression costs on top of any loss from the index type.
+    `bytes_per_vector` is the whole index divided by the vector count, so on
+    small corpora it is dominated by codebooks and centroids rather than by
+    `code_bytes`.
+    """
+    if not len(vectors):
+        raise ValueError("No stored vectors to benchmark")
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    dimension = vectors.shape[1]
+    top_k = min(top_k, len(vectors))
+    rng = np.random.default_rng(0)
+    queries = vectors[
+        rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)
+    ]
+
+    flat = build_index(dimension, "flat")
+    flat.add(vectors)
+    ground_truth, _ = _search_latency(flat, queries, top_k)
+
+    nlist = effective_nlist(nlist, len(vectors))
+    report = []
+    for encoding in ENCODINGS:
+        if encoding == "pq" and len(vectors) < 2 ** pq_nbits:
+            logger.warning(
+                f"Skipping pq: training needs at least {2 ** pq_nbits} vectors, "
+                f"only {len(vectors)} are stored"
+            )
+            continue
+        index = build_index(
+            dimension,
+            index_type,
+            nlist=nlist,
+            hnsw_m=hnsw_m,
+            ef_construction=ef_construction,
+            encoding=encoding,
+            pq_m=pq_m,
+            pq_nbits=pq_nbits,
+        )
+        started = time.perf_counter()
+        train_index(index, vectors)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - started
+        apply_search_params(index, nprobe=nprobe, ef_search=ef_search)
+        results, ms = _search_latency(index, queries, top_k)
+        size = _index_bytes(index)
+        report.append(
+            {
+                "encoding": encoding,
+                "index": index_type,
+                "code_bytes": _code_bytes(encoding, dimension, pq_m, pq_nbits),
+                "bytes_per_vector": round(size / len(vectors), 1),
+                "index_mb": round(size / 2 ** 20, 3),
+                "recall": round(_recall(results, ground_truth), 4),
+                "ms_per_query": round(ms, 4),
+                "build_seconds": round(build_seconds, 3),
+            }
+        )
+    return report
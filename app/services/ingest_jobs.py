@@ -0,0 +1,459 @@
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from app.config.settings import get_settings
+from app.db.database import SessionLocal
+from app.models.content import Content
+from app.models.content_chunk import ContentChunk
+from app.models.ingest_job import IngestJob
+from app.services import ingest_worker
+from app.services.answer_cache import get_answer_cache
+from app.services.embedding_service import EmbeddingService, get_embedding_service
+from app.services.ingest_service import delete_content_chunks, read_text
+from app.services.metrics_service import get_metrics_service
+from app.services.vector_codec import pack_vector
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Windows encoded ahead of the one being written, to keep the pool busy
+_PREFETCH_WINDOWS = 2
+
+
+class LeaseLost(Exception):
+    """The job was claimed again or cancelled while this runner worked on it"""
+
+
+class JobInterrupted(Exception):
+    """The runner is shutting down; the job goes back on the queue"""
+
+
+def cancel_jobs(db: Session, content_id: int, reason: str):
+    """Fail unfinished jobs for a content row; their runners stop at the next window"""
+    db.query(IngestJob).filter(
+        IngestJob.content_id == content_id,
+        IngestJob.status.in_([QUEUED, RUNNING]),
+    ).update(
+        {
+            IngestJob.status: FAILED,
+            IngestJob.error: reason,
+            IngestJob.finished_at: datetime.now(),
+        },
+        synchronize_session=False,
+    )
+
+
+def enqueue_ingest(db: Session, content_id: int) -> IngestJob:
+    """Queue chunking and embedding of a content row; the caller commits"""
+    cancel_jobs(db, content_id, "Superseded by a newer upload")
+    job = IngestJob(content_id=content_id, status=QUEUED, attempts=0, chunks_done=0)
+    db.add(job)
+    db.flush()
+    return job
+
+
+def claim_job(db: Session, lease_seconds: float, max_attempts: int) -> Optional[Tuple[int, int]]:
+    """Claim the oldest runnable job and return (job_id, attempt).
+
+    Queued jobs and running jobs whose heartbeat is older than the lease
+    are runnable. The claim is a conditional UPDATE on (status, attempts),
+    so when several runners race for the same row only one of them wins.
+    """
+    now = datetime.now()
+    expired = now - timedelta(seconds=lease_seconds)
+    candidates = (
+        db.query(IngestJob.id, IngestJob.status, IngestJob.attempts)
+        .filter(
+            or_(
+                IngestJob.status == QUEUED,
+                and_(IngestJob.status == RUNNING, IngestJob.heartbeat_at < expired),
+            )
+        )
+        .order_by(IngestJob.id)
+        .limit(10)
+        .all()
+    )
+    for job_id, status, attempts in candidates:
+        claim = db.query(IngestJob).filter(
+            IngestJob.id == job_id,
+            IngestJob.status == status,
+            IngestJob.attempts == attempts,
+        )
+        if attempts >= max_attempts:
+            # Its runner died during the last attempt
+            claim.update(
+                {
+                    IngestJob.status: FAILED,
+                    IngestJob.error: f"Gave up after {attempts} attempts",
+                    IngestJob.finished_at: now,
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+            continue
+        claimed = claim.update(
+            {
+                IngestJob.status: RUNNING,
+                IngestJob.attempts: attempts + 1,
+                IngestJob.started_at: now,
+                IngestJob.heartbeat_at: now,
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        if claimed:
+            return job_id, attempts + 1
+    return None
+
+
+def job_status(job: IngestJob) -> Dict:
+    progress = None
+    if job.status == DONE:
+        progress = 1.0
+    elif job.chars_total:
+        progress = round((job.chars_done or 0) / job.chars_total, 4)
+    return {
+        "id": job.id,
+        "content_id": job.content_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "chunks_total": job.chunks_total,
+        "chunks_done": job.chunks_done,
+        "progress": progress,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class IngestJobRunner:
+    """Run queued ingest jobs: chunk as the text is read, encode in a process pool.
+
+    Each of `concurrency` threads claims one job at a time from the
+    ingest_jobs table. The stored text is read back in slices and chunked
+    as it streams in, and every window of `window_chunks` chunks is encoded
+    by one of `workers` spawned processes, each with its own copy of the
+    model, so encoding neither holds the GIL nor blocks requests; with
+    workers=0 it runs in this process. Only a few windows are in memory at
+    a time, whatever the size of the document. Chunk rows are committed
+    one window at a time, together with the job's progress and heartbeat.
+
+    New chunks are tagged with the job's id. The content's previous chunks
+    keep being served until the job has written all of the new ones, and
+    are deleted in the same transaction that marks it done. Every attempt
+    starts by deleting what an earlier attempt of the job left behind, so a
+    retry after a crash ends in the same state as a clean run. A job whose
+    runner dies is claimed again once its lease expires, up to
+    `max_attempts` attempts in all.
+    """
+
+    def __init__(
+        self,
+        vector_store: EmbeddingService,
+        workers: int = 2,
+        window_chunks: int = 256,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 300,
+        max_attempts: int = 3,
+    ):
+        self.vector_store = vector_store
+        self.workers = workers
+        self.concurrency = max(1, workers)
+        self.window_chunks = window_chunks
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        if workers > 0:
+            self._encode_fn = ingest_worker.encode_texts
+        else:
+            self._encode_fn = vector_store.embed_texts
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    settings = self.vector_store.settings
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        # Forking a process that already runs threads and
+                        # holds FAISS and torch state is not safe
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=ingest_worker.init_worker,
+                        initargs=(
+                            self.vector_store.model_name,
+                            settings.embedding_batch_size,
+                        ),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=1,
+                        thread_name_prefix="ingest-encode",
+                    )
+            return self._executor
+
+    def _reset_executor(self, broken):
+        """Replace a pool whose worker process died"""
+        with self._executor_lock:
+            if self._executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    @staticmethod
+    def _update(db: Session, job_id: int, attempt: int, **values):
+        """Update this claim of the job, or raise LeaseLost if it isn't ours anymore"""
+        updated = db.query(IngestJob).filter(
+            IngestJob.id == job_id,
+            IngestJob.attempts == attempt,
+            IngestJob.status == RUNNING,
+        ).update(
+            {getattr(IngestJob, name): value for name, value in values.items()},
+            synchronize_session=False,
+        )
+        if not updated:
+            raise LeaseLost(f"Ingest job {job_id} attempt {attempt} lost its claim")
+
+    def _discard_chunks(self, db: Session, job_id: int, attempt: int, content_id: int):
+        """Delete the chunks this job has written, leaving the previous version's"""
+        chunk_ids = delete_content_chunks(
+            db, content_id, ContentChunk.ingest_job_id == job_id
+        )
+        self._update(db, job_id, attempt, chunks_done=0, chars_done=0, heartbeat_at=datetime.now())
+        db.commit()
+        self.vector_store.remove(chunk_ids)
+
+    def _windows(self, db: Session, content_id: int) -> Iterator[Tuple[List[str], int]]:
+        """Yield windows of chunk texts, with how many characters had been read"""
+        chars_read = 0
+
+        def pieces():
+            nonlocal chars_read
+            for piece in read_text(db, content_id):
+                chars_read += len(piece)
+                yield piece
+
+        window = []
+        for chunk_text in self.vector_store.chunker.split_stream(pieces()):
+            window.append(chunk_text)
+            if len(window) >= self.window_chunks:
+                yield window, chars_read
+                window = []
+        if window:
+            yield window, chars_read
+
+    def _execute(self, db: Session, job_id: int, attempt: int, content_id: int) -> int:
+        content = (
+            db.query(Content.grade, Content.topic, func.length(Content.content).label("length"))
+            .filter(Content.id == content_id)
+            .first()
+        )
+        if content is None:
+            raise ValueError("Content no longer exists")
+        self._discard_chunks(db, job_id, attempt, content_id)
+        self._update(
+            db, job_id, attempt,
+            chars_total=content.length or 0,
+            heartbeat_at=datetime.now(),
+        )
+        db.commit()
+
+        executor = self._get_executor()
+        windows = self._windows(db, content_id)
+        # (window, characters read, future) for windows being encoded ahead
+        encoding = deque()
+
+        def submit_next():
+            item = next(windows, None)
+            if item is not None:
+                window, chars_read = item
+                encoding.append((window, chars_read, executor.submit(self._encode_fn, window)))
+
+        for _ in range(_PREFETCH_WINDOWS + 1):
+            submit_next()
+        done = 0
+        while encoding:
+            if self._stop.is_set():
+                for _, _, future in encoding:
+                    future.cancel()
+                raise JobInterrupted()
+            window, chars_read, future = encoding.popleft()
+            embeddings = future.result()
+            submit_next()
+            chunks = [
+                ContentChunk(
+                    content_id=content_id,
+                    chunk_text=chunk_text,
+                    chunk_index=done + offset,
+                    ingest_job_id=job_id,
+                    embedding=pack_vector(embedding),
+                )
+                for offset, (chunk_text, embedding) in enumerate(zip(window, embeddings))
+            ]
+            db.add_all(chunks)
+            db.flush()
+            chunk_ids = [chunk.id for chunk in chunks]
+            done += len(chunks)
+            # Indexed before the commit, and removed again if it fails, so
+            # committed chunks are never missing from the index
+            self.vector_store.add_embeddings(chunk_ids, embeddings)
+            try:
+                self._update(
+                    db, job_id, attempt,
+                    chunks_done=done,
+                    chars_done=chars_read,
+                    heartbeat_at=datetime.now(),
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.vector_store.remove(chunk_ids)
+                raise
+            self.vector_store.metadata.add(chunk_ids, content_id, content.grade, content.topic)
+            db.expunge_all()
+
+        # Swap versions: the previous chunks go with the commit that marks
+        # the job done
+        old_ids = delete_content_chunks(
+            db,
+            content_id,
+            or_(ContentChunk.ingest_job_id.is_(None), ContentChunk.ingest_job_id != job_id),
+        )
+        db.query(Content).filter(Content.id == content_id).update(
+            {Content.chunk_count: done},
+            synchronize_session=False,
+        )
+        self._update(
+            db, job_id, attempt,
+            status=DONE,
+            error=None,
+            chunks_total=done,
+            chars_done=content.length or 0,
+            finished_at=datetime.now(),
+        )
+        db.commit()
+        self.vector_store.remove(old_ids)
+        return done
+
+    def _process(self, job_id: int, attempt: int):
+        db = SessionLocal()
+        try:
+            content_id = db.query(IngestJob.content_id).filter(IngestJob.id == job_id).scalar()
+            try:
+                chunks = self._execute(db, job_id, attempt, content_id)
+            except JobInterrupted:
+                db.rollback()
+                # Shutting down isn't the job's fault; don't count the attempt
+                self._update(db, job_id, attempt, status=QUEUED, attempts=attempt - 1)
+                db.commit()
+                logger.info(f"Requeued ingest job {job_id} on shutdown")
+                return
+            except LeaseLost as e:
+                db.rollback()
+                logger.warning(str(e))
+                return
+            except Exception as e:
+                db.rollback()
+                if isinstance(e, BrokenProcessPool):
+                    self._reset_executor(self._executor)
+                final = attempt >= self.max_attempts
+                logger.error(
+                    f"Ingest job {job_id} attempt {attempt} failed"
+                    f"{'' if final else ', will retry'}: {e}"
+                )
+                self._discard_chunks(db, job_id, attempt, content_id)
+                self._update(
+                    db, job_id, attempt,
+                    status=FAILED if final else QUEUED,
+                    error=str(e) or type(e).__name__,
+                    finished_at=datetime.now() if final else None,
+                )
+                db.commit()
+                return
+            get_answer_cache().invalidate_content([content_id])
+            get_metrics_service().invalidate()
+            logger.info(f"Ingest job {job_id} indexed content {content_id} as {chunks} chunks")
+        except LeaseLost as e:
+            db.rollback()
+            logger.warning(str(e))
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error finishing ingest job {job_id}: {e}")
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                claimed = claim_job(db, self.lease_seconds, self.max_attempts)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error claiming ingest job: {e}")
+                claimed = None
+            finally:
+                db.close()
+            if claimed is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._process(*claimed)
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for number in range(self.concurrency):
+            thread = threading.Thread(
+                target=self._run,
+                name=f"ingest-jobs-{number}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self):
+        """Stop claiming jobs; running ones go back on the queue after their current window"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+_ingest_job_runner: Optional[IngestJobRunner] = None
+_ingest_job_runner_lock = threading.Lock()
+
+
+def get_ingest_job_runner() -> IngestJobRunner:
+    """Return the process-wide ingest job runner"""
+    global _ingest_job_runner
+    if _ingest_job_runner is None:
+        with _ingest_job_runner_lock:
+            if _ingest_job_runner is None:
+                settings = get_settings()
+                _ingest_job_runner = IngestJobRunner(
+                    get_embedding_service(),
+                    workers=settings.ingest_workers,
+                    window_chunks=settings.ingest_window_chunks,
+                    poll_interval=settings.ingest_job_poll_interval_seconds,
+                    lease_seconds=settings.ingest_job_lease_seconds,
+                    max_attempts=settings.ingest_job_max_attempts,
+                )
+    return _ingest_job_runner
@@ -0,0 +1,186 @@
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.content import Content
+from app.models.content_chunk import ContentChunk
+from app.services.document_loader import title_from_file_name
+from app.services.embedding_service import EmbeddingService
+from app.services.vector_codec import pack_vector
+
+logger = logging.getLogger(__name__)
+
+
+def store_text(
+    db: Session,
+    content: Content,
+    pieces: Iterable[str],
+    flush_chars: int = 1024 * 1024,
+):
+    """Append text arriving in pieces to a flushed content row.
+
+    The text is written `flush_chars` at a time with SQL concatenation, so
+    the whole upload is never held in memory. The caller commits.
+    """
+    pending, pending_chars = [], 0
+    for piece in pieces:
+        pending.append(piece)
+        pending_chars += len(piece)
+        if pending_chars >= flush_chars:
+            _append_text(db, content.id, "".join(pending))
+            pending, pending_chars = [], 0
+    if pending:
+        _append_text(db, content.id, "".join(pending))
+    db.expire(content, ["content"])
+
+
+def read_text(db: Session, content_id: int, slice_chars: int = 1024 * 1024) -> Iterator[str]:
+    """Yield the stored text of a content row `slice_chars` characters at a time.
+
+    Each slice is its own SUBSTR query, so the whole text is never loaded
+    at once.
+    """
+    start = 1
+    while True:
+        piece = (
+            db.query(func.substr(Content.content, start, slice_chars))
+            .filter(Content.id == content_id)
+            .scalar()
+        )
+        if not piece:
+            return
+        yield piece
+        start += len(piece)
+
+
+def _append_text(db: Session, content_id: int, text: str):
+    db.query(Content).filter(Content.id == content_id).update(
+        {Content.content: Content.content + text},
+        synchronize_session=False,
+    )
+
+
+def ingest_contents(
+    db: Session,
+    contents: List[Content],
+    vector_store: EmbeddingService,
+) -> List[ContentChunk]:
+    """Chunk, embed and index many content rows in one pass.
+
+    All chunks are flushed together, encoded with batched forward passes and
+    added to the index with a single call, so the index is persisted once no
+    matter how many documents are ingested. The vectors are indexed before
+    the caller commits; if the commit fails, the caller passes the chunks'
+    ids to `EmbeddingService.remove`.
+    """
+    chunks = []
+    for content in contents:
+        chunk_texts = vector_store.chunk_text(content.content)
+        content.chunk_count = len(chunk_texts)
+        if not chunk_texts:
+            logger.warning(f"Content {content.id} produced no chunks")
+        chunks.extend(
+            ContentChunk(
+                content_id=content.id,
+                chunk_text=chunk_text,
+                chunk_index=chunk_index,
+            )
+            for chunk_index, chunk_text in enumerate(chunk_texts)
+        )
+    if not chunks:
+        return chunks
+
+    db.add_all(chunks)
+    db.flush()
+
+    embeddings = vector_store.embed_texts([chunk.chunk_text for chunk in chunks])
+    for chunk, embedding in zip(chunks, embeddings):
+        chunk.embedding = pack_vector(embedding)
+
+    vector_store.add_embeddings(
+        [chunk.id for chunk in chunks],
+        embeddings,
+    )
+    chunk_ids_by_content = defaultdict(list)
+    for chunk in chunks:
+        chunk_ids_by_content[chunk.content_id].append(chunk.id)
+    for content in contents:
+        vector_store.metadata.add(
+            chunk_ids_by_content[content.id],
+            content.id,
+            content.grade,
+            content.topic,
+        )
+    logger.info(f"Ingested {len(contents)} contents as {len(chunks)} chunks")
+    return chunks
+
+
+def delete_content_chunks(db: Session, content_id: int, *criteria) -> List[int]:
+    """Delete a content's chunk rows and return their ids.
+
+    Extra `criteria` narrow down which of its chunks are deleted. The ids
+    must be passed to `EmbeddingService.remove` once the transaction has
+    committed.
+    """
+    chunk_ids = [
+        chunk_id
+        for (chunk_id,) in db.query(ContentChunk.id).filter(
+            ContentChunk.content_id == content_id,
+            *criteria,
+        )
+    ]
+    if chunk_ids:
+        db.query(ContentChunk).filter(
+            ContentChunk.id.in_(chunk_ids),
+        ).delete(synchronize_session=False)
+    return chunk_ids
+
+
+def bulk_ingest(
+    db: Session,
+    documents: Iterable[Tuple[str, str]],
+    topic: str,
+    grade: str,
+    vector_store: EmbeddingService,
+) -> Dict[str, float]:
+    """Ingest (file_name, text) pairs in a single transaction.
+
+    Titles are derived from the file names. Returns throughput figures so
+    bulk loads can be compared against the per-file upload path.
+    """
+    started = time.perf_counter()
+    chunk_ids = []
+    try:
+        contents = [
+            Content(
+                title=title_from_file_name(file_name),
+                topic=topic,
+                grade=grade,
+                content=text,
+                file_name=file_name,
+            )
+            for file_name, text in documents
+        ]
+        db.add_all(contents)
+        db.flush()
+        chunks = ingest_contents(db, contents, vector_store)
+        chunk_ids = [chunk.id for chunk in chunks]
+        db.commit()
+    except Exception:
+        db.rollback()
+        # Indexed before the commit, so removed again when it fails
+        vector_store.remove(chunk_ids)
+        raise
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "documents": len(contents),
+        "chunks": len(chunks),
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(len(contents) / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_sec": round(len(chunks) / elapsed, 2) if elapsed else 0.0,
+    }
+    logger.info(f"Bulk ingest finished: {stats}")
+    return stats
@@ -0,0 +1,28 @@
+"""Encoding runs in the ingest job worker processes.
+
+Kept free of database and FAISS imports so a spawned worker only loads
+the embedding model.
+"""
+from typing import List
+import numpy as np
+
+_model = None
+_batch_size = 64
+
+
+def init_worker(model_name: str, batch_size: int):
+    """Load the model once per worker process"""
+    global _model, _batch_size
+    from sentence_transformers import SentenceTransformer
+
+    _model = SentenceTransformer(model_name)
+    _batch_size = batch_size
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    embeddings = _model.encode(
+        texts,
+        batch_size=_batch_size,
+        show_progress_bar=False,
+    )
+    return np.asarray(embeddings, dtype="float32")
@@ -0,0 +1,304 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+from app.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP status codes worth retrying: rate limited or a transient server error
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMBackend(ABC):
+    """A text generation model behind GeminiService.
+
+    Backends are created once per process and reused by every request, so
+    any client, connection pool or credentials they hold are set up once.
+    A subclass must implement generate, agenerate and astream before it
+    can be instantiated.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def generate(self, prompt: str) -> str:
+        """Return the full answer to the prompt"""
+
+    @abstractmethod
+    async def agenerate(self, prompt: str) -> str:
+        """Like generate, without blocking the event loop"""
+
+    @abstractmethod
+    def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the answer in chunks as the model produces them"""
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether a failed call may succeed if simply tried again"""
+        return isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError))
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through one long-lived GenerativeModel.
+
+    The SDK keeps its transport (and its connection pool) on the configured
+    client, so configuring once and sharing the model lets requests reuse
+    connections instead of setting up a new client each time.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str, timeout: float):
+        # Only needed for this backend
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        self.request_options = {"timeout": timeout}
+
+    def generate(self, prompt: str) -> str:
+        response = self.model.generate_content(prompt, request_options=self.request_options)
+        return response.text
+
+    async def agenerate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(
+            prompt,
+            request_options=self.request_options,
+        )
+        return response.text
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(
+            prompt,
+            stream=True,
+            request_options=self.request_options,
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    def is_retryable(self, error: Exception) -> bool:
+        # google.api_core exceptions carry the HTTP status as `code`
+        return super().is_retryable(error) or getattr(error, "code", None) in RETRYABLE_STATUS_CODES
+
+
+class LocalBackend(LLMBackend):
+    """Offline stand-in that answers after a configurable delay.
+
+    Latency is `latency_ms` plus up to `jitter_ms` of uniform noise, and
+    streamed answers spread it over `stream_chunks` chunks. Needs no network
+    or API key, for tests and load generation.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        latency_ms: float = 500,
+        jitter_ms: float = 0,
+        answer_words: int = 80,
+        stream_chunks: int = 10,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.answer_words = answer_words
+        self.stream_chunks = max(1, stream_chunks)
+        self._random = random.Random(seed)
+
+    def _delay(self) -> float:
+        return (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+
+    def _answer(self, prompt: str) -> str:
+        return " ".join(["Local answer."] + ["lorem"] * max(0, self.answer_words - 2))
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self._delay())
+        return self._answer(prompt)
+
+    async def agenerate(self, prompt: str) -> str:
+        await asyncio.sleep(self._delay())
+        return self._answer(prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        delay = self._delay() / self.stream_chunks
+        words = self._answer(prompt).split(" ")
+        size = -(-len(words) // self.stream_chunks)
+        for start in range(0, len(words), size):
+            await asyncio.sleep(delay)
+            yield " ".join(words[start:start + size]) + " "
+
+
+class LLMClient:
+    """Timeouts, retries and request coalescing around an LLMBackend.
+
+    Every call is given `timeout` seconds (for streams: until each next
+    chunk) and retried up to `max_retries` times on errors the backend
+    calls retryable, with exponential backoff and jitter between attempts.
+
+    Identical prompts already in flight are coalesced (singleflight): the
+    first caller starts one upstream call and everyone asking the same
+    prompt meanwhile awaits its result, or its error. A waiter that gives
+    up doesn't cancel the call for the others. Streams are not coalesced,
+    and are only retried until their first chunk has been yielded.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        coalesce: bool = True,
+    ):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.coalesce = coalesce
+        self._in_flight: Dict[str, "asyncio.Task[str]"] = {}
+        self._counts_lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _count(self, name: str):
+        with self._counts_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        # Full jitter keeps retries from many requests from lining up
+        return random.uniform(delay / 2, delay)
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if attempt >= self.max_retries or not self.backend.is_retryable(error):
+            self._count("failures")
+            return False
+        self._count("retries")
+        logger.warning(
+            f"LLM call failed ({type(error).__name__}: {error}), "
+            f"retry {attempt + 1} of {self.max_retries}"
+        )
+        return True
+
+    async def _with_retries(self, call: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            self._count("calls")
+            try:
+                return await asyncio.wait_for(call(), self.timeout)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            await asyncio.sleep(self._backoff_delay(attempt))
+            attempt += 1
+
+    def generate(self, prompt: str) -> str:
+        attempt = 0
+        while True:
+            self._count("calls")
+            try:
+                return self.backend.generate(prompt)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            time.sleep(self._backoff_delay(attempt))
+            attempt += 1
+
+    async def agenerate(self, prompt: str) -> str:
+        if not self.coalesce:
+            return await self._with_retries(lambda: self.backend.agenerate(prompt))
+        task = self._in_flight.get(prompt)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._with_retries(lambda: self.backend.agenerate(prompt))
+            )
+            self._in_flight[prompt] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(prompt, None))
+        else:
+            self._count("coalesced")
+        # Shielded so a cancelled waiter leaves the call running for the rest
+        return await asyncio.shield(task)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        attempt = 0
+        while True:
+            self._count("calls")
+            stream = self.backend.astream(prompt).__aiter__()
+            started = False
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), self.timeout)
+                    except StopAsyncIteration:
+                        return
+                    started = True
+                    yield chunk
+            except Exception as e:
+                # Text already sent can't be taken back
+                if started or not self._should_retry(e, attempt):
+                    if started:
+                        self._count("failures")
+                    raise
+            finally:
+                await stream.aclose()
+            await asyncio.sleep(self._backoff_delay(attempt))
+            attempt += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "failures": self.failures,
+            "in_flight": len(self._in_flight),
+        }
+
+
+def create_backend(name: Optional[str] = None) -> LLMBackend:
+    settings = get_settings()
+    name = name or settings.llm_backend
+    if name == "gemini":
+        return GeminiBackend(
+            api_key=settings.gemini_api_key,
+            model_name=settings.gemini_chat_model,
+            timeout=settings.llm_timeout_seconds,
+        )
+    if name == "local":
+        return LocalBackend(
+            latency_ms=settings.local_llm_latency_ms,
+            jitter_ms=settings.local_llm_jitter_ms,
+        )
+    raise ValueError(f"Unknown LLM_BACKEND {name!r}, expected gemini or local")
+
+
+_llm_client: Optional[LLMClient] = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide LLM client, creating its backend on first use"""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                settings = get_settings()
+                _llm_client = LLMClient(
+                    create_backend(),
+                    timeout=settings.llm_timeout_seconds,
+                    max_retries=settings.llm_max_retries,
+                    backoff=settings.llm_retry_backoff_seconds,
+                    max_backoff=settings.llm_retry_max_backoff_seconds,
+                    coalesce=settings.llm_coalesce_requests,
+                )
+    return _llm_client
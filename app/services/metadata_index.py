@@ -0,0 +1,138 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from app.db.database import SessionLocal
+from app.models.content import Content
+from app.models.content_chunk import ContentChunk
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataIndex:
+    """In-memory chunk id -> (content_id, grade, topic) table.
+
+    Used to turn a grade/topic filter into the set of chunk ids a vector
+    search may return, without touching the database on the query path.
+    Id arrays are cached per filter and rebuilt after any change.
+
+    Chunks indexed by other processes reach this one as ids in the vector
+    log; `track` notes the unknown ones and `resolve_pending` looks them up
+    once their rows are committed.
+    """
+
+    def __init__(self):
+        self._chunks: Dict[int, Tuple[int, str, str]] = {}
+        self._by_grade: Dict[str, Set[int]] = defaultdict(set)
+        self._by_topic: Dict[str, Set[int]] = defaultdict(set)
+        self._filter_cache: Dict[Tuple[Optional[str], Optional[str]], np.ndarray] = {}
+        self._pending: Set[int] = set()
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def load(self, db: Session):
+        """Populate the table from content_chunks joined with contents"""
+        rows = (
+            db.query(ContentChunk.id, Content.id, Content.grade, Content.topic)
+            .join(Content, Content.id == ContentChunk.content_id)
+            .yield_per(10000)
+        )
+        with self._lock:
+            self._chunks.clear()
+            self._by_grade.clear()
+            self._by_topic.clear()
+            self._filter_cache.clear()
+            self._pending.clear()
+            for chunk_id, content_id, grade, topic in rows:
+                self._add(chunk_id, content_id, grade, topic)
+            self.loaded = True
+        logger.info(f"Loaded metadata for {len(self._chunks)} chunks")
+
+    def _add(self, chunk_id: int, content_id: int, grade: str, topic: str):
+        self._chunks[chunk_id] = (content_id, grade, topic)
+        self._by_grade[grade].add(chunk_id)
+        self._by_topic[topic].add(chunk_id)
+        self._pending.discard(chunk_id)
+
+    def add(self, chunk_ids: Iterable[int], content_id: int, grade: str, topic: str):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._add(int(chunk_id), content_id, grade, topic)
+            self._filter_cache.clear()
+
+    def remove(self, chunk_ids: Iterable[int]):
+        with self._lock:
+            for chunk_id in map(int, chunk_ids):
+                self._pending.discard(chunk_id)
+                entry = self._chunks.pop(chunk_id, None)
+                if entry is None:
+                    continue
+                _, grade, topic = entry
+                self._by_grade[grade].discard(chunk_id)
+                self._by_topic[topic].discard(chunk_id)
+                if not self._by_grade[grade]:
+                    del self._by_grade[grade]
+                if not self._by_topic[topic]:
+                    del self._by_topic[topic]
+            self._filter_cache.clear()
+
+    def track(self, chunk_ids: Iterable[int]):
+        """Note ids added to the vector index whose metadata may be missing"""
+        if not self.loaded:
+            return
+        with self._lock:
+            self._pending.update(
+                chunk_id for chunk_id in map(int, chunk_ids) if chunk_id not in self._chunks
+            )
+
+    def resolve_pending(self, batch_size: int = 1000):
+        """Load metadata for tracked ids; uncommitted ones stay pending"""
+        with self._lock:
+            pending = sorted(self._pending)
+        if not pending:
+            return
+        db = SessionLocal()
+        try:
+            rows = []
+            for start in range(0, len(pending), batch_size):
+                rows.extend(
+                    db.query(ContentChunk.id, Content.id, Content.grade, Content.topic)
+                    .join(Content, Content.id == ContentChunk.content_id)
+                    .filter(ContentChunk.id.in_(pending[start:start + batch_size]))
+                    .all()
+                )
+        finally:
+            db.close()
+        if not rows:
+            return
+        with self._lock:
+            for chunk_id, content_id, grade, topic in rows:
+                # Skip ids removed while the query ran
+                if chunk_id in self._pending:
+                    self._add(chunk_id, content_id, grade, topic)
+            self._filter_cache.clear()
+
+    def get(self, chunk_id: int) -> Optional[Tuple[int, str, str]]:
+        return self._chunks.get(chunk_id)
+
+    def ids_for(self, grade: Optional[str] = None, topic: Optional[str] = None) -> np.ndarray:
+        """Sorted chunk ids matching every given filter"""
+        key = (grade, topic)
+        with self._lock:
+            cached = self._filter_cache.get(key)
+            if cached is not None:
+                return cached
+            sets = []
+            if grade is not None:
+                sets.append(self._by_grade.get(grade, set()))
+            if topic is not None:
+                sets.append(self._by_topic.get(topic, set()))
+            matched = set.intersection(*sets) if sets else set(self._chunks)
+            ids = np.fromiter(sorted(matched), dtype="int64", count=len(matched))
+            self._filter_cache[key] = ids
+            return ids
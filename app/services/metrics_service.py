@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import distinct, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from app.config.settings import get_settings
+from app.models.content import Content
+from app.models.query_log import QueryLog
+from app.models.query_stat import QueryStat
+
+logger = logging.getLogger(__name__)
+
+StatKey = Tuple[datetime, str]
+
+# Claimed by the worker that backfills query_stats. It holds no queries and
+# sits outside any time series, so the totals are unaffected.
+BACKFILL_MARKER = {"hour": datetime(1970, 1, 1), "persona": "", "count": 0}
+
+
+def hour_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _upsert(db: Session, counts: Counter):
+    rows = [
+        {"hour": hour, "persona": persona, "count": count}
+        for (hour, persona), count in counts.items()
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows:
+            updated = (
+                db.query(QueryStat)
+                .filter(QueryStat.hour == row["hour"], QueryStat.persona == row["persona"])
+                .update({QueryStat.count: QueryStat.count + row["count"]})
+            )
+            if not updated:
+                db.add(QueryStat(**row))
+        return
+    statement = insert(QueryStat).values(rows)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[QueryStat.hour, QueryStat.persona],
+            set_={"count": QueryStat.count + statement.excluded.count},
+        )
+    )
+
+
+def record_query_stats(db: Session, queries: Iterable[Tuple[str, datetime]]) -> Counter:
+    """Add (persona, asked_at) pairs to the hourly stats; the caller commits"""
+    counts = Counter((hour_bucket(asked_at), persona.lower()) for persona, asked_at in queries)
+    if counts:
+        _upsert(db, counts)
+    return counts
+
+
+class MetricsService:
+    """Dashboard metrics served from memory.
+
+    Totals and the hourly series are read from the small contents and
+    query_stats tables at most once every `max_staleness` seconds. Queries
+    logged by this process are added in memory as they happen; changes
+    made by other workers show up within the staleness bound.
+    """
+
+    def __init__(self, max_staleness: float = 30, series_hours: int = 168):
+        self.max_staleness = max_staleness
+        self.series_hours = series_hours
+        self._totals: Optional[Dict[str, int]] = None
+        self._series: Dict[StatKey, int] = {}
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._refreshed_at = 0.0
+
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._refreshed_at > self.max_staleness
+
+    def _refresh(self, db: Session):
+        since = hour_bucket(datetime.now()) - timedelta(hours=self.series_hours - 1)
+        totals = {
+            "total_topics": db.query(func.count(distinct(Content.topic))).scalar(),
+            "total_file_uploaded": db.query(func.count(Content.id)).scalar(),
+            "total_queries": db.query(func.coalesce(func.sum(QueryStat.count), 0)).scalar(),
+        }
+        series = {
+            (hour, persona): count
+            for hour, persona, count in db.query(
+                QueryStat.hour, QueryStat.persona, QueryStat.count
+            ).filter(QueryStat.hour >= since)
+        }
+        self._totals, self._series = totals, series
+        self._refreshed_at = time.monotonic()
+
+    def _ensure_fresh(self, db: Session):
+        if self._totals is None or self._is_stale():
+            with self._lock:
+                # Another request may have refreshed while this one waited
+                if self._totals is None or self._is_stale():
+                    self._refresh(db)
+
+    def summary(self, db: Session) -> Dict[str, int]:
+        self._ensure_fresh(db)
+        with self._lock:
+            return dict(self._totals)
+
+    def series(self, db: Session, hours: int = 24) -> List[Dict[str, Any]]:
+        """Queries per hour, oldest first, with a per-persona breakdown"""
+        self._ensure_fresh(db)
+        hours = max(1, min(hours, self.series_hours))
+        current = hour_bucket(datetime.now())
+        buckets = [current - timedelta(hours=offset) for offset in range(hours - 1, -1, -1)]
+        by_hour: Dict[datetime, Dict[str, int]] = {hour: {} for hour in buckets}
+        with self._lock:
+            for (hour, persona), count in self._series.items():
+                if hour in by_hour:
+                    by_hour[hour][persona] = count
+        return [
+            {
+                "hour": hour,
+                "total": sum(by_persona.values()),
+                "by_persona": by_persona,
+            }
+            for hour, by_persona in by_hour.items()
+        ]
+
+    def commit_queries(self, db: Session, counts: Counter):
+        """Commit counts added by record_query_stats and apply them in memory.
+
+        Committing under the same lock as a refresh means a refresh either
+        sees the new rows or runs before they are applied here, so nothing
+        is counted twice.
+        """
+        with self._lock:
+            db.commit()
+            if self._totals is None:
+                return
+            self._totals["total_queries"] += sum(counts.values())
+            for key, count in counts.items():
+                self._series[key] = self._series.get(key, 0) + count
+
+    def backfill(self, db: Session):
+        """Build query_stats from an existing query_logs table, once.
+
+        Every worker calls this on startup. The marker row is inserted in
+        the same transaction as the counts, so of several workers starting
+        together only the first commits; the others' insert of the same
+        primary key fails and they leave the counting to it.
+        """
+        if db.query(QueryStat.hour).first() is not None:
+            return
+        if db.query(QueryLog.id).first() is None:
+            return
+        try:
+            db.add(QueryStat(**BACKFILL_MARKER))
+            db.flush()
+        except (IntegrityError, OperationalError) as e:
+            # OperationalError: SQLite gave up waiting for the other
+            # worker's write lock
+            db.rollback()
+            logger.info(f"Query stats are backfilled by another worker: {e}")
+            return
+        rows = (
+            db.query(QueryLog.persona, QueryLog.created_at)
+            .filter(QueryLog.created_at.isnot(None))
+            .yield_per(10000)
+        )
+        counts = record_query_stats(
+            db,
+            ((persona or "friendly", created_at) for persona, created_at in rows),
+        )
+        db.commit()
+        self.invalidate()
+        logger.info(f"Backfilled query stats for {sum(counts.values())} logged queries")
+
+
+_metrics_service: Optional[MetricsService] = None
+_metrics_service_lock = threading.Lock()
+
+
+def get_metrics_service() -> MetricsService:
+    """Return the process-wide metrics service"""
+    global _metrics_service
+    if _metrics_service is None:
+        with _metrics_service_lock:
+            if _metrics_service is None:
+                settings = get_settings()
+                _metrics_service = MetricsService(
+                    max_staleness=settings.metrics_max_staleness_seconds,
+                    series_hours=settings.metrics_series_hours,
+                )
+    return _metrics_service
@@ -0,0 +1,172 @@
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy.engine import Connection, Engine
+from app.config.settings import get_settings
+from app.services.cache import TTLCache
+
+_FENCE = re.compile(r"^```(?:sql)?\s*|\s*```$", re.IGNORECASE)
+_LITERALS_AND_COMMENTS = re.compile(
+    r"'(?:[^']|'')*'"  # string literals
+    r'|"(?:[^"]|"")*"'  # quoted identifiers
+    r"|--[^\n]*"  # line comments
+    r"|/\*.*?\*/",  # block comments
+    re.DOTALL,
+)
+_WORD = re.compile(r"[a-z_][a-z0-9_]*")
+
+# Statements and clauses that write, lock or change session state
+FORBIDDEN_KEYWORDS = {
+    "insert", "update", "delete", "merge",
+    "create", "alter", "drop", "truncate", "rename",
+    "grant", "revoke", "copy", "vacuum", "analyze", "reindex", "cluster",
+    "call", "do", "execute", "prepare", "deallocate", "listen", "notify",
+    "lock", "set", "reset", "attach", "detach", "pragma", "into",
+}
+# Functions with side effects outside the transaction
+FORBIDDEN_FUNCTIONS = {
+    "pg_sleep", "pg_terminate_backend", "pg_cancel_backend", "pg_reload_conf",
+    "pg_read_file", "pg_read_binary_file", "pg_ls_dir", "pg_stat_file",
+    "lo_import", "lo_export", "dblink", "dblink_exec", "set_config",
+}
+
+
+class UnsafeSQLError(ValueError):
+    """Generated SQL is not a single read-only query"""
+
+
+@dataclass
+class SQLResult:
+    columns: List[str]
+    rows: List[tuple]
+    # True when the query had more than max_rows rows
+    truncated: bool = False
+
+
+def clean_sql(generated: str) -> str:
+    """Strip markdown fences and a trailing semicolon from generated SQL"""
+    sql = _FENCE.sub("", generated.strip()).strip()
+    return sql[:-1].rstrip() if sql.endswith(";") else sql
+
+
+def validate_read_only(sql: str) -> str:
+    """Return sql if it is a single SELECT, else raise UnsafeSQLError"""
+    stripped = _LITERALS_AND_COMMENTS.sub(" ", sql).lower()
+    if ";" in stripped:
+        raise UnsafeSQLError("Only a single statement is allowed")
+    words = _WORD.findall(stripped)
+    if not words or words[0] not in ("select", "with"):
+        raise UnsafeSQLError("Only SELECT queries are allowed")
+    forbidden = FORBIDDEN_KEYWORDS.intersection(words) | FORBIDDEN_FUNCTIONS.intersection(words)
+    if forbidden:
+        raise UnsafeSQLError(f"Query uses {', '.join(sorted(forbidden))}")
+    if re.search(r"\bfor\s+(update|share|no\s+key\s+update|key\s+share)\b", stripped):
+        raise UnsafeSQLError("Row locking is not allowed")
+    return sql
+
+
+def _guard_sqlite(connection: Connection, timeout_ms: int):
+    connection.exec_driver_sql("PRAGMA query_only = ON")
+    deadline = time.monotonic() + timeout_ms / 1000
+    # A non-zero return aborts the running statement
+    connection.connection.dbapi_connection.set_progress_handler(
+        lambda: int(time.monotonic() > deadline), 10000
+    )
+
+
+def _unguard_sqlite(connection: Connection):
+    connection.connection.dbapi_connection.set_progress_handler(None, 0)
+    connection.exec_driver_sql("PRAGMA query_only = OFF")
+
+
+def run_read_only(engine: Engine, sql: str, max_rows: int, timeout_ms: int) -> SQLResult:
+    """Run validated SQL read-only, with a timeout, returning at most max_rows.
+
+    The query is wrapped in an outer LIMIT, so the cap holds whatever the
+    query itself asks for. It runs on its own connection in a read-only
+    transaction that is always rolled back.
+    """
+    limited = f"SELECT * FROM ({sql}) AS nl_sql_result LIMIT {max_rows + 1}"
+    with engine.connect() as connection:
+        dialect = engine.dialect.name
+        try:
+            if dialect == "postgresql":
+                connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+                connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+            elif dialect == "sqlite":
+                _guard_sqlite(connection, timeout_ms)
+            # exec_driver_sql leaves ':name' and '%' in the query alone
+            result = connection.exec_driver_sql(limited)
+            columns = list(result.keys())
+            rows = [tuple(row) for row in result.fetchmany(max_rows + 1)]
+        finally:
+            connection.rollback()
+            if dialect == "sqlite":
+                _unguard_sqlite(connection)
+    return SQLResult(columns, rows[:max_rows], truncated=len(rows) > max_rows)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def summarize_rows(columns: Sequence[str], rows: Sequence[tuple], sample_size: int) -> Dict[str, Any]:
+    """Column aggregates plus a few sample rows, for results too big to paste"""
+    column_stats = {}
+    for position, name in enumerate(columns):
+        values = [row[position] for row in rows if row[position] is not None]
+        stats: Dict[str, Any] = {"nulls": len(rows) - len(values)}
+        if values and all(_is_number(value) for value in values):
+            total = sum(values)
+            stats.update(
+                min=_jsonable(min(values)),
+                max=_jsonable(max(values)),
+                sum=_jsonable(total),
+                mean=float(total) / len(values),
+            )
+        elif values and all(isinstance(value, (datetime, date)) for value in values):
+            stats.update(min=_jsonable(min(values)), max=_jsonable(max(values)))
+        else:
+            counts = Counter(str(value) for value in values)
+            stats.update(distinct=len(counts), most_common=counts.most_common(5))
+        column_stats[name] = stats
+    return {
+        "row_count": len(rows),
+        "columns": list(columns),
+        "column_stats": column_stats,
+        "sample_rows": [
+            {name: _jsonable(value) for name, value in zip(columns, row)}
+            for row in rows[:sample_size]
+        ],
+    }
+
+
+_sql_cache: Optional[TTLCache] = None
+_sql_cache_lock = threading.Lock()
+
+
+def get_sql_cache() -> TTLCache:
+    """Return the process-wide cache of validated SQL by normalized question"""
+    global _sql_cache
+    if _sql_cache is None:
+        with _sql_cache_lock:
+            if _sql_cache is None:
+                settings = get_settings()
+                _sql_cache = TTLCache(
+                    maxsize=settings.nl_sql_cache_size,
+                    ttl=settings.nl_sql_cache_ttl_seconds,
+                )
+    return _sql_cache
@@ -0,0 +1,120 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query, Session
+
+EXPORT_BATCH_ROWS = 1000
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just after the given row"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor, raising ValueError on malformed input"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def after_cursor(query: Query, created_at_column, id_column, cursor: Optional[str]) -> Query:
+    """Order by (created_at, id) and skip everything up to the cursor.
+
+    The row-value comparison lets the database seek straight into a
+    (created_at, id) index instead of counting past an OFFSET.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(created_at_column, id_column) > tuple_(created_at, row_id)
+        )
+    return query.order_by(created_at_column, id_column)
+
+
+def keyset_page(
+    query: Query,
+    created_at_column,
+    id_column,
+    cursor: Optional[str],
+    limit: int,
+) -> Tuple[List[Any], Optional[str]]:
+    """Return up to `limit` rows after the cursor and the next page's cursor"""
+    rows = after_cursor(query, created_at_column, id_column, cursor).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
+
+
+def _jsonable(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_export(
+    session_factory: Callable[[], Session],
+    build_query: Callable[[Session], Query],
+    fields: Sequence[str],
+    export_format: str,
+) -> Iterator[str]:
+    """Stream every row of a query as NDJSON or CSV at constant memory.
+
+    Rows are fetched through a server-side cursor (`yield_per`) with a
+    session of the generator's own, since the request's session is closed
+    before a streaming body is sent.
+    """
+    db = session_factory()
+    try:
+        rows = build_query(db).yield_per(EXPORT_BATCH_ROWS)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if export_format == "csv" else None
+        if writer is not None:
+            writer.writerow(fields)
+        count = 0
+        for row in rows:
+            if writer is not None:
+                writer.writerow(_jsonable(getattr(row, name)) for name in fields)
+            else:
+                buffer.write(
+                    json.dumps({name: _jsonable(getattr(row, name)) for name in fields})
+                )
+                buffer.write("\n")
+            count += 1
+            if count % EXPORT_BATCH_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+def export_response(
+    session_factory: Callable[[], Session],
+    build_query: Callable[[Session], Query],
+    fields: Sequence[str],
+    export_format: str,
+    file_stem: str,
+) -> StreamingResponse:
+    return StreamingResponse(
+        iter_export(session_factory, build_query, fields, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{file_stem}.{export_format}"'
+        },
+    )
@@ -0,0 +1,154 @@
+import logging
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from app.config.settings import get_settings
+from app.db.database import SessionLocal
+from app.models.query_log import QueryLog
+from app.services.metrics_service import get_metrics_service, record_query_stats
+
+logger = logging.getLogger(__name__)
+
+
+class QueryLogWriter:
+    """Write query logs from a background thread in batched inserts.
+
+    Requests only put a row on a bounded queue, so logging adds no database
+    round-trip to answer latency. The writer thread flushes up to
+    `batch_size` rows per multi-row INSERT, at least every `flush_interval`
+    seconds, and drains the queue on close. When the queue is full the row
+    is dropped and counted rather than stalling the request.
+
+    Before `start` (scripts, CLIs) rows are written straight away, a
+    synchronous insert that must not be made from the event loop.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+
+    def submit(
+        self,
+        question: str,
+        persona: str,
+        answer: str,
+        response_time: Optional[float] = None,
+        retrieved_chunks: Optional[int] = None,
+    ):
+        row = {
+            "user_question": question,
+            "persona": persona,
+            "ai_response": answer,
+            "response_time": response_time,
+            "retrieved_chunks": retrieved_chunks,
+            # Stamped here rather than by the database, which only sees
+            # the row when its batch is flushed
+            "created_at": datetime.now(),
+        }
+        if self._thread is None:
+            # Not running in the app (scripts, CLIs): write straight away
+            self._write([row])
+            return
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Query log queue full, dropped {self.dropped} rows so far")
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            db.execute(insert(QueryLog), rows)
+            counts = record_query_stats(
+                db,
+                ((row["persona"], row["created_at"]) for row in rows),
+            )
+            get_metrics_service().commit_queries(db, counts)
+            self.written += len(rows)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to write {len(rows)} query logs: {e}")
+        finally:
+            db.close()
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+        # Drain whatever was queued before shutdown
+        while True:
+            batch = self._next_batch() if not self._queue.empty() else []
+            if not batch:
+                break
+            self._write(batch)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="query-log-writer",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def close(self):
+        """Stop the writer thread after flushing every queued row"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        logger.info(f"Query log writer stopped ({self.written} written, {self.dropped} dropped)")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+_query_log_writer: Optional[QueryLogWriter] = None
+_query_log_writer_lock = threading.Lock()
+
+
+def get_query_log_writer() -> QueryLogWriter:
+    """Return the process-wide query log writer"""
+    global _query_log_writer
+    if _query_log_writer is None:
+        with _query_log_writer_lock:
+            if _query_log_writer is None:
+                settings = get_settings()
+                _query_log_writer = QueryLogWriter(
+                    maxsize=settings.query_log_queue_size,
+                    batch_size=settings.query_log_batch_size,
+                    flush_interval=settings.query_log_flush_interval_seconds,
+                )
+    return _query_log_writer
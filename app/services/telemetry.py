@@ -0,0 +1,308 @@
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from app.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+# (labels, value) pairs reported by a collector at scrape time
+Sample = Tuple[Dict[str, str], float]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+# Upper bounds in seconds, from cache hits and searches up to LLM calls
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class Histogram:
+    """Latency histogram: cumulative bucket counts, plus sum and count.
+
+    Counts only ever grow, so Prometheus can take rate() of them and add
+    up the buckets of every worker before histogram_quantile(), which
+    per-process quantiles can't offer.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: observations per bucket (not cumulative), the last
+        # entry being above every bound
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[position] += 1
+            self._sums[key] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [
+                (key, list(counts), self._sums[key]) for key, counts in self._counts.items()
+            ]
+        for key, counts, total in snapshot:
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A value that goes up and down, per label set"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            labels = dict(zip(self.label_names, key))
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+@dataclass
+class Collector:
+    """Metric family whose samples are read from elsewhere at scrape time"""
+
+    name: str
+    documentation: str
+    metric_type: str
+    collect: Callable[[], Iterable[Sample]]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.error(f"Error collecting metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "ai_tutor_request_duration_seconds",
+        "HTTP request latency, including streamed response bodies",
+        ["method", "route", "status"],
+    )
+)
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "ai_tutor_stage_duration_seconds",
+        "Latency of each traced stage of a request",
+        ["route", "stage"],
+    )
+)
+IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "ai_tutor_requests_in_flight",
+        "Requests currently being handled",
+    )
+)
+STAGES_IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "ai_tutor_stages_in_flight",
+        "Traced stages currently running, e.g. concurrent LLM calls",
+        ["stage"],
+    )
+)
+
+
+def _route_of(scope) -> str:
+    """Path template of the route that handled a request, e.g. /api/v1/jobs/{job_id}.
+
+    Used instead of the raw path so labels stay low-cardinality. Only known
+    once routing has happened.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "other"
+    path = getattr(route, "path", "")
+    # The route's path is relative to the prefix it was included under;
+    # recover the prefix from the request path
+    try:
+        rendered = route.path_format.format(**scope.get("path_params", {}))
+    except (AttributeError, KeyError, IndexError, ValueError):
+        return path
+    if rendered and scope["path"].endswith(rendered):
+        return scope["path"][: len(scope["path"]) - len(rendered)] + path
+    return path
+
+
+@dataclass
+class Trace:
+    """Stages timed during one request, in the order they finished"""
+
+    scope: dict
+    started_at: float = field(default_factory=time.perf_counter)
+    stages: List[Tuple[str, float]] = field(default_factory=list)
+
+    @property
+    def route(self) -> str:
+        return _route_of(self.scope)
+
+    def breakdown(self) -> str:
+        return ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.stages)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage of the current request.
+
+    Threads started through run_in_threadpool inherit the request's trace;
+    outside a request the stage is recorded under the route "background".
+    """
+    started = time.perf_counter()
+    STAGES_IN_FLIGHT.inc(stage=stage)
+    try:
+        yield
+    finally:
+        STAGES_IN_FLIGHT.dec(stage=stage)
+        record(stage, time.perf_counter() - started)
+
+
+def record(stage: str, seconds: float):
+    """Add a stage timed elsewhere (e.g. in another thread) to the current trace"""
+    trace = _current_trace.get()
+    STAGE_SECONDS.observe(seconds, route=trace.route if trace else "background", stage=stage)
+    if trace is not None:
+        trace.stages.append((stage, seconds))
+
+
+class TelemetryMiddleware:
+    """Trace every HTTP request and record its latency.
+
+    Implemented as plain ASGI, so the request ends when the last body chunk
+    is sent and streamed answers are measured in full. Requests slower than
+    SLOW_REQUEST_MS are logged with their stage breakdown.
+    """
+
+    def __init__(self, app, slow_request_ms: Optional[float] = None):
+        self.app = app
+        if slow_request_ms is None:
+            slow_request_ms = get_settings().slow_request_ms
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace(scope=scope)
+        token = _current_trace.set(trace)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            _current_trace.reset(token)
+            elapsed = time.perf_counter() - trace.started_at
+            route = trace.route
+            REQUEST_SECONDS.observe(
+                elapsed,
+                method=scope["method"],
+                route=route,
+                status=str(status["code"]),
+            )
+            if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                logger.warning(
+                    f"Slow request {scope['method']} {route} {status['code']} "
+                    f"{elapsed * 1000:.0f}ms: {trace.breakdown() or 'no traced stages'}"
+                )
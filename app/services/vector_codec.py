@@ -0,0 +1,17 @@
+import numpy as np
+
+# Chunk embeddings are backed up in the database as raw little-endian
+# float32: exact, a quarter the size of a JSON array of floats, and read
+# back without parsing
+VECTOR_DTYPE = np.dtype("<f4")
+
+
+def pack_vector(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=VECTOR_DTYPE).reshape(-1).tobytes()
+
+
+def unpack_vector(data: bytes, dimension: int) -> np.ndarray:
+    vector = np.frombuffer(data, dtype=VECTOR_DTYPE)
+    if len(vector) != dimension:
+        raise ValueError(f"Stored vector has {len(vector)} dimensions, expected {dimension}")
+    return vector.astype("float32")
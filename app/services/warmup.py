@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from app.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+Step = Tuple[str, Callable[[], object]]
+
+
+class Warmup:
+    """Loads the slow services (model, index, LLM client) after startup.
+
+    The steps run one after another in a background thread, so the server
+    starts accepting connections, and /health answers, before they finish.
+    Each step's duration is kept for /health and `python -m app.cli.startup`.
+    A failed step stops the warmup and leaves the service unhealthy.
+    """
+
+    def __init__(self):
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.stages: List[Tuple[str, float]] = []
+        self.seconds: Optional[float] = None
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Set from the warmup thread, so requests can wait without a thread each
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_done: Optional[asyncio.Event] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def completed(self, stage: str) -> bool:
+        return any(name == stage for name, _ in self.stages)
+
+    def start(self, steps: Sequence[Step], background: bool = True):
+        """Run the steps, in a thread unless `background` is False"""
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._async_done = asyncio.Event()
+        except RuntimeError:
+            self._loop = self._async_done = None
+        self.state = "running"
+        self.error = None
+        self.stages = []
+        self.seconds = None
+        self._done.clear()
+        if not background:
+            self._run(steps)
+            return
+        self._thread = threading.Thread(target=self._run, args=(steps,), name="warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self, steps: Sequence[Step]):
+        started = time.perf_counter()
+        try:
+            for name, step in steps:
+                stage_started = time.perf_counter()
+                step()
+                self.stages.append((name, time.perf_counter() - stage_started))
+            self.state = "ready"
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = "failed"
+            logger.error(f"Warmup failed: {self.error}")
+        self.seconds = time.perf_counter() - started
+        if self.ready:
+            breakdown = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.stages)
+            logger.info(f"Warmup finished in {self.seconds * 1000:.0f}ms: {breakdown}")
+        self._done.set()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._async_done.set)
+            except RuntimeError:
+                # The event loop has already been closed
+                pass
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the warmup has finished, successfully or not"""
+        return self._done.wait(timeout)
+
+    async def async_wait(self, timeout: Optional[float] = None) -> bool:
+        """Like wait, without blocking the event loop the warmup was started on"""
+        if self._done.is_set():
+            return True
+        if self._async_done is None:
+            return self._done.is_set()
+        try:
+            await asyncio.wait_for(self._async_done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "stages": {name: round(seconds, 3) for name, seconds in self.stages},
+            "error": self.error,
+        }
+
+
+_warmup: Optional[Warmup] = None
+_warmup_lock = threading.Lock()
+
+
+def get_warmup() -> Warmup:
+    """Return the process-wide warmup"""
+    global _warmup
+    if _warmup is None:
+        with _warmup_lock:
+            if _warmup is None:
+                _warmup = Warmup()
+    return _warmup
+
+
+async def wait_until_ready():
+    """Dependency holding API requests until the warmup has finished"""
+    warmup = get_warmup()
+    if warmup.ready:
+        return
+    if warmup.state != "failed":
+        await warmup.async_wait(get_settings().warmup_request_wait_seconds)
+    if warmup.state == "failed":
+        raise HTTPException(status_code=503, detail="Service failed to start")
+    if not warmup.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Service is starting up",
+            headers={"Retry-After": "1"},
+        )
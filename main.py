@@ -1,14 +1,25 @@
 import os
 from pathlib import Path
-from fastapi import FastAPI, HTTPException, Path as PathParam
+from fastapi import Depends, FastAPI, HTTPException, Path as PathParam
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 import sys
 from app.config.settings import get_settings
-from app.db import create_tables
+from app.db import create_tables, get_database_session
 from app.api.content import router as content_router
 from app.api.ask import router as ask_router
+from app.services.embedding_service import get_embedding_service
+from app.services.hybrid_search import get_hybrid_retriever
+from app.services.ingest_jobs import get_ingest_job_runner
+from app.services.llm_backend import get_llm_client
+from app.services.metrics_service import get_metrics_service
+from app.services.query_log_writer import get_query_log_writer
+from app.services.answer_cache import get_answer_cache
+from app.services.nl_sql import get_sql_cache
+from app.services.telemetry import CONTENT_TYPE, REGISTRY, Collector, TelemetryMiddleware
+from app.services.warmup import get_warmup, wait_until_ready
 from fastapi.staticfiles import StaticFiles
 
 # Configure logging
@@ -32,11 +43,60 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
         raise
+    try:
+        db = get_database_session()
+        try:
+            get_metrics_service().backfill(db)
+        finally:
+            db.close()
+    except Exception as e:
+        logger.error(f"Error backfilling query stats from the query log: {e}")
+        raise
+    try:
+        query_log_writer = get_query_log_writer()
+        query_log_writer.start()
+    except Exception as e:
+        logger.error(f"Error starting the query log writer: {e}")
+        raise
+
+    # Load the model, index and LLM client once per process and warm them up
+    # so the first request doesn't pay for it. This runs in the background:
+    # /health answers meanwhile and API requests wait for it.
+    warmup = get_warmup()
+    warmup.start(
+        [
+            ("embedding_model", get_embedding_service),
+            ("index_metadata", _load_index_metadata),
+            ("embedding_warmup", lambda: get_embedding_service().warmup()),
+            ("index_sync", lambda: get_embedding_service().start()),
+            ("ingest_jobs", lambda: get_ingest_job_runner().start()),
+            ("llm_client", get_llm_client),
+        ],
+        background=settings.warmup_in_background,
+    )
+    if warmup.state == "failed":
+        raise RuntimeError(f"Warmup failed: {warmup.error}")
 
     yield
 
     # Shutdown
     logger.info("Shutting down AI Tutoring System...")
+    await warmup.async_wait()
+    if warmup.completed("ingest_jobs"):
+        get_ingest_job_runner().close()
+    if warmup.completed("embedding_model"):
+        get_hybrid_retriever().close()
+    query_log_writer.close()
+    if warmup.completed("index_sync"):
+        get_embedding_service().close()
+
+
+def _load_index_metadata():
+    db = get_database_session()
+    try:
+        get_embedding_service().metadata.load(db)
+    finally:
+        db.close()
 
 
 app = FastAPI(
@@ -54,34 +114,129 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-Cursor",
+        "X-Answer-Cache",
+        "X-Prompt-Tokens",
+        "X-Dropped-Passages",
+        "Server-Timing",
+    ],
 )
 
+app.add_middleware(TelemetryMiddleware)
+
 # Include routers
-app.include_router(content_router, prefix="/api/v1")
-app.include_router(ask_router, prefix="/api/v1")
+app.include_router(content_router, prefix="/api/v1", dependencies=[Depends(wait_until_ready)])
+app.include_router(ask_router, prefix="/api/v1", dependencies=[Depends(wait_until_ready)])
 
-frontend_dist = Path(__file__).parent / "frontend" / "dist"
 
-app.mount(
-    "/",
-    StaticFiles(directory=frontend_dist, html=True),
-    name="frontend",
-)
+def _cache_stats():
+    stats = {
+        "answer": get_answer_cache().stats(),
+        "nl_sql": get_sql_cache().stats(),
+    }
+    # Not before warmup, which would block the scrape until the model loads
+    if get_warmup().ready:
+        stats["query_embedding"] = get_embedding_service().query_cache.stats()
+    return stats
+
+
+def _cache_lookup_samples():
+    for name, stats in _cache_stats().items():
+        yield {"cache": name, "result": "hit"}, stats["hits"]
+        yield {"cache": name, "result": "miss"}, stats["misses"]
+
+
+def _cache_hit_ratio_samples():
+    for name, stats in _cache_stats().items():
+        yield {"cache": name}, stats["hit_rate"]
+
+
+REGISTRY.register(Collector(
+    "ai_tutor_cache_lookups_total",
+    "Lookups in the in-process caches by result",
+    "counter",
+    _cache_lookup_samples,
+))
+REGISTRY.register(Collector(
+    "ai_tutor_cache_hit_ratio",
+    "Share of cache lookups that were hits since startup",
+    "gauge",
+    _cache_hit_ratio_samples,
+))
+REGISTRY.register(Collector(
+    "ai_tutor_llm_events_total",
+    "LLM client upstream calls, coalesced requests, retries and failures",
+    "counter",
+    lambda: [
+        ({"event": event}, get_llm_client().stats()[key])
+        for event, key in (
+            ("upstream_call", "calls"),
+            ("coalesced", "coalesced"),
+            ("retry", "retries"),
+            ("failure", "failures"),
+        )
+    ],
+))
+REGISTRY.register(Collector(
+    "ai_tutor_index_vectors",
+    "Vectors in the FAISS index as seen by this worker",
+    "gauge",
+    lambda: [({}, get_embedding_service().ntotal)] if get_warmup().ready else [],
+))
+REGISTRY.register(Collector(
+    "ai_tutor_warmup_stage_seconds",
+    "Time each startup warmup stage took",
+    "gauge",
+    lambda: [({"stage": stage}, seconds) for stage, seconds in get_warmup().stages],
+))
+REGISTRY.register(Collector(
+    "ai_tutor_query_log_queue_depth",
+    "Query log rows waiting to be written",
+    "gauge",
+    lambda: [({}, get_query_log_writer().stats()["queued"])],
+))
+REGISTRY.register(Collector(
+    "ai_tutor_query_log_dropped_total",
+    "Query log rows dropped because the queue was full",
+    "counter",
+    lambda: [({}, get_query_log_writer().stats()["dropped"])],
+))
 
-@app.get("/")
-async def root():
-    """Root endpoint"""
+
+@app.get("/health")
+async def health_check(response: Response):
+    """Answers as soon as the server is up, without waiting for the warmup"""
+    warmup = get_warmup()
+    if warmup.state == "failed":
+        response.status_code = 503
+        status = "unhealthy"
+    else:
+        status = "healthy" if warmup.ready else "starting"
+    vector_store = get_embedding_service() if warmup.ready else None
     return {
-        "message": "AI Tutoring System API",
-        "version": "1.0.0",
-        "status": "operational",
+        "status": status,
+        "vector_store_ready": bool(vector_store and vector_store.ready),
+        "index_writer": vector_store.is_writer if vector_store else None,
+        "warmup": warmup.stats(),
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
+
+frontend_dist = Path(__file__).parent / "frontend" / "dist"
+
+# Mounted last: a mount at "/" matches every path, so routes added after it
+# are never reached
+app.mount(
+    "/",
+    StaticFiles(directory=frontend_dist, html=True),
+    name="frontend",
+)
 
 
 if __name__ == "__main__":
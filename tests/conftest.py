@@ -0,0 +1,82 @@
+import os
+import re
+import sys
+import tempfile
+import types
+import numpy as np
+import pytest
+
+# Settings are read from the environment when app.config.settings is first
+# imported, so these have to be in place before any test module imports app
+_TEST_DIR = tempfile.mkdtemp(prefix="ai-tutor-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}")
+os.environ.setdefault("APP_NAME", "AI Tutor tests")
+os.environ.setdefault("DEBUG", "False")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("LLM_BACKEND", "local")
+os.environ.setdefault("INDEX_LOG_FSYNC", "False")
+
+DIMENSION = 384
+
+
+class FakeTokenizer:
+    """Whitespace tokenizer with the call signature TextChunker uses"""
+
+    def __call__(self, text, return_offsets_mapping=False, **kwargs):
+        offsets = [(match.start(), match.end()) for match in re.finditer(r"\S+", text)]
+        return {"input_ids": list(range(len(offsets))), "offset_mapping": offsets}
+
+
+class FakeSentenceTransformer:
+    """Stands in for the embedding model: one fixed random vector per text"""
+
+    def __init__(self, model_name, **kwargs):
+        self.tokenizer = FakeTokenizer()
+
+    def encode(self, texts, **kwargs):
+        return np.stack([vector_for(text) for text in texts])
+
+
+def vector_for(text: str) -> np.ndarray:
+    seed = sum(ord(char) * (position + 1) for position, char in enumerate(text))
+    return np.random.default_rng(seed).standard_normal(DIMENSION).astype("float32")
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = FakeSentenceTransformer
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+
+
+@pytest.fixture
+def db():
+    from app.db import create_tables, get_database_session
+    from app.models import Base
+    from app.db.database import engine
+
+    Base.metadata.drop_all(bind=engine)
+    create_tables()
+    session = get_database_session()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_embedding_service(fake_model, tmp_path, monkeypatch):
+    """Build EmbeddingService instances sharing one index directory"""
+    from app.config.settings import get_settings
+    from app.services.embedding_service import EmbeddingService
+
+    services = []
+
+    def make(**settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(get_settings(), name, value)
+        service = EmbeddingService(index_dir=str(tmp_path / "index"))
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.close()
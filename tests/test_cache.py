@@ -0,0 +1,81 @@
+import types
+import pytest
+from app.services import cache
+from app.services.cache import TTLCache, normalize_text
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_least_recently_used_entry_is_evicted():
+    lru = TTLCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats()["evictions"] == 1
+
+
+def test_setting_an_existing_key_refreshes_it():
+    lru = TTLCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.set("a", 10)
+
+    lru.set("c", 3)
+
+    assert lru.get("a") == 10
+    assert lru.get("b") is None
+
+
+def test_entries_expire_after_the_ttl(clock):
+    ttl_cache = TTLCache(maxsize=10, ttl=30)
+    ttl_cache.set("a", 1)
+
+    clock.now += 29
+    assert ttl_cache.get("a") == 1
+    clock.now += 2
+    assert ttl_cache.get("a") is None
+
+    stats = ttl_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+    assert stats["size"] == 0
+
+
+def test_zero_ttl_never_expires(clock):
+    ttl_cache = TTLCache(maxsize=10, ttl=0)
+    ttl_cache.set("a", 1)
+
+    clock.now += 10 ** 6
+
+    assert ttl_cache.get("a") == 1
+
+
+def test_zero_maxsize_disables_the_cache():
+    disabled = TTLCache(maxsize=0)
+    disabled.set("a", 1)
+
+    assert disabled.get("a") is None
+    assert len(disabled) == 0
+
+
+def test_hit_rate():
+    lru = TTLCache()
+    lru.set("a", 1)
+    lru.get("a")
+    lru.get("a")
+    lru.get("b")
+
+    assert lru.stats()["hit_rate"] == 0.6667
+
+
+def test_normalize_text():
+    assert normalize_text("  What IS\n photosynthesis? ") == "what is photosynthesis?"
@@ -0,0 +1,36 @@
+import pytest
+from conftest import FakeTokenizer
+from app.services.chunking_service import TextChunker
+
+TEXT = " ".join(f"word{number}" for number in range(57)) + "\n\nlast  words here. "
+
+
+def _pieces(text, size):
+    return [text[start : start + size] for start in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("piece_size", [1, 3, 7, 50, 10_000])
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(10, 2), (8, 0), (5, 4), (100, 20)])
+def test_split_stream_matches_split(piece_size, chunk_size, chunk_overlap):
+    chunker = TextChunker(FakeTokenizer(), chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    assert list(chunker.split_stream(_pieces(TEXT, piece_size))) == chunker.split(TEXT)
+
+
+def test_chunks_overlap_by_chunk_overlap_tokens():
+    chunker = TextChunker(FakeTokenizer(), chunk_size=4, chunk_overlap=1)
+
+    assert chunker.split("a b c d e f g") == ["a b c d", "d e f g"]
+
+
+@pytest.mark.parametrize("text", ["", "   \n "])
+def test_blank_text_has_no_chunks(text):
+    chunker = TextChunker(FakeTokenizer(), chunk_size=4, chunk_overlap=1)
+
+    assert chunker.split(text) == []
+    assert list(chunker.split_stream(_pieces(text, 1))) == []
+
+
+def test_overlap_must_be_smaller_than_the_chunk():
+    with pytest.raises(ValueError):
+        TextChunker(FakeTokenizer(), chunk_size=4, chunk_overlap=4)
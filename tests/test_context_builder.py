@@ -0,0 +1,84 @@
+from app.services.context_builder import ContextBuilder, Passage
+
+
+def _builder(token_budget=10):
+    counted = []
+
+    def count_tokens(text):
+        counted.append(text)
+        return len(text.split())
+
+    builder = ContextBuilder(count_tokens, token_budget=token_budget)
+    builder.counted = counted
+    return builder
+
+
+def test_passages_that_do_not_fit_are_skipped_not_the_rest():
+    passages = [
+        Passage(key=1, text="one two three four"),
+        Passage(key=2, text="a passage far too long to fit in what is left"),
+        Passage(key=3, text="five six seven"),
+    ]
+
+    context = _builder(token_budget=8).build(passages)
+
+    assert [passage.key for passage in context.passages] == [1, 3]
+    assert context.tokens == 7
+    assert context.dropped == 1
+    assert context.text == "one two three four\n\nfive six seven"
+
+
+def test_exact_and_contained_duplicates_are_skipped():
+    passages = [
+        Passage(key=1, text="Plants make sugar from light"),
+        Passage(key=2, text="plants  make sugar from LIGHT"),
+        Passage(key=3, text="sugar from light"),
+        Passage(key=4, text="   "),
+    ]
+
+    context = _builder().build(passages)
+
+    assert [passage.key for passage in context.passages] == [1]
+    assert context.duplicates == 3
+
+
+def test_overlapping_neighbours_are_trimmed_and_stitched_in_document_order():
+    # Chunks 0 and 1 of one document share "and falls as rain" (the
+    # chunker's overlap); chunk 1 ranks higher
+    passages = [
+        Passage(key=11, text="and falls as rain. Rivers carry it back.", content_id=7, chunk_index=1),
+        Passage(key=10, text="Water evaporates, condenses and falls as rain.", content_id=7, chunk_index=0),
+    ]
+
+    context = _builder(token_budget=12).build(passages)
+
+    assert context.text == "Water evaporates, condenses and falls as rain. Rivers carry it back."
+    assert context.tokens == 11
+    assert context.dropped == 0
+
+
+def test_best_ranked_span_comes_first():
+    passages = [
+        Passage(key=20, text="second document", content_id=2, chunk_index=0),
+        Passage(key=10, text="first document", content_id=1, chunk_index=0),
+    ]
+
+    assert _builder().build(passages).text == "second document\n\nfirst document"
+
+
+def test_budget_can_be_overridden_per_call():
+    passages = [Passage(key=1, text="one two three"), Passage(key=2, text="four five")]
+
+    context = _builder(token_budget=10).build(passages, token_budget=3)
+
+    assert [passage.key for passage in context.passages] == [1]
+
+
+def test_token_counts_are_cached_per_passage():
+    builder = _builder()
+    passages = [Passage(key=1, text="one two three")]
+
+    builder.build(passages)
+    builder.build(passages)
+
+    assert builder.counted == ["one two three"]
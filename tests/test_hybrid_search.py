@@ -0,0 +1,70 @@
+import pytest
+from app.services.hybrid_search import HybridRetriever, reciprocal_rank_fusion
+
+
+def test_ids_ranked_by_both_legs_come_first():
+    fused = reciprocal_rank_fusion([[1, 2, 3, 4], [5, 3, 6]], k=60)
+
+    # 3 is third and second; 1 and 5 are only ranked first by one leg
+    assert fused == [3, 1, 5, 2, 6, 4]
+
+
+def test_ties_keep_the_order_ids_were_first_seen_in():
+    assert reciprocal_rank_fusion([[1, 2], [2, 1]]) == [1, 2]
+    assert reciprocal_rank_fusion([[7], [8]]) == [7, 8]
+
+
+def test_limit_and_empty_rankings():
+    assert reciprocal_rank_fusion([[1, 2, 3], []], limit=2) == [1, 2]
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_smaller_k_favours_the_top_of_each_ranking():
+    rankings = [[1, 2, 3, 9], [4, 5, 6, 9]]
+
+    # Fourth in both legs beats first in one, unless k is small
+    assert reciprocal_rank_fusion(rankings, k=60)[0] == 9
+    assert reciprocal_rank_fusion(rankings, k=1)[:2] == [1, 4]
+
+
+class FakeVectorStore:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def search(self, question, top_k, grade=None, topic=None):
+        return self.ids[:top_k]
+
+    def search_many(self, questions, top_k, grade=None, topic=None):
+        return [self.ids[:top_k] for _ in questions]
+
+
+@pytest.fixture
+def retriever():
+    retriever = HybridRetriever(FakeVectorStore([1, 2, 3, 4]), candidates=4)
+    # Full-text search needs PostgreSQL; the lexical leg is faked below
+    retriever.enabled = True
+    yield retriever
+    retriever.close()
+
+
+def test_search_fuses_the_vector_and_lexical_legs(retriever, monkeypatch):
+    monkeypatch.setattr(retriever, "lexical_search", lambda question, limit, **filters: [4, 9])
+
+    result = retriever.search("photosynthesis", top_k=3)
+
+    # 2 and 9 tie at rank two of their leg; the vector leg is seen first
+    assert result.chunk_ids == [4, 1, 2]
+    assert set(result.timings) == {"vector", "lexical", "total"}
+
+
+def test_failed_lexical_leg_falls_back_to_vectors(retriever, monkeypatch):
+    def fail(question, limit, **filters):
+        raise RuntimeError("text search unavailable")
+
+    monkeypatch.setattr(retriever, "lexical_search", fail)
+
+    assert retriever.search("photosynthesis", top_k=2).chunk_ids == [1, 2]
+    assert [result.chunk_ids for result in retriever.search_many(["a", "b"], top_k=2)] == [
+        [1, 2],
+        [1, 2],
+    ]
@@ -0,0 +1,135 @@
+import os
+import numpy as np
+import pytest
+from app.services.index_store import OP_ADD, OP_REMOVE, IndexStore
+
+DIMENSION = 4
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    """Build IndexStore instances sharing one directory, like worker processes"""
+    stores = []
+
+    def make():
+        store = IndexStore(str(tmp_path), DIMENSION, snapshot_fn=lambda bump: None, fsync=False)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def _vectors(count, start=0):
+    return np.arange(start, start + count * DIMENSION, dtype="float32").reshape(count, DIMENSION)
+
+
+def _replay(store, after_seq=0):
+    with store.locked():
+        return store.replay(after_seq)
+
+
+def _summary(records):
+    return [(seq, op, db_id) for seq, op, db_id, _ in records]
+
+
+def test_replay_returns_appended_records_in_order(make_store):
+    store = make_store()
+    store.append(OP_ADD, [10, 11], _vectors(2))
+    store.append(OP_REMOVE, [10])
+
+    records = _replay(store)
+
+    assert _summary(records) == [(1, OP_ADD, 10), (2, OP_ADD, 11), (3, OP_REMOVE, 10)]
+    np.testing.assert_array_equal(np.stack([vector for *_, vector in records[:2]]), _vectors(2))
+    assert not records[2][3].any()
+    assert _summary(_replay(store, after_seq=2)) == [(3, OP_REMOVE, 10)]
+    assert (store.last_seq, store.pending_records) == (3, 1)
+
+
+def test_torn_record_at_the_end_is_dropped(make_store, tmp_path):
+    store = make_store()
+    store.append(OP_ADD, [10, 11], _vectors(2))
+    with open(tmp_path / "vectors.log", "ab") as log:
+        log.write(b"\x01\x02\x03")
+
+    assert _summary(_replay(store)) == [(1, OP_ADD, 10), (2, OP_ADD, 11)]
+    assert os.path.getsize(tmp_path / "vectors.log") == 2 * store.record_size
+    store.append(OP_ADD, [12], _vectors(1))
+    assert _summary(store.read_new()) == [(3, OP_ADD, 12)]
+
+
+def test_read_new_follows_appends_from_another_process(make_store):
+    writer, reader = make_store(), make_store()
+    writer.append(OP_ADD, [10], _vectors(1))
+    _replay(reader)
+
+    writer.append(OP_ADD, [11, 12], _vectors(2))
+    other = make_store()
+    other.append(OP_REMOVE, [11])
+
+    assert _summary(reader.read_new()) == [(2, OP_ADD, 11), (3, OP_ADD, 12), (4, OP_REMOVE, 11)]
+    assert reader.read_new() == []
+
+
+def test_rotation_and_checkpoint_prune_the_covered_log(make_store, tmp_path):
+    store = make_store()
+    assert store.acquire_writer()
+    store.append(OP_ADD, [10, 11], _vectors(2))
+    _replay(store)
+
+    with store.locked():
+        seq = store.rotate()
+    store.write_checkpoint(seq, np.frombuffer(b"index", dtype="uint8"))
+
+    assert seq == 2
+    assert sorted(os.listdir(tmp_path)) == [
+        f"checkpoint-{2:020d}.faiss",
+        "vectors.lock",
+        "writer.lock",
+    ]
+    assert store.latest_checkpoint() == (2, str(tmp_path / f"checkpoint-{2:020d}.faiss"))
+    # Sequence numbers carry on from the checkpoint once the log is gone
+    store.append(OP_ADD, [12], _vectors(1))
+    assert _summary(_replay(store, after_seq=2)) == [(3, OP_ADD, 12)]
+
+
+def test_rotate_without_new_records_needs_a_bump(make_store):
+    store = make_store()
+    store.append(OP_ADD, [10], _vectors(1))
+    _replay(store)
+    with store.locked():
+        assert store.rotate() == 1
+    store.write_checkpoint(1, np.frombuffer(b"index", dtype="uint8"))
+
+    with store.locked():
+        assert store.rotate() is None
+        assert store.rotate(bump=True) == 2
+
+
+def test_reader_finishes_the_rotated_log_before_the_new_one(make_store, tmp_path):
+    writer, reader = make_store(), make_store()
+    assert writer.acquire_writer()
+    assert not reader.acquire_writer()
+    writer.append(OP_ADD, [10], _vectors(1))
+    _replay(writer)
+    _replay(reader)
+
+    writer.append(OP_ADD, [11], _vectors(1))
+    writer.read_new()
+    with writer.locked():
+        writer.rotate()
+    writer.append(OP_ADD, [12], _vectors(1))
+
+    assert os.path.exists(tmp_path / f"vectors-{2:020d}.log")
+    assert _summary(reader.read_new()) == [(2, OP_ADD, 11), (3, OP_ADD, 12)]
+
+
+def test_only_one_store_is_the_writer(make_store):
+    first, second = make_store(), make_store()
+
+    assert first.acquire_writer()
+    assert not second.acquire_writer()
+    first.release_writer()
+    assert second.acquire_writer()
@@ -0,0 +1,49 @@
+import faiss
+import numpy as np
+from app.models import Content, ContentChunk
+from app.services.index_tuning import rebuild_index, recall_report
+from app.services.vector_codec import pack_vector
+
+DIMENSION = 384
+
+
+def test_rebuild_index_builds_an_ivf_index_that_removes_in_place(make_embedding_service, db):
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((600, DIMENSION)).astype("float32")
+    db.add(Content(id=1, title="t", topic="Science", grade="Grade 5", content="c"))
+    db.add_all(
+        ContentChunk(id=position + 1, content_id=1, chunk_text="c", chunk_index=position,
+                     embedding=pack_vector(vector))
+        for position, vector in enumerate(vectors)
+    )
+    db.commit()
+    service = make_embedding_service(
+        faiss_index_type="ivf", faiss_ivf_nlist=8, faiss_ivf_nprobe=8
+    )
+
+    stats = rebuild_index(db, service)
+
+    assert stats["vectors"] == 600
+    assert isinstance(service.index, faiss.IndexIVF)
+    service.remove([1, 2, 3])
+    assert service.search_embeddings(vectors[99:100], top_k=1) == [[100]]
+    assert service.search_embeddings(vectors[:3], top_k=1) != [[1], [2], [3]]
+
+
+def test_recall_report_measures_ivf_after_removals():
+    vectors = np.random.default_rng(2).standard_normal((2000, 32)).astype("float32")
+
+    report = recall_report(
+        vectors,
+        num_queries=50,
+        nlist=16,
+        nprobe_values=(16,),
+        ef_search_values=(64,),
+        removed_fraction=0.2,
+    )
+
+    ivf_rows = {row["removed"]: row for row in report if row["index"] == "ivf"}
+    assert set(ivf_rows) == {0, 400}
+    # Probing every list is exact, before and after the removals
+    assert ivf_rows[0]["recall"] == 1.0
+    assert ivf_rows[400]["recall"] == 1.0
@@ -0,0 +1,32 @@
+import pytest
+from app.models import Content, ContentChunk
+from app.services.ingest_service import bulk_ingest
+
+DOCUMENTS = [
+    ("photosynthesis.txt", "Plants turn light into sugar. " * 40),
+    ("water_cycle.txt", "Water evaporates, condenses and falls as rain. " * 40),
+]
+
+
+def test_bulk_ingest_indexes_every_chunk(make_embedding_service, db):
+    service = make_embedding_service()
+
+    stats = bulk_ingest(db, DOCUMENTS, "Science", "Grade 5", service)
+
+    chunk_ids = [chunk_id for (chunk_id,) in db.query(ContentChunk.id)]
+    assert stats["documents"] == 2
+    assert stats["chunks"] == len(chunk_ids) == service.ntotal > 0
+
+
+def test_failed_commit_removes_the_indexed_vectors(make_embedding_service, db, monkeypatch):
+    service = make_embedding_service()
+
+    def fail():
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(db, "commit", fail)
+    with pytest.raises(RuntimeError):
+        bulk_ingest(db, DOCUMENTS, "Science", "Grade 5", service)
+
+    assert db.query(Content).count() == 0
+    assert service.ntotal == 0
@@ -0,0 +1,155 @@
+import faiss
+import numpy as np
+import pytest
+from app.models import Content, ContentChunk
+from app.services.index_factory import build_index, train_index
+from app.services.index_store import IndexStore
+from app.services.vector_codec import pack_vector
+
+DIMENSION = 384
+NUM_VECTORS = 1000
+NLIST = 8
+REMOVED = [1, 2, 3, 500]
+
+ENCODINGS = ["float32", "fp16", "int8", "pq"]
+
+
+def _vectors():
+    rng = np.random.default_rng(0)
+    return np.arange(1, NUM_VECTORS + 1, dtype="int64"), rng.standard_normal(
+        (NUM_VECTORS, DIMENSION)
+    ).astype("float32")
+
+
+def _trained_ivf(encoding, vectors):
+    index = build_index(DIMENSION, "ivf", nlist=NLIST, encoding=encoding, pq_m=48)
+    train_index(index, vectors)
+    index.nprobe = NLIST
+    return index
+
+
+def _ivf_service(make_embedding_service, encoding):
+    return make_embedding_service(
+        faiss_index_type="ivf",
+        faiss_index_encoding=encoding,
+        faiss_ivf_nlist=NLIST,
+        faiss_ivf_nprobe=NLIST,
+    )
+
+
+def _assert_same_after_removal(before, after, removed):
+    # Removing ids drops them from the results and leaves every other
+    # hit in place; later ones move up to fill the gap
+    for row_before, row_after in zip(before, after):
+        kept = [label for label in row_before if label not in removed]
+        assert row_after[: len(kept)] == kept
+        assert not set(row_after) & set(removed)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_search_after_removal_returns_the_right_ids(make_embedding_service, encoding):
+    ids, vectors = _vectors()
+    service = _ivf_service(make_embedding_service, encoding)
+    service.rebuild(_trained_ivf(encoding, vectors), ids, vectors)
+    queries = vectors[:200]
+    before = service.search_embeddings(queries, top_k=5)
+
+    service.remove(REMOVED)
+
+    assert service.ntotal == NUM_VECTORS - len(REMOVED)
+    after = service.search_embeddings(queries, top_k=5)
+    _assert_same_after_removal(before, after, set(REMOVED))
+    if encoding == "float32":
+        assert service.search_embeddings(vectors[99:100], top_k=1) == [[100]]
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_removals_survive_checkpoint_and_reload(make_embedding_service, encoding):
+    ids, vectors = _vectors()
+    writer = _ivf_service(make_embedding_service, encoding)
+    writer.rebuild(_trained_ivf(encoding, vectors), ids, vectors)
+    queries = vectors[:200]
+    before = writer.search_embeddings(queries, top_k=5)
+    writer.remove(REMOVED[:2])
+    writer.save()
+    writer.remove(REMOVED[2:])
+    writer.close()
+
+    reloaded = _ivf_service(make_embedding_service, encoding)
+    assert reloaded.is_writer
+    _assert_same_after_removal(before, reloaded.search_embeddings(queries, top_k=5), set(REMOVED))
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_reader_follows_removals_from_the_writer(make_embedding_service, encoding):
+    ids, vectors = _vectors()
+    writer = _ivf_service(make_embedding_service, encoding)
+    writer.rebuild(_trained_ivf(encoding, vectors), ids, vectors)
+    queries = vectors[:200]
+    before = writer.search_embeddings(queries, top_k=5)
+    writer.remove(REMOVED[:2])
+    writer.save()
+
+    reader = _ivf_service(make_embedding_service, encoding)
+    assert not reader.is_writer
+    writer.remove(REMOVED[2:])
+    reader.sync()
+    _assert_same_after_removal(before, reader.search_embeddings(queries, top_k=5), set(REMOVED))
+
+
+def _write_wrapped_checkpoint(index_dir, wrapped):
+    """Leave a checkpoint as older versions wrote it, IVF inside IndexIDMap2"""
+    store = IndexStore(str(index_dir), DIMENSION, snapshot_fn=None)
+    store.write_checkpoint(10, faiss.serialize_index(wrapped))
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_wrapped_ivf_checkpoint_is_migrated_to_native_ids(make_embedding_service, tmp_path, encoding):
+    ids, vectors = _vectors()
+    wrapped = faiss.IndexIDMap2(_trained_ivf(encoding, vectors))
+    wrapped.add_with_ids(vectors, ids)
+    queries = vectors[:200]
+    before = wrapped.search(queries, 5)[1].tolist()
+    _write_wrapped_checkpoint(tmp_path / "index", wrapped)
+
+    service = _ivf_service(make_embedding_service, encoding)
+    assert isinstance(service.index, faiss.IndexIVF)
+    service.remove(REMOVED)
+    _assert_same_after_removal(before, service.search_embeddings(queries, top_k=5), set(REMOVED))
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_scrambled_ivf_checkpoint_is_rebuilt_from_backups(
+    make_embedding_service, tmp_path, db, encoding
+):
+    ids, vectors = _vectors()
+    db.add(Content(id=1, title="t", topic="Science", grade="Grade 5", content="c"))
+    db.add_all(
+        ContentChunk(
+            id=int(chunk_id),
+            content_id=1,
+            chunk_text=f"chunk {chunk_id}",
+            chunk_index=position,
+            embedding=pack_vector(vector),
+        )
+        for position, (chunk_id, vector) in enumerate(zip(ids, vectors))
+        if chunk_id not in REMOVED
+    )
+    db.commit()
+    trained = _trained_ivf(encoding, vectors)
+    kept = ~np.isin(ids, REMOVED)
+    expected_index = faiss.clone_index(trained)
+    expected_index.add_with_ids(vectors[kept], ids[kept])
+    queries = vectors[:200]
+    expected = expected_index.search(queries, 5)[1].tolist()
+    # What older versions checkpointed after a removal
+    wrapped = faiss.IndexIDMap2(trained)
+    wrapped.add_with_ids(vectors, ids)
+    wrapped.remove_ids(np.array(REMOVED, dtype="int64"))
+    assert wrapped.search(queries, 5)[1].tolist() != expected
+    _write_wrapped_checkpoint(tmp_path / "index", wrapped)
+
+    service = _ivf_service(make_embedding_service, encoding)
+    assert isinstance(service.index, faiss.IndexIVF)
+    assert service.ntotal == NUM_VECTORS - len(REMOVED)
+    assert service.search_embeddings(queries, top_k=5) == expected
@@ -0,0 +1,67 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import func
+from app.db.database import SessionLocal
+from app.models import QueryLog, QueryStat
+from app.services import metrics_service
+from app.services.metrics_service import MetricsService
+
+
+def _log_queries(db, count):
+    db.add_all(
+        QueryLog(
+            user_question=f"q{number}",
+            ai_response="a",
+            persona="friendly",
+            created_at=datetime(2024, 1, 1, number % 24),
+        )
+        for number in range(count)
+    )
+    db.commit()
+
+
+def _total(db):
+    return db.query(func.sum(QueryStat.count)).scalar()
+
+
+def test_backfill_counts_each_logged_query_once(db):
+    _log_queries(db, 48)
+
+    MetricsService().backfill(db)
+    MetricsService().backfill(db)
+
+    assert _total(db) == 48
+    assert MetricsService().summary(db)["total_queries"] == 48
+
+
+def test_workers_starting_together_backfill_once(db, monkeypatch):
+    _log_queries(db, 48)
+    record_query_stats = metrics_service.record_query_stats
+
+    def slow_record_query_stats(session, queries):
+        # Keep the first worker's transaction open while the second starts
+        time.sleep(0.3)
+        return record_query_stats(session, queries)
+
+    monkeypatch.setattr(metrics_service, "record_query_stats", slow_record_query_stats)
+    errors = []
+
+    def start_worker():
+        session = SessionLocal()
+        try:
+            MetricsService().backfill(session)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    workers = [threading.Thread(target=start_worker) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    db.expire_all()
+    assert _total(db) == 48
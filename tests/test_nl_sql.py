@@ -0,0 +1,77 @@
+import pytest
+from app.db.database import engine
+from app.models import Content
+from app.services.nl_sql import (
+    UnsafeSQLError,
+    clean_sql,
+    run_read_only,
+    summarize_rows,
+    validate_read_only,
+)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT COUNT(*) FROM contents",
+        "select grade, count(*) from contents group by grade",
+        "WITH recent AS (SELECT * FROM query_logs) SELECT persona FROM recent",
+        # Forbidden words inside literals, identifiers and comments are text
+        "SELECT * FROM contents WHERE title = 'How to delete; drop it'",
+        'SELECT "update" FROM contents',
+        "SELECT id FROM contents -- then drop table contents",
+    ],
+)
+def test_read_only_queries_are_accepted(sql):
+    assert validate_read_only(sql) == sql
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "DELETE FROM contents",
+        "UPDATE contents SET title = 'x'",
+        "INSERT INTO contents (title) VALUES ('x')",
+        "DROP TABLE contents",
+        "PRAGMA query_only = OFF",
+        "SELECT 1; DROP TABLE contents",
+        "SELECT * INTO backup FROM contents",
+        "WITH gone AS (DELETE FROM contents RETURNING *) SELECT * FROM gone",
+        "SELECT pg_sleep(10)",
+        "SELECT * FROM contents FOR UPDATE",
+        "SELECT /* comment */ 1 FROM contents FOR NO KEY UPDATE",
+        "",
+        "-- only a comment",
+    ],
+)
+def test_anything_else_is_rejected(sql):
+    with pytest.raises(UnsafeSQLError):
+        validate_read_only(sql)
+
+
+def test_clean_sql_strips_fences_and_the_trailing_semicolon():
+    assert clean_sql("```sql\nSELECT 1;\n```") == "SELECT 1"
+    assert clean_sql("  SELECT 1 ;  ") == "SELECT 1"
+
+
+def test_run_read_only_caps_the_rows(db):
+    db.add_all(
+        Content(title=f"t{number}", topic="Science", grade="Grade 5", content="c")
+        for number in range(5)
+    )
+    db.commit()
+
+    result = run_read_only(engine, "SELECT id FROM contents ORDER BY id", max_rows=3, timeout_ms=1000)
+
+    assert result.columns == ["id"]
+    assert result.rows == [(1,), (2,), (3,)]
+    assert result.truncated
+
+
+def test_summarize_rows():
+    summary = summarize_rows(["grade", "count"], [("Grade 5", 3), ("Grade 6", None)], sample_size=1)
+
+    assert summary["row_count"] == 2
+    assert summary["column_stats"]["count"] == {"nulls": 1, "min": 3, "max": 3, "sum": 3, "mean": 3.0}
+    assert summary["column_stats"]["grade"]["distinct"] == 2
+    assert summary["sample_rows"] == [{"grade": "Grade 5", "count": 3}]
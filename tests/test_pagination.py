@@ -0,0 +1,56 @@
+from datetime import datetime
+from sqlalchemy import text
+from app.db.database import normalize_sqlite_timestamps
+from app.models import Content
+from app.services.pagination import decode_cursor, encode_cursor, keyset_page
+
+
+def _page_through(db, limit):
+    query = db.query(Content.created_at, Content.id)
+    pages, cursor = [], None
+    while True:
+        rows, cursor = keyset_page(query, Content.created_at, Content.id, cursor, limit)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+
+def _content(**fields):
+    return Content(title="t", topic="Science", grade="Grade 5", content="c", **fields)
+
+
+def test_pages_through_rows_stamped_in_one_flush(db):
+    # A bulk upload adds every row in one flush, usually within one second
+    db.add_all(_content() for _ in range(5))
+    db.commit()
+
+    assert _page_through(db, limit=2) == [[1, 2], [3, 4], [5]]
+
+
+def test_pages_through_rows_sharing_one_timestamp(db):
+    created_at = datetime(2024, 1, 1, 12, 0, 0)
+    db.add_all(_content(created_at=created_at) for _ in range(5))
+    db.add(_content(created_at=datetime(2024, 1, 1, 11, 59, 59, 500000)))
+    db.commit()
+
+    assert _page_through(db, limit=2) == [[6, 1], [2, 3], [4, 5]]
+
+
+def test_cursor_round_trips():
+    created_at = datetime(2024, 1, 1, 12, 0, 0, 250)
+    assert decode_cursor(encode_cursor(created_at, 7)) == (created_at, 7)
+
+
+def test_rows_stamped_by_older_versions_are_normalized(db):
+    db.execute(
+        text(
+            "INSERT INTO contents (id, title, topic, grade, content, created_at) "
+            "VALUES (:id, 't', 'Science', 'Grade 5', 'c', '2024-01-01 12:00:00')"
+        ),
+        [{"id": row_id} for row_id in range(1, 6)],
+    )
+    db.commit()
+
+    normalize_sqlite_timestamps()
+
+    assert _page_through(db, limit=2) == [[1, 2], [3, 4], [5]]
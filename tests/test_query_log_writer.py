@@ -0,0 +1,30 @@
+import time
+from app.models import QueryLog
+from app.services.query_log_writer import QueryLogWriter
+
+
+def test_full_queue_drops_without_blocking(monkeypatch):
+    writer = QueryLogWriter(maxsize=1)
+    # A writer thread that never drains the queue
+    monkeypatch.setattr(writer, "_run", lambda: None)
+    writer.start()
+    try:
+        started = time.perf_counter()
+        writer.submit("q1", "friendly", "a1")
+        writer.submit("q2", "friendly", "a2")
+        assert time.perf_counter() - started < 0.1
+        assert writer.stats() == {"queued": 1, "written": 0, "dropped": 1}
+    finally:
+        writer.close()
+
+
+def test_rows_are_written_in_batches_and_drained_on_close(db):
+    writer = QueryLogWriter(batch_size=2, flush_interval=0.05)
+    writer.start()
+    for number in range(5):
+        writer.submit(f"q{number}", "friendly", f"a{number}", response_time=0.5)
+    writer.close()
+
+    assert writer.stats() == {"queued": 0, "written": 5, "dropped": 0}
+    questions = [row.user_question for row in db.query(QueryLog).order_by(QueryLog.id)]
+    assert questions == [f"q{number}" for number in range(5)]